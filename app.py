@@ -1,26 +1,80 @@
+import argparse
+import asyncio
+import bisect
+import gzip
+import hashlib
+import hmac
+import json
 import logging
+import math
+import multiprocessing
 import os
-import tempfile
+import re
+import shutil
+import socket
+import sqlite3
+import tarfile
 import threading
+import time
 import traceback
 import uuid
+import zipfile
+import zlib
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import partial
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
-from queue import Queue
+from queue import Empty, Full, PriorityQueue, Queue
+from urllib.parse import urlsplit
 
+import cv2
 import fitz  # PyMuPDF
 import numpy as np
 import requests
-from flask import Flask, redirect
+from requests.adapters import HTTPAdapter
+from flask import Flask, Request, redirect, request
 from flask_cors import CORS
-from flask_restx import Api, Resource, fields
-from paddleocr import PaddleOCR
-from pdf2image import convert_from_path
+from flask_restx import Api, Resource, fields, inputs
+from paddleocr import PaddleOCR, TextDetection, TextLineOrientationClassification, TextRecognition
+from pdf2image import convert_from_path, pdfinfo_from_path
 from werkzeug.datastructures import FileStorage
+from werkzeug.http import parse_accept_header
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+try:
+    import aiohttp
+    from aiohttp import web
+except ImportError:  # 仅在 serve --asyncio 时需要
+    aiohttp = None
+    web = None
+
+try:
+    import orjson
+except ImportError:  # 可选：安装后使用orjson序列化响应
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # 仅在 format=msgpack 时需要
+    msgpack = None
+
+try:
+    import onnxruntime as ort
+except ImportError:  # 仅在 OCR_BACKEND=onnx 时需要
+    ort = None
+
+try:
+    import pyclipper
+except ImportError:  # PaddleOCR的依赖；未安装时ONNX检测后处理用凸包近似多边形外扩
+    pyclipper = None
 
 # 强制CPU模式，避免GPU相关的线程安全问题（可选择启用GPU）
 # os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
-# 设置OpenMP线程数为1，避免OpenBlas多线程冲突
+# 设置OpenMP线程数为1，避免OpenBlas多线程冲突；推理线程的实际算子内线程数由线程预算管理器按并发度分配
 os.environ['OMP_NUM_THREADS'] = '1'
 
 # 配置日志和模型目录
@@ -38,38 +92,12 @@ paddle_cache_dir = os.path.join(MODEL_DIR, '.paddleocr')
 os.makedirs(paddle_cache_dir, exist_ok=True)
 os.environ['HOME'] = MODEL_DIR             # 某些情况下PaddleOCR会使用HOME/.paddleocr
 
-
-def check_and_prepare_models():
-    """检查并准备模型文件"""
-    logger.info(f"检查模型文件，模型目录: {MODEL_DIR}")
-    
-    # 检查模型目录是否存在模型文件
-    model_files = []
-    if os.path.exists(MODEL_DIR):
-        for root, dirs, files in os.walk(MODEL_DIR):
-            for file in files:
-                if file.endswith(('.pdmodel', '.pdiparams', '.pdopt')):
-                    model_files.append(os.path.join(root, file))
-    
-    if model_files:
-        logger.info(f"在模型目录中找到 {len(model_files)} 个模型文件")
-        logger.info(f"模型文件示例: {model_files[:3]}")
-    else:
-        logger.info("模型目录中暂无模型文件，首次运行时将自动下载到该目录")
-    
-    # 确保目录存在且有写权限
-    try:
-        os.makedirs(MODEL_DIR, exist_ok=True)
-        # 测试写权限
-        test_file = os.path.join(MODEL_DIR, '.write_test')
-        with open(test_file, 'w') as f:
-            f.write('test')
-        os.remove(test_file)
-        logger.info(f"模型目录权限检查通过: {MODEL_DIR}")
-        return True
-    except Exception as e:
-        logger.error(f"模型目录权限检查失败: {e}")
-        return False
+# 上传文件、URL下载和页面转换的暂存目录（可指向tmpfs，如 /dev/shm/ocr）
+TMP_DIR = os.environ.get('OCR_SPOOL_DIR', os.path.join(ROOT_DIR, 'picture'))
+os.makedirs(TMP_DIR, exist_ok=True)
+# 暂存文件清理：超过最大保留时间的孤儿文件由后台线程定期删除
+SPOOL_MAX_AGE = int(os.environ.get('OCR_SPOOL_MAX_AGE', '3600'))
+SPOOL_JANITOR_INTERVAL = int(os.environ.get('OCR_SPOOL_JANITOR_INTERVAL', '300'))
 
 
 logging.basicConfig(level=logging.WARNING)
@@ -88,12 +116,88 @@ formatter = logging.Formatter(
 file_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 
+def new_spool_path(suffix=''):
+    """在暂存目录中生成唯一的文件路径"""
+    return os.path.join(TMP_DIR, uuid.uuid4().hex + suffix)
+
+
+class SpoolingRequest(Request):
+    """multipart上传的文件部分直接流式写入暂存目录中的文件，不再经过Werkzeug默认临时文件后再复制一次"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        suffix = Path(filename).suffix.lower() if filename else ''
+        path = new_spool_path(suffix if suffix.isascii() else '')
+        if not hasattr(self, 'spooled_paths'):
+            self.spooled_paths = []
+        self.spooled_paths.append(path)
+        return open(path, 'w+b')
+
+
+def spool_uploaded_file(uploaded_file, file_ext):
+    """返回上传文件在暂存目录中的路径，调用方负责删除
+
+    文件已在解析请求时直接写入暂存目录的，直接接管该文件；否则保存一次。
+    """
+    stream = uploaded_file.stream
+    path = getattr(stream, 'name', None)
+    spooled_paths = getattr(request, 'spooled_paths', [])
+    if isinstance(path, str) and path in spooled_paths and path.endswith(file_ext):
+        stream.flush()
+        stream.close()
+        spooled_paths.remove(path)
+        return path
+
+    path = new_spool_path(file_ext)
+    uploaded_file.save(path)
+    return path
+
+
+def cleanup_spool_dir(max_age=SPOOL_MAX_AGE):
+    """删除暂存目录中超过最大保留时间的孤儿文件"""
+    now = time.time()
+    removed = 0
+    try:
+        with os.scandir(TMP_DIR) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and now - entry.stat().st_mtime > max_age:
+                        os.remove(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+    except Exception as e:
+        logger.warning(f"暂存目录清理失败: {e}")
+    if removed:
+        logger.info(f"暂存目录清理完成，删除 {removed} 个过期文件")
+    return removed
+
+
+def start_spool_janitor():
+    """启动暂存目录后台清理线程"""
+    def janitor():
+        while True:
+            time.sleep(SPOOL_JANITOR_INTERVAL)
+            cleanup_spool_dir()
+
+    thread = threading.Thread(target=janitor, name='spool-janitor', daemon=True)
+    thread.start()
+    return thread
+
+
 # 初始化Flask
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024 * 10  # 160 MB
+app.request_class = SpoolingRequest
 CORS(app)
 
 
+@app.teardown_request
+def remove_unclaimed_spool_files(exc=None):
+    """请求结束时删除未被处理流程接管的暂存上传文件"""
+    for path in getattr(request, 'spooled_paths', []):
+        safe_remove_file(path)
+
+
 # 添加根路由重定向（必须在API创建之前）
 @app.route('/')
 def index():
@@ -110,136 +214,1520 @@ api = Api(app,
           )
 
 
+# 支持的识别语言及各语言引擎池大小（默认流水线配置）
+SUPPORTED_LANGS = ['ch', 'en', 'japan', 'korean', 'server']
+ENGINE_POOL_SIZES = {'ch': 3, 'en': 2, 'japan': 2, 'korean': 2, 'server': 2}
+LANG_DISPLAY_NAMES = {
+    'ch': '中文',
+    'en': '英文',
+    'japan': '日文',
+    'korean': '韩文',
+    'server': 'Server',
+}
+
+# 流水线配置（profile）：控制文档方向分类、文档矫正、文本行方向分类等子模型的开关及检测尺寸限制
+# accurate 与 PaddleOCR 默认流水线一致；fast/balanced 跳过干净正向扫描件不需要的阶段以降低延迟
+OCR_PROFILES = {
+    'fast': {
+        'description': '快速：关闭文档方向分类、文档矫正和文本行方向分类，检测输入长边限制为960',
+        'params': {
+            'use_doc_orientation_classify': False,
+            'use_doc_unwarping': False,
+            'use_textline_orientation': False,
+            'text_det_limit_side_len': 960,
+            'text_det_limit_type': 'max',
+        },
+    },
+    'balanced': {
+        'description': '均衡：关闭文档方向分类和文档矫正，保留文本行方向分类',
+        'params': {
+            'use_doc_orientation_classify': False,
+            'use_doc_unwarping': False,
+            'use_textline_orientation': True,
+        },
+    },
+    'accurate': {
+        'description': '高精度：启用全部预处理子模型（PaddleOCR默认流水线）',
+        'params': {
+            'use_doc_orientation_classify': True,
+            'use_doc_unwarping': True,
+            'use_textline_orientation': True,
+        },
+    },
+}
+DEFAULT_PROFILE = os.environ.get('OCR_DEFAULT_PROFILE', 'accurate')
+if DEFAULT_PROFILE not in OCR_PROFILES:
+    DEFAULT_PROFILE = 'accurate'
+# 非默认配置的引擎池按需创建，每个（语言, 配置）组合最多保留的引擎数
+EXTRA_PROFILE_POOL_SIZE = int(os.environ.get('OCR_EXTRA_PROFILE_POOL_SIZE', '2'))
+
+# 检测/识别分离流水线使用的PP-OCRv5单模型名称（与PaddleOCR 3.1按语言选择的默认模型一致）
+TEXTLINE_MODEL_NAMES = {
+    'ch': {'det': 'PP-OCRv5_server_det', 'rec': 'PP-OCRv5_server_rec'},
+    'en': {'det': 'PP-OCRv5_server_det', 'rec': 'en_PP-OCRv5_mobile_rec'},
+    'japan': {'det': 'PP-OCRv5_server_det', 'rec': 'PP-OCRv5_server_rec'},
+    'korean': {'det': 'PP-OCRv5_mobile_det', 'rec': 'korean_PP-OCRv5_mobile_rec'},
+    'server': {'det': 'PP-OCRv5_server_det', 'rec': 'PP-OCRv5_server_rec'},
+}
+TEXTLINE_ORI_MODEL_NAME = 'PP-LCNet_x1_0_textline_ori'
+DOC_ORI_MODEL_NAME = 'PP-LCNet_x1_0_doc_ori'
+DOC_UNWARP_MODEL_NAME = 'UVDoc'
+# 单模型池中每个模型最多保留的实例数
+TEXTLINE_MODEL_POOL_SIZE = int(os.environ.get('OCR_TEXTLINE_MODEL_POOL_SIZE', '2'))
+TEXTLINE_REC_BATCH_SIZE = 6
+# 文本行识别缓存：检测与识别之间按规范化文本行图像哈希+识别模型缓存识别结果（LRU），0 表示关闭；
+# 开启后不含文档级预处理的配置（fast/balanced）也走检测/识别分离流水线以便命中缓存
+REC_CACHE_SIZE = int(os.environ.get('OCR_REC_CACHE_SIZE', '0'))
+REC_CACHE_NORM_HEIGHT = 32
+# 分阶段流水线：检测和识别分别由各自的工作线程组执行，之间用有界队列连接，
+# 识别线程处理第N页时检测线程已可处理第N+1页（或其它请求的页面）；仅用于不含文档级预处理的配置和 lang=auto
+STAGED_PIPELINE = os.environ.get('OCR_STAGED_PIPELINE', '0') == '1'
+STAGE_DET_WORKERS = int(os.environ.get('OCR_STAGE_DET_WORKERS', str(TEXTLINE_MODEL_POOL_SIZE)))
+STAGE_REC_WORKERS = int(os.environ.get('OCR_STAGE_REC_WORKERS', str(TEXTLINE_MODEL_POOL_SIZE)))
+STAGE_QUEUE_DEPTH = int(os.environ.get('OCR_STAGE_QUEUE_DEPTH', '4'))
+# 多页文档同时在流水线中的页数
+STAGE_PAGE_WINDOW = int(os.environ.get('OCR_STAGE_PAGE_WINDOW', '2'))
+
+# 自动语言识别（lang=auto）：一次检测 + 少量文本行抽样判断文字系统 + 一次识别
+AUTO_LANG = 'auto'
+AUTO_LANG_DET_MODEL = TEXTLINE_MODEL_NAMES['ch']['det']
+AUTO_LANG_PROBE_LANGS = ['ch', 'korean']  # 依次用于抽样识别的语言（PP-OCRv5中文模型同时覆盖中英日）
+AUTO_LANG_SAMPLE_LINES = int(os.environ.get('OCR_AUTO_LANG_SAMPLE_LINES', '8'))
+AUTO_LANG_MIN_SCORE = float(os.environ.get('OCR_AUTO_LANG_MIN_SCORE', '0.6'))
+AUTO_LANG_FALLBACK = 'ch'
+
+# 多页文档（PDF/多帧TIFF）逐页流水处理时，后台预先解码/渲染的页数上限
+PAGE_PREFETCH_DEPTH = int(os.environ.get('OCR_PAGE_PREFETCH', '2'))
+MULTIPAGE_TIFF_EXTS = ('.tif', '.tiff')
+# 多页文档的OCR前置检查：按像素统计跳过空白页，解码后像素完全相同（SHA256一致）的页复用文档内前页的结果。
+# 不使用感知哈希：同一模板、只有少量文字不同的页面（如金额不同的发票）感知哈希相同，复用会返回错误的文字
+SKIP_BLANK_PAGES = os.environ.get('OCR_SKIP_BLANK_PAGES', '1') == '1'
+BLANK_PAGE_INK_RATIO = float(os.environ.get('OCR_BLANK_PAGE_INK_RATIO', '0.0002'))
+BLANK_PAGE_PIXEL_DELTA = int(os.environ.get('OCR_BLANK_PAGE_PIXEL_DELTA', '48'))
+DEDUP_PAGES = os.environ.get('OCR_DEDUP_PAGES', '1') == '1'
+PAGE_ANALYSIS_SIDE = 512
+
+# PDF渲染分辨率策略：fixed(固定DPI)、max_pixels(按单页最大像素数限制DPI)、page_size(按页面尺寸限制长边像素)
+PDF_DPI_MODES = ['fixed', 'max_pixels', 'page_size']
+PDF_DEFAULT_DPI = int(os.environ.get('OCR_PDF_DPI', '200'))
+PDF_DEFAULT_DPI_MODE = os.environ.get('OCR_PDF_DPI_MODE', 'fixed')
+PDF_DEFAULT_MAX_PIXELS = int(os.environ.get('OCR_PDF_MAX_PIXELS', str(12 * 1000 * 1000)))
+PDF_TARGET_LONG_SIDE = int(os.environ.get('OCR_PDF_TARGET_LONG_SIDE', '2400'))
+# 渲染结果单边像素上限（与图像验证的尺寸上限一致）
+MAX_RENDER_SIDE = 10000
+
+
+# 推理后端：paddle(Paddle Inference，默认) 或 onnx(ONNX Runtime，使用 paddle2onnx 导出的模型)
+OCR_BACKENDS = ['paddle', 'onnx']
+OCR_BACKEND = os.environ.get('OCR_BACKEND', 'paddle')
+if OCR_BACKEND not in OCR_BACKENDS:
+    OCR_BACKEND = 'paddle'
+ONNX_MODEL_DIR = os.environ.get('OCR_ONNX_MODEL_DIR', os.path.join(MODEL_DIR, 'onnx'))
+
+# CPU线程预算：按机器核数（及容器CPU配额）在引擎/单模型实例构造时确定算子内线程数，推理时从共享预算中领取
+CPU_BUDGET_OVERRIDE = int(os.environ.get('OCR_CPU_BUDGET', '0'))
+MAX_THREADS_PER_ENGINE = int(os.environ.get('OCR_MAX_THREADS_PER_ENGINE', '0'))
+
+
+def detect_cpu_budget():
+    """检测可用CPU核数：取CPU亲和性核数与cgroup CPU配额(v2 cpu.max / v1 cfs_quota)中的较小值"""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    quota = None
+    source = 'cpu_count'
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota_str, period_str = f.read().split()[:2]
+        if quota_str != 'max':
+            quota = int(quota_str) / int(period_str)
+    except (OSError, ValueError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                quota_us = int(f.read().strip())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period_us = int(f.read().strip())
+            if quota_us > 0:
+                quota = quota_us / period_us
+        except (OSError, ValueError):
+            pass
+    if quota is not None and math.ceil(quota) < cores:
+        cores = max(1, math.ceil(quota))
+        source = 'cgroup_quota'
+    return cores, source
+
+
+class ThreadBudgetManager:
+    """CPU线程预算：实例构造时按所在池的大小确定算子内线程数，每次推理前从共享预算中领取该线程数
+
+    Paddle Inference 和 ONNX Runtime 按构造时的线程数创建线程池，之后无法按次调整；各引擎池、单模型池
+    （含分阶段流水线的检测和识别两组）和ONNX会话同时推理时线程数会叠加，因此实例只在推理期间占用其线程数，
+    正在推理的实例合计不超过总预算，预算不足时按到达顺序等待。
+    """
+
+    def __init__(self, total=None, max_per_engine=None):
+        detected, source = detect_cpu_budget()
+        self.total = total or detected
+        self.source = 'override' if total else source
+        self.max_per_engine = max(1, min(max_per_engine or self.total, self.total))
+        self.configured = {}
+        self._cond = threading.Condition()
+        self._waiters = deque()
+        self.in_use = 0
+        self.peak = 0
+        self.running_count = 0
+        self.waited_total = 0
+
+    def threads_for(self, pool_name, pool_size):
+        """池中每个实例的算子内线程数：总预算除以池大小，不超过单引擎上限，至少1个"""
+        threads = max(1, min(self.max_per_engine, self.total // max(1, pool_size)))
+        with self._cond:
+            self.configured[pool_name] = {'pool_size': pool_size, 'threads_per_instance': threads}
+        return threads
+
+    @staticmethod
+    def assign(instance, threads):
+        """记录实例构造时配置的算子内线程数，推理时据此领取预算；返回实例本身"""
+        instance.ocr_cpu_threads = threads
+        return instance
+
+    @contextmanager
+    def running(self, instance):
+        """实例推理期间占用其线程数；未记录线程数的实例（如由子模型各自领取的ONNX引擎）不占用"""
+        threads = min(getattr(instance, 'ocr_cpu_threads', 0), self.total)
+        if not threads:
+            yield
+            return
+        waiter = object()
+        with self._cond:
+            self._waiters.append(waiter)
+            if self._waiters[0] is not waiter or self.in_use + threads > self.total:
+                self.waited_total += 1
+            while self._waiters[0] is not waiter or self.in_use + threads > self.total:
+                self._cond.wait()
+            self._waiters.popleft()
+            self.in_use += threads
+            self.running_count += 1
+            self.peak = max(self.peak, self.in_use)
+            # 下一个等待者可能也放得下
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_use -= threads
+                self.running_count -= 1
+                self._cond.notify_all()
+
+    def get_status(self):
+        """线程预算状态：总预算、正在推理的实例合计占用的线程数和峰值、等待数，以及各池实例构造时配置的线程数"""
+        with self._cond:
+            return {
+                'total_threads': self.total,
+                'source': self.source,
+                'max_per_engine': self.max_per_engine,
+                'in_use_threads': self.in_use,
+                'peak_threads': self.peak,
+                'running_instances': self.running_count,
+                'waiting': len(self._waiters),
+                'waited_total': self.waited_total,
+                'pools': {name: dict(values) for name, values in self.configured.items()},
+            }
+
+
+thread_budget = ThreadBudgetManager(CPU_BUDGET_OVERRIDE or None, MAX_THREADS_PER_ENGINE or None)
+
+# 内存预算：请求开始前估算峰值内存（同时驻留的页面 × 渲染像素 × 工作缓冲）并在全局预算中预留，放不下时排队或拒绝
+MEMORY_BUDGET_MB = int(os.environ.get('OCR_MEMORY_BUDGET_MB', '0'))
+MEMORY_BUDGET_FRACTION = float(os.environ.get('OCR_MEMORY_BUDGET_FRACTION', '0.35'))
+MEMORY_BYTES_PER_PIXEL = float(os.environ.get('OCR_MEMORY_BYTES_PER_PIXEL', '24'))
+MEMORY_ADMISSION_TIMEOUT = float(os.environ.get('OCR_MEMORY_ADMISSION_TIMEOUT', '60'))
+MB = 1024 * 1024
+
+
+def detect_memory_limit():
+    """检测进程可用内存上限（字节）：cgroup v2 memory.max / v1 memory.limit_in_bytes，无限制时取物理内存"""
+    for limit_path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(limit_path) as f:
+                value = f.read().strip()
+            if value != 'max' and int(value) < 1 << 60:
+                return int(value)
+        except (OSError, ValueError):
+            continue
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return 8 * 1024 * MB
+
+
+class MemoryBudgetExceeded(Exception):
+    """请求的预估内存超出预算（413）或等待预算超时（503）"""
+
+    def __init__(self, message, status_code=503):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class MemoryBudgetManager:
+    """线程安全的请求内存预算：按到达顺序为请求预留预估峰值内存，预算不足时排队"""
+
+    def __init__(self, total_bytes=None):
+        self.total = total_bytes or int(detect_memory_limit() * MEMORY_BUDGET_FRACTION)
+        self.reserved = 0
+        self.reservations = {}
+        self.waiting = []
+        self._cond = threading.Condition()
+        self._next_id = 0
+
+    def reserve(self, nbytes, deadline=None, timeout=MEMORY_ADMISSION_TIMEOUT):
+        """预留内存，返回预留编号；超过总预算立即拒绝，排队超时、截止时间到达或客户端断开时放弃"""
+        if nbytes > self.total:
+            raise MemoryBudgetExceeded(
+                f"请求预估内存 {nbytes / MB:.0f}MB 超过内存预算 {self.total / MB:.0f}MB", status_code=413)
+        with self._cond:
+            self._next_id += 1
+            reservation_id = self._next_id
+            self.waiting.append(reservation_id)
+            give_up_at = time.monotonic() + timeout
+            try:
+                while self.waiting[0] != reservation_id or self.reserved + nbytes > self.total:
+                    if deadline is not None:
+                        deadline.check()
+                    remaining = give_up_at - time.monotonic()
+                    if remaining <= 0:
+                        raise MemoryBudgetExceeded(
+                            f"等待内存预算超时（需要 {nbytes / MB:.0f}MB，已预留 {self.reserved / MB:.0f}MB / {self.total / MB:.0f}MB）")
+                    self._cond.wait(timeout=min(remaining, 1.0))
+                self.reserved += nbytes
+                self.reservations[reservation_id] = nbytes
+                return reservation_id
+            finally:
+                self.waiting.remove(reservation_id)
+                self._cond.notify_all()
+
+    def release(self, reservation_id):
+        """释放预留"""
+        with self._cond:
+            self.reserved -= self.reservations.pop(reservation_id, 0)
+            self._cond.notify_all()
+
+    def get_status(self):
+        """内存预算状态"""
+        with self._cond:
+            return {
+                'total_mb': round(self.total / MB, 1),
+                'reserved_mb': round(self.reserved / MB, 1),
+                'active_requests': len(self.reservations),
+                'waiting_requests': len(self.waiting),
+            }
+
+
+memory_budget = MemoryBudgetManager(MEMORY_BUDGET_MB * MB or None)
+
+# 引擎预热：引擎加入池之前用合成图像在多个输入尺寸上运行推理，避免首批请求命中冷启动的预测器
+WARMUP_ENABLED = os.environ.get('OCR_WARMUP', '1') == '1'
+WARMUP_SIZES = [
+    tuple(int(v) for v in size.split('x'))
+    for size in os.environ.get('OCR_WARMUP_SIZES', '320x320,960x960,1600x1200').split(',')
+    if size.strip()
+]
+# 就绪条件：默认配置下每种语言至少有该数量的已预热引擎
+READY_MIN_ENGINES = int(os.environ.get('OCR_READY_MIN_ENGINES', '1'))
+# 引擎池在后台线程中初始化，服务进程启动后立即可响应存活检查
+BACKGROUND_POOL_INIT = os.environ.get('OCR_BACKGROUND_INIT', '1') == '1'
+# 被导入时是否自动初始化引擎池（批处理子进程由调用方按需初始化）
+INIT_ON_IMPORT = os.environ.get('OCR_INIT_ON_IMPORT', '1') == '1'
+
+
+def make_warmup_image(width, height):
+    """生成带若干行文字的合成图像，确保预热时检测和识别阶段都会运行"""
+    img = np.full((height, width, 3), 255, dtype=np.uint8)
+    font_scale = max(0.5, min(width, height) / 400.0)
+    line_height = int(40 * font_scale)
+    for row, y in enumerate(range(line_height, height - line_height // 2, line_height * 2)):
+        cv2.putText(img, f"OCR warmup 2025 line {row + 1}", (int(10 * font_scale), y),
+                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0), max(1, int(2 * font_scale)))
+    return img
+
+
+def warm_up_engine(engine, name):
+    """对引擎运行多尺寸的合成推理，返回是否预热成功"""
+    if not WARMUP_ENABLED:
+        return True
+    try:
+        for width, height in WARMUP_SIZES:
+            start = time.time()
+            with thread_budget.running(engine):
+                engine.predict(make_warmup_image(width, height))
+            logger.info(f"{name}引擎预热 {width}x{height} 完成，耗时 {time.time() - start:.2f}s")
+        return True
+    except Exception as e:
+        logger.error(f"{name}引擎预热失败: {e}")
+        return False
+
+
+# 模型清单：固定每种语言/流水线配置所需的模型及文件校验和；离线模式下缺失模型直接报错而不是在引擎构造时联网下载
+OFFLINE_MODE = os.environ.get('OCR_OFFLINE', '0') == '1'
+MODEL_CACHE_DIR = os.environ.get('OCR_MODEL_CACHE_DIR', os.path.join(MODEL_DIR, '.paddlex', 'official_models'))
+MODEL_MANIFEST_PATH = os.environ.get('OCR_MODEL_MANIFEST', os.path.join(MODEL_DIR, 'manifest.json'))
+# 启动校验方式：size(只比较文件大小，默认) 或 sha256(完整校验和)
+MANIFEST_VERIFY_MODE = os.environ.get('OCR_MANIFEST_VERIFY', 'size')
+
+
+class ModelManifestError(Exception):
+    """模型清单缺失或模型文件与清单不一致"""
+
+
+def required_model_names(lang, profile=DEFAULT_PROFILE):
+    """指定语言和流水线配置所需的模型名称，按阶段返回（ONNX后端不加载文档方向分类和文档矫正模型）"""
+    params = OCR_PROFILES[profile]['params']
+    names = {
+        'det': TEXTLINE_MODEL_NAMES[lang]['det'],
+        'rec': TEXTLINE_MODEL_NAMES[lang]['rec'],
+    }
+    if params.get('use_doc_orientation_classify') and OCR_BACKEND != 'onnx':
+        names['doc_ori'] = DOC_ORI_MODEL_NAME
+    if params.get('use_doc_unwarping') and OCR_BACKEND != 'onnx':
+        names['doc_unwarp'] = DOC_UNWARP_MODEL_NAME
+    if params.get('use_textline_orientation'):
+        names['textline_ori'] = TEXTLINE_ORI_MODEL_NAME
+    return names
+
+
+def manifest_requirements():
+    """所有语言 × 流水线配置（及自动语言识别）所需的模型名称"""
+    requirements = {
+        lang: {profile: sorted(set(required_model_names(lang, profile).values())) for profile in OCR_PROFILES}
+        for lang in SUPPORTED_LANGS
+    }
+    requirements[AUTO_LANG] = {
+        profile: sorted({AUTO_LANG_DET_MODEL, TEXTLINE_ORI_MODEL_NAME}
+                        | {TEXTLINE_MODEL_NAMES[lang]['rec'] for lang in SUPPORTED_LANGS})
+        for profile in OCR_PROFILES
+    }
+    return requirements
+
+
+def model_dir_path(model_name):
+    """模型在本地缓存目录中的路径（ONNX后端为导出模型目录）"""
+    base_dir = ONNX_MODEL_DIR if OCR_BACKEND == 'onnx' else MODEL_CACHE_DIR
+    return os.path.join(base_dir, model_name)
+
+
+def file_sha256(file_path):
+    """计算文件SHA256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_model_manifest():
+    """扫描本地缓存中的全部所需模型，生成带文件大小和SHA256的模型清单"""
+    requirements = manifest_requirements()
+    model_names = sorted({name for profiles in requirements.values() for names in profiles.values() for name in names})
+    models = {}
+    for model_name in model_names:
+        model_dir = model_dir_path(model_name)
+        if not os.path.isdir(model_dir):
+            raise ModelManifestError(f"模型目录不存在，无法生成清单: {model_dir}")
+        files = {}
+        for root, _, filenames in os.walk(model_dir):
+            for filename in sorted(filenames):
+                path = os.path.join(root, filename)
+                rel_path = os.path.relpath(path, model_dir).replace(os.sep, '/')
+                files[rel_path] = {'size': os.path.getsize(path), 'sha256': file_sha256(path)}
+        models[model_name] = {'files': files}
+    return {
+        'version': 1,
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'backend': OCR_BACKEND,
+        'requirements': requirements,
+        'models': models,
+    }
+
+
+def load_model_manifest(path=MODEL_MANIFEST_PATH):
+    """读取模型清单，不存在时返回None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def verify_model_manifest(manifest, model_names, verify_mode=MANIFEST_VERIFY_MODE):
+    """按清单检查模型文件，返回问题列表（为空表示通过）"""
+    problems = []
+    for model_name in model_names:
+        entry = manifest.get('models', {}).get(model_name)
+        if entry is None:
+            problems.append(f"清单中缺少模型: {model_name}")
+            continue
+        model_dir = model_dir_path(model_name)
+        for rel_path, expected in entry.get('files', {}).items():
+            path = os.path.join(model_dir, rel_path)
+            if not os.path.exists(path):
+                problems.append(f"模型文件缺失: {model_name}/{rel_path}")
+            elif os.path.getsize(path) != expected['size']:
+                problems.append(f"模型文件大小不一致: {model_name}/{rel_path}")
+            elif verify_mode == 'sha256' and file_sha256(path) != expected['sha256']:
+                problems.append(f"模型文件校验和不一致: {model_name}/{rel_path}")
+    return problems
+
+
+def check_and_prepare_models():
+    """按模型清单检查模型文件；离线模式下清单缺失或校验失败时抛出ModelManifestError"""
+    logger.info(f"检查模型文件，模型目录: {MODEL_DIR}，清单: {MODEL_MANIFEST_PATH}")
+
+    manifest = load_model_manifest()
+    if manifest is None:
+        if OFFLINE_MODE:
+            raise ModelManifestError(
+                f"离线模式需要模型清单 {MODEL_MANIFEST_PATH}，请在模型已下载的环境中运行 'python app.py manifest' 生成")
+        logger.info("未找到模型清单，缺失的模型将在首次创建引擎时自动下载到模型目录")
+    else:
+        requirements = manifest.get('requirements', {})
+        model_names = sorted({name for profiles in requirements.values() for names in profiles.values() for name in names})
+        problems = verify_model_manifest(manifest, model_names)
+        manifest_backend = manifest.get('backend', 'paddle')
+        if manifest_backend != OCR_BACKEND:
+            problems.insert(0, f"清单为{manifest_backend}后端生成，当前后端为{OCR_BACKEND}")
+        if problems:
+            message = f"模型清单校验失败（{len(problems)}项）: {'; '.join(problems[:10])}"
+            if OFFLINE_MODE:
+                raise ModelManifestError(message)
+            logger.warning(message + "，缺失的模型将在创建引擎时自动下载")
+        else:
+            logger.info(f"模型清单校验通过，共{len(model_names)}个模型（校验方式: {MANIFEST_VERIFY_MODE}）")
+
+    if OFFLINE_MODE and os.environ.get('PADDLE_PDX_DISABLE_MODEL_SOURCE_CHECK') is None:
+        logger.warning("离线模式建议设置环境变量 PADDLE_PDX_DISABLE_MODEL_SOURCE_CHECK=True 以跳过模型源连通性检查")
+
+    # 确保目录存在且有写权限
+    try:
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        # 测试写权限
+        test_file = os.path.join(MODEL_DIR, '.write_test')
+        with open(test_file, 'w') as f:
+            f.write('test')
+        os.remove(test_file)
+        logger.info(f"模型目录权限检查通过: {MODEL_DIR}")
+        return True
+    except Exception as e:
+        logger.error(f"模型目录权限检查失败: {e}")
+        return False
+
+
+def offline_model_dir(model_name):
+    """离线模式下返回本地模型目录，不存在时抛出ModelManifestError（避免触发联网下载）"""
+    model_dir = model_dir_path(model_name)
+    if not os.path.isdir(model_dir):
+        raise ModelManifestError(f"离线模式下模型不存在: {model_dir}")
+    return model_dir
+
+
+def create_ocr_engine(lang, profile=DEFAULT_PROFILE, cpu_threads=None):
+    """按语言和流水线配置创建OCR引擎实例（按 OCR_BACKEND 选择Paddle或ONNX Runtime后端），cpu_threads 为算子内线程数"""
+    cpu_threads = cpu_threads or thread_budget.max_per_engine
+    if OCR_BACKEND == 'onnx':
+        return OnnxOCREngine(lang, profile, cpu_threads)
+
+    params = dict(OCR_PROFILES[profile]['params'])
+    if OFFLINE_MODE:
+        # 离线模式显式指定本地模型目录
+        stage_params = {
+            'det': ('text_detection_model_name', 'text_detection_model_dir'),
+            'rec': ('text_recognition_model_name', 'text_recognition_model_dir'),
+            'doc_ori': ('doc_orientation_classify_model_name', 'doc_orientation_classify_model_dir'),
+            'doc_unwarp': ('doc_unwarping_model_name', 'doc_unwarping_model_dir'),
+            'textline_ori': ('textline_orientation_model_name', 'textline_orientation_model_dir'),
+        }
+        for stage, model_name in required_model_names(lang, profile).items():
+            name_key, dir_key = stage_params[stage]
+            params[name_key] = model_name
+            params[dir_key] = offline_model_dir(model_name)
+    params['cpu_threads'] = cpu_threads
+    return thread_budget.assign(PaddleOCR(lang='ch' if lang == 'server' else lang, **params), cpu_threads)
+
+
 # PaddleOCR引擎池类 - 解决线程安全问题
+# 引擎租约与回收：借出时间超过 LEASE_MAX_SECONDS 的租约由看门狗线程告警；
+# 引擎推理次数达到上限或进程RSS增长超过阈值时在后台重建替换实例，替换完成前旧实例继续服务
+LEASE_MAX_SECONDS = float(os.environ.get('OCR_LEASE_MAX_SECONDS', '300'))
+LEASE_WATCHDOG_INTERVAL = float(os.environ.get('OCR_LEASE_WATCHDOG_INTERVAL', '30'))
+ENGINE_MAX_INFERENCES = int(os.environ.get('OCR_ENGINE_MAX_INFERENCES', '5000'))
+ENGINE_RSS_GROWTH_MB = int(os.environ.get('OCR_ENGINE_RSS_GROWTH_MB', '1024'))
+
+
+def current_rss_bytes():
+    """读取当前进程常驻内存（字节），不支持时返回0"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+class EngineLease:
+    """引擎租约：借出的引擎通过租约归还（上下文管理器退出或显式release，重复归还无副作用）"""
+
+    def __init__(self, pool, lang, profile, engine, purpose=''):
+        self.pool = pool
+        self.lang = lang
+        self.profile = profile
+        self.engine = engine
+        self.purpose = purpose
+        self.thread_name = threading.current_thread().name
+        self.acquired_at = time.monotonic()
+        self.released = False
+        self.overdue_reported = False
+
+    def __enter__(self):
+        return self.engine
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.release()
+
+    def held_seconds(self):
+        return time.monotonic() - self.acquired_at
+
+    def release(self):
+        """归还引擎"""
+        if self.released:
+            return
+        self.released = True
+        self.pool.end_lease(self)
+
+
 class PaddleOCREnginePool:
-    """线程安全的PaddleOCR引擎池"""
+    """线程安全的PaddleOCR引擎池，按（语言, 流水线配置）分别维护引擎实例"""
+
+    def __init__(self, background=False, langs=None, pool_size=None, profile=DEFAULT_PROFILE):
+        self.pools = {}
+        # 预创建引擎的语言（默认全部）、流水线配置和每个池的引擎数上限（默认按 ENGINE_POOL_SIZES）
+        self.preload_langs = SUPPORTED_LANGS if langs is None else langs
+        self.preload_profile = profile
+        self.pool_size = pool_size
+        self.pool_locks = {}
+        self.created_counts = {}
+        self.warmed_counts = {}
+        self._pools_lock = threading.Lock()
+        self.initializing = True
+        self.init_error = None
+        # 租约与回收状态
+        self.leases = {}
+        # 推理（借出）次数、是否正在重建替换实例、已就绪的替换实例记录在引擎对象的
+        # ocr_inferences / ocr_retiring / ocr_replacement 属性上，随旧实例一起释放
+        self.rebuilding_count = 0
+        self.recycled_counts = {}
+        self.rss_baseline = current_rss_bytes()
+        threading.Thread(target=self._watch_leases, name='engine-lease-watchdog', daemon=True).start()
+        if background:
+            threading.Thread(target=self._initialize_pools, name='engine-pool-init', daemon=True).start()
+        else:
+            self._initialize_pools()
+
+    @staticmethod
+    def pool_name(lang, profile=DEFAULT_PROFILE):
+        """引擎池名称：默认配置直接使用语言名，其他配置为 语言:配置"""
+        return lang if profile == DEFAULT_PROFILE else f"{lang}:{profile}"
+
+    def _engine_threads(self, lang, profile):
+        """该引擎池每个实例的算子内线程数"""
+        name, pool = self._get_pool(lang, profile)
+        return thread_budget.threads_for(name, pool.maxsize)
+
+    def _get_pool(self, lang, profile):
+        """获取（必要时创建）指定语言和配置的引擎池"""
+        name = self.pool_name(lang, profile)
+        with self._pools_lock:
+            if name not in self.pools:
+                if self.pool_size:
+                    max_size = self.pool_size
+                elif profile == DEFAULT_PROFILE:
+                    max_size = ENGINE_POOL_SIZES[lang]
+                else:
+                    max_size = min(ENGINE_POOL_SIZES[lang], EXTRA_PROFILE_POOL_SIZE)
+                self.pools[name] = Queue(maxsize=max_size)
+                self.pool_locks[name] = threading.Lock()
+                self.created_counts[name] = 0
+                self.warmed_counts[name] = 0
+            return name, self.pools[name]
+
+    def _reserve_slot(self, name, pool):
+        """在池容量内预留一个新引擎名额，成功返回True"""
+        with self.pool_locks[name]:
+            if self.created_counts[name] < pool.maxsize:
+                self.created_counts[name] += 1
+                return True
+        return False
 
-    def __init__(self):
-        self.pools = {
-            'ch': Queue(maxsize=3),      # 中文引擎池
-            'en': Queue(maxsize=2),      # 英文引擎池
-            'japan': Queue(maxsize=2),   # 日文引擎池
-            'korean': Queue(maxsize=2),  # 韩文引擎池
-            'server': Queue(maxsize=2),  # Server版本引擎池
-        }
-        self.pool_locks = {
-            'ch': threading.Lock(),
-            'en': threading.Lock(),
-            'japan': threading.Lock(),
-            'korean': threading.Lock(),
-            'server': threading.Lock(),
-        }
-        self._initialize_pools()
+    def _build_engine(self, lang, profile, name):
+        """创建并预热引擎实例（调用前需已预留名额，失败时释放名额）"""
+        try:
+            engine = create_ocr_engine(lang, profile, self._engine_threads(lang, profile))
+        except Exception:
+            with self.pool_locks[name]:
+                self.created_counts[name] -= 1
+            raise
+        if warm_up_engine(engine, name):
+            with self.pool_locks[name]:
+                self.warmed_counts[name] += 1
+        return engine
 
     def _initialize_pools(self):
-        """预创建所有语言的引擎实例 - 适配PaddleOCR 3.1最极简API"""
+        """预创建并预热预加载语言在预加载配置（默认为默认配置）下的引擎实例 - 适配PaddleOCR 3.1最极简API"""
+        profile = self.preload_profile
         try:
-            logger.info(f"开始初始化PaddleOCR引擎池（PaddleOCR 3.1），模型存储目录: {MODEL_DIR}")
-            
-            # 中文引擎池初始化（默认）
-            logger.info("初始化中文引擎池...")
-            for i in range(3):
-                logger.info(f"创建第{i+1}个中文引擎实例")
-                engine = PaddleOCR(lang='ch')  # 只使用lang参数
-                self.pools['ch'].put(engine)
-                logger.info(f"中文引擎实例{i+1}创建完成")
-
-            # 英文引擎池初始化
-            logger.info("初始化英文引擎池...")
-            for i in range(2):
-                logger.info(f"创建第{i+1}个英文引擎实例")
-                engine = PaddleOCR(lang='en')
-                self.pools['en'].put(engine)
-                logger.info(f"英文引擎实例{i+1}创建完成")
-
-            # 日文引擎池初始化
-            logger.info("初始化日文引擎池...")
-            for i in range(2):
-                logger.info(f"创建第{i+1}个日文引擎实例")
-                engine = PaddleOCR(lang='japan')
-                self.pools['japan'].put(engine)
-                logger.info(f"日文引擎实例{i+1}创建完成")
-
-            # 韩文引擎池初始化
-            logger.info("初始化韩文引擎池...")
-            for i in range(2):
-                logger.info(f"创建第{i+1}个韩文引擎实例")
-                engine = PaddleOCR(lang='korean')
-                self.pools['korean'].put(engine)
-                logger.info(f"韩文引擎实例{i+1}创建完成")
-
-            # Server版本引擎池初始化（高精度模型）
-            logger.info("初始化高精度Server引擎池...")
-            for i in range(2):
-                logger.info(f"创建第{i+1}个Server引擎实例")
-                engine = PaddleOCR(lang='ch')  # server也只使用lang参数
-                self.pools['server'].put(engine)
-                logger.info(f"Server引擎实例{i+1}创建完成")
+            logger.info(f"开始初始化PaddleOCR引擎池（PaddleOCR 3.1，配置: {profile}），模型存储目录: {MODEL_DIR}")
+
+            for lang in self.preload_langs:
+                lang_name = LANG_DISPLAY_NAMES[lang]
+                name, pool = self._get_pool(lang, profile)
+                logger.info(f"初始化{lang_name}引擎池...")
+                for i in range(pool.maxsize):
+                    # 请求可能已按需创建了部分实例，池满即停止
+                    if not self._reserve_slot(name, pool):
+                        break
+                    logger.info(f"创建第{i+1}个{lang_name}引擎实例")
+                    engine = self._build_engine(lang, profile, name)
+                    pool.put(engine)
+                    logger.info(f"{lang_name}引擎实例{i+1}创建完成")
 
             logger.info(f"PaddleOCR引擎池初始化成功，支持中英日韩多语言识别，模型存储在: {MODEL_DIR}")
+            # 引擎全部加载和预热后的RSS作为回收判断的基线
+            self.rss_baseline = current_rss_bytes()
 
         except Exception as e:
             logger.error(f"PaddleOCR引擎池初始化失败: {e}")
+            self.init_error = str(e)
             raise e
+        finally:
+            self.initializing = False
+
+    def pool_capacity(self, lang, profile=DEFAULT_PROFILE):
+        """返回(引擎池名称, 引擎数上限)"""
+        name, pool = self._get_pool(lang, profile)
+        return name, pool.maxsize
+
+    def get_readiness(self):
+        """就绪状态：默认配置下每种语言的已预热引擎数均达到要求时就绪"""
+        languages = {}
+        for lang in SUPPORTED_LANGS:
+            name = self.pool_name(lang, DEFAULT_PROFILE)
+            required = min(READY_MIN_ENGINES, ENGINE_POOL_SIZES[lang])
+            warmed = self.warmed_counts.get(name, 0)
+            languages[lang] = {'warmed': warmed, 'required': required, 'ready': warmed >= required}
+        return {
+            'ready': all(info['ready'] for info in languages.values()),
+            'initializing': self.initializing,
+            'init_error': self.init_error,
+            'languages': languages,
+        }
 
-    def get_engine(self, lang='ch'):
-        """获取指定语言的引擎实例"""
-        if lang not in self.pools:
+    def get_engine(self, lang='ch', profile=DEFAULT_PROFILE):
+        """获取指定语言和流水线配置的引擎实例"""
+        if lang not in ENGINE_POOL_SIZES:
             raise ValueError(f"不支持的语言: {lang}")
+        if profile not in OCR_PROFILES:
+            raise ValueError(f"不支持的流水线配置: {profile}")
+
+        name, pool = self._get_pool(lang, profile)
+        try:
+            return self._swap_replaced(name, pool.get_nowait())
+        except Empty:
+            pass
+
+        # 池中暂无空闲实例且未达到上限时，按需创建新实例
+        if self._reserve_slot(name, pool):
+            logger.info(f"按需创建{name}引擎实例")
+            return self._build_engine(lang, profile, name)
 
         try:
             # 从池中获取引擎实例，超时30秒
-            engine = self.pools[lang].get(timeout=30)
-            return engine
+            engine = pool.get(timeout=30)
+            return self._swap_replaced(name, engine)
         except Exception as e:
-            logger.error(f"获取{lang}引擎失败: {e}")
+            logger.error(f"获取{name}引擎失败: {e}")
             # 如果池为空，创建新的引擎实例
-            return self._create_emergency_engine(lang)
-
-    def return_engine(self, lang, engine):
-        """归还引擎实例到池中"""
-        if lang in self.pools and engine is not None:
+            return self._create_emergency_engine(lang, profile)
+
+    def lease(self, lang='ch', profile=DEFAULT_PROFILE, purpose=''):
+        """以租约方式借出引擎实例，租约在 release 或上下文退出时归还"""
+        engine = self.get_engine(lang, profile)
+        lease = EngineLease(self, lang, profile, engine, purpose)
+        with self._pools_lock:
+            self.leases[id(lease)] = lease
+        return lease
+
+    def end_lease(self, lease):
+        """结束租约并归还引擎"""
+        with self._pools_lock:
+            self.leases.pop(id(lease), None)
+        self.return_engine(lease.lang, lease.engine, lease.profile)
+
+    def _watch_leases(self):
+        """看门狗：定期检查借出时间过长的租约（通常是调用方未归还或推理卡住）"""
+        while True:
+            time.sleep(LEASE_WATCHDOG_INTERVAL)
+            for lease in self.get_overdue_leases():
+                if not lease.overdue_reported:
+                    lease.overdue_reported = True
+                    logger.warning(f"引擎租约占用过久: {self.pool_name(lease.lang, lease.profile)} "
+                                   f"已借出{lease.held_seconds():.0f}秒, 线程: {lease.thread_name}, 用途: {lease.purpose}")
+            for holder in engine_scheduler.get_overdue_holders():
+                logger.warning(f"调度名额占用过久: {holder['name']} 已占用{holder['held_seconds']:.0f}秒, "
+                               f"线程: {holder['thread_name']}, 用途: {holder['purpose']}")
+
+    def get_overdue_leases(self):
+        """借出时间超过 LEASE_MAX_SECONDS 的租约"""
+        with self._pools_lock:
+            leases = list(self.leases.values())
+        return [lease for lease in leases if lease.held_seconds() > LEASE_MAX_SECONDS]
+
+    def _recycle_reason(self, engine):
+        """判断引擎是否需要回收，返回原因，不需要时返回None"""
+        if ENGINE_MAX_INFERENCES and getattr(engine, 'ocr_inferences', 0) >= ENGINE_MAX_INFERENCES:
+            return f"推理次数达到{ENGINE_MAX_INFERENCES}"
+        if ENGINE_RSS_GROWTH_MB:
+            rss = current_rss_bytes()
+            if rss and rss - self.rss_baseline > ENGINE_RSS_GROWTH_MB * MB:
+                # 每增长一个阈值只回收一个实例
+                growth = (rss - self.rss_baseline) / MB
+                self.rss_baseline = rss
+                return f"进程RSS增长{growth:.0f}MB"
+        return None
+
+    def _rebuild_engine(self, lang, profile, name, old_engine, reason):
+        """后台创建并预热替换实例，就绪后登记为旧实例的替换"""
+        logger.info(f"回收{name}引擎实例（{reason}），后台重建替换实例")
+        try:
+            new_engine = create_ocr_engine(lang, profile, self._engine_threads(lang, profile))
+            warm_up_engine(new_engine, name)
+        except Exception as e:
+            logger.error(f"重建{name}引擎实例失败，继续使用旧实例: {e}")
+            with self._pools_lock:
+                old_engine.ocr_retiring = False
+                old_engine.ocr_inferences = 0
+                self.rebuilding_count -= 1
+            return
+        with self._pools_lock:
+            old_engine.ocr_replacement = new_engine
+            self.rebuilding_count -= 1
+
+    def _swap_replaced(self, name, engine):
+        """旧实例的替换实例已就绪时换下旧实例"""
+        with self._pools_lock:
+            replacement = getattr(engine, 'ocr_replacement', None)
+            if replacement is None:
+                return engine
+            engine.ocr_replacement = None
+            self.recycled_counts[name] = self.recycled_counts.get(name, 0) + 1
+        logger.info(f"{name}引擎实例已替换为重建的新实例")
+        return replacement
+
+    def return_engine(self, lang, engine, profile=DEFAULT_PROFILE):
+        """归还引擎实例到池中（需要回收时触发后台重建，替换实例就绪后在出入池时换下旧实例）"""
+        name = self.pool_name(lang, profile)
+        if name in self.pools and engine is not None:
+            engine = self._swap_replaced(name, engine)
+            with self._pools_lock:
+                engine.ocr_inferences = getattr(engine, 'ocr_inferences', 0) + 1
+                reason = None if getattr(engine, 'ocr_retiring', False) else self._recycle_reason(engine)
+                if reason:
+                    engine.ocr_retiring = True
+                    self.rebuilding_count += 1
+            if reason:
+                threading.Thread(target=self._rebuild_engine, args=(lang, profile, name, engine, reason),
+                                 name=f'engine-rebuild-{name}', daemon=True).start()
             try:
-                self.pools[lang].put_nowait(engine)
+                self.pools[name].put_nowait(engine)
             except:
                 # 如果池已满，丢弃引擎实例
                 pass
 
-    def _create_emergency_engine(self, lang):
+    def _create_emergency_engine(self, lang, profile=DEFAULT_PROFILE):
         """紧急情况下创建新的引擎实例 - 适配PaddleOCR 3.1最极简API"""
-        logger.warning(f"创建紧急{lang}引擎实例，使用模型目录: {MODEL_DIR}")
-        return PaddleOCR(lang='ch' if lang == 'server' else lang)
+        logger.warning(f"创建紧急{self.pool_name(lang, profile)}引擎实例，使用模型目录: {MODEL_DIR}")
+        return create_ocr_engine(lang, profile, self._engine_threads(lang, profile))
 
     def get_pool_status(self):
         """获取引擎池状态"""
         status = {}
-        for lang, pool in self.pools.items():
-            status[lang] = {
+        for name, pool in list(self.pools.items()):
+            status[name] = {
                 'available': pool.qsize(),
-                'max_size': pool.maxsize
+                'max_size': pool.maxsize,
+                'created': self.created_counts.get(name, 0),
+                'warmed': self.warmed_counts.get(name, 0),
+                'recycled': self.recycled_counts.get(name, 0)
             }
         return status
 
+    def get_lease_status(self):
+        """租约状态：借出中的租约数、超时租约和正在重建的实例数"""
+        with self._pools_lock:
+            leases = list(self.leases.values())
+            rebuilding = self.rebuilding_count
+        return {
+            'active_leases': len(leases),
+            'overdue_leases': [
+                {'pool': self.pool_name(lease.lang, lease.profile), 'held_seconds': round(lease.held_seconds(), 1),
+                 'thread': lease.thread_name, 'purpose': lease.purpose}
+                for lease in leases if lease.held_seconds() > LEASE_MAX_SECONDS
+            ],
+            'rebuilding_engines': rebuilding,
+            'rss_mb': round(current_rss_bytes() / MB, 1),
+        }
+
+
+# 引擎访问调度：优先级类别（请求头或API Key决定）+ 同类别内按客户端近期占用时间公平分配 + 等待老化防饿死
+PRIORITY_CLASSES = {'interactive': 0, 'normal': 1, 'bulk': 2}
+DEFAULT_PRIORITY = os.environ.get('OCR_DEFAULT_PRIORITY', 'normal')
+# API Key到优先级类别的映射，格式: key1:interactive,key2:bulk
+API_KEY_PRIORITIES = {
+    key.strip(): cls.strip()
+    for key, _, cls in (item.partition(':') for item in os.environ.get('OCR_API_KEY_PRIORITIES', '').split(','))
+    if key.strip() and cls.strip() in PRIORITY_CLASSES
+}
+# X-OCR-Priority 和 X-Client-Id 可由任何调用方随意填写，默认只允许用 X-OCR-Priority 声明不高于默认类别的优先级，
+# 公平分配按来源地址区分；部署在会校验或改写这两个请求头的可信网关之后时设置为1，按请求头取值
+TRUST_CLIENT_HEADERS = os.environ.get('OCR_TRUST_CLIENT_HEADERS', '0') == '1'
+SCHEDULER_AGING_SECONDS = float(os.environ.get('OCR_SCHEDULER_AGING', '10'))
+SCHEDULER_USAGE_HALF_LIFE = float(os.environ.get('OCR_SCHEDULER_USAGE_HALF_LIFE', '60'))
+
+
+# 请求截止时间（秒，X-OCR-Deadline 请求头或 timeout 参数），0 表示不限
+DEFAULT_DEADLINE = float(os.environ.get('OCR_DEFAULT_DEADLINE', '0'))
+
+
+class DeadlineExceeded(Exception):
+    """请求已超过截止时间"""
+
+
+class RequestCancelled(Exception):
+    """客户端已断开连接，请求被放弃"""
+
+
+class RequestDeadline:
+    """请求截止时间和取消检查，在排队等待引擎、逐页渲染和推理之间检查"""
+
+    def __init__(self, timeout=None, is_cancelled=None):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout if timeout else None
+        self.is_cancelled = is_cancelled
+
+    def remaining(self):
+        """剩余秒数，不限时返回None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def check(self):
+        """客户端已断开时抛出RequestCancelled，超过截止时间时抛出DeadlineExceeded"""
+        if self.is_cancelled is not None and self.is_cancelled():
+            raise RequestCancelled("客户端已断开连接")
+        if self.expires_at is not None and time.monotonic() >= self.expires_at:
+            raise DeadlineExceeded(f"请求超过截止时间({self.timeout:g}秒)")
+
+
+def make_request_deadline(headers, timeout_value=None, is_cancelled=None):
+    """从 timeout 参数或 X-OCR-Deadline 请求头构造请求截止时间，格式错误时抛出ValueError"""
+    raw_value = timeout_value if timeout_value not in (None, '') else headers.get('X-OCR-Deadline')
+    if raw_value in (None, ''):
+        timeout = DEFAULT_DEADLINE
+    else:
+        try:
+            timeout = float(raw_value)
+        except (TypeError, ValueError):
+            raise ValueError(f"无效的截止时间: {raw_value}")
+        if timeout <= 0:
+            raise ValueError(f"无效的截止时间: {raw_value}")
+    return RequestDeadline(timeout or None, is_cancelled)
+
+
+class ScheduleTicket:
+    """请求的调度凭据：优先级类别和用于公平分配的客户端标识"""
+
+    def __init__(self, priority=DEFAULT_PRIORITY, client_id='anonymous'):
+        self.priority = priority if priority in PRIORITY_CLASSES else DEFAULT_PRIORITY
+        self.client_id = client_id
+
+
+def make_schedule_ticket(headers, remote_addr=None):
+    """从请求头构造调度凭据：已配置的API Key决定优先级和客户端标识；其余请求按来源地址区分，
+    X-OCR-Priority 只能降低优先级（TRUST_CLIENT_HEADERS 时不限，并按 X-Client-Id 区分客户端）"""
+    api_key = headers.get('X-API-Key')
+    if api_key in API_KEY_PRIORITIES:
+        client_id = 'key:' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+        return ScheduleTicket(API_KEY_PRIORITIES[api_key], client_id)
+
+    client_id = (TRUST_CLIENT_HEADERS and headers.get('X-Client-Id')) or remote_addr or 'anonymous'
+    priority = (headers.get('X-OCR-Priority') or DEFAULT_PRIORITY).strip().lower()
+    default_rank = PRIORITY_CLASSES.get(DEFAULT_PRIORITY, PRIORITY_CLASSES['normal'])
+    if priority not in PRIORITY_CLASSES or (not TRUST_CLIENT_HEADERS and PRIORITY_CLASSES[priority] < default_rank):
+        priority = DEFAULT_PRIORITY
+    return ScheduleTicket(priority, client_id)
+
+
+class EngineScheduler:
+    """引擎访问调度器：每个引擎池按容量发放使用名额，空出名额时按
+    (老化后的优先级类别, 客户端近期占用时间, 到达顺序) 选出下一个请求；多页文档逐页申请名额"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.in_use = {}
+        self.waiters = []
+        self.client_usage = {}  # 客户端 -> (衰减后的占用秒数, 更新时间)
+        self.holders = {}  # 不经引擎租约的名额（单模型池、分阶段流水线）的占用记录，供看门狗检查
+        self._sequence = 0
+
+    def _usage(self, client_id, now):
+        usage, updated_at = self.client_usage.get(client_id, (0.0, now))
+        return usage * 0.5 ** ((now - updated_at) / SCHEDULER_USAGE_HALF_LIFE)
+
+    def _rank(self, waiter, now):
+        waited = now - waiter['since']
+        priority = max(0, PRIORITY_CLASSES[waiter['ticket'].priority] - int(waited / SCHEDULER_AGING_SECONDS))
+        return priority, self._usage(waiter['ticket'].client_id, now), waiter['sequence']
+
+    def _is_next(self, waiter, capacity):
+        """名额未满且该请求在同一引擎池的等待者中排名第一"""
+        if self.in_use.get(waiter['name'], 0) >= capacity:
+            return False
+        now = time.monotonic()
+        candidates = [w for w in self.waiters if w['name'] == waiter['name']]
+        return min(candidates, key=lambda w: self._rank(w, now)) is waiter
+
+    def acquire(self, name, capacity, ticket, deadline=None, purpose=None):
+        """阻塞直到获得指定引擎池的一个使用名额；截止时间已到或客户端断开时放弃排队。
+        指定 purpose 时登记占用记录（名额不对应引擎租约时由看门狗检查占用时长），返回记录编号"""
+        with self._cond:
+            self._sequence += 1
+            waiter = {'name': name, 'ticket': ticket, 'since': time.monotonic(), 'sequence': self._sequence}
+            self.waiters.append(waiter)
+            try:
+                # 定时醒来重新排名，使等待老化生效
+                while not self._is_next(waiter, capacity):
+                    if deadline is not None:
+                        deadline.check()
+                    self._cond.wait(timeout=1.0)
+                self.in_use[name] = self.in_use.get(name, 0) + 1
+            finally:
+                self.waiters.remove(waiter)
+                self._cond.notify_all()
+            if purpose is None:
+                return None
+            self.holders[waiter['sequence']] = {
+                'name': name, 'purpose': purpose, 'thread_name': threading.current_thread().name,
+                'acquired_at': time.monotonic(), 'overdue_reported': False,
+            }
+            return waiter['sequence']
+
+    def release(self, name, ticket, service_seconds, holder_id=None):
+        """归还名额并累计客户端占用时间"""
+        with self._cond:
+            self.holders.pop(holder_id, None)
+            self.in_use[name] = max(0, self.in_use.get(name, 0) - 1)
+            now = time.monotonic()
+            self.client_usage[ticket.client_id] = (self._usage(ticket.client_id, now) + service_seconds, now)
+            self._cond.notify_all()
+
+    @contextmanager
+    def checkout(self, lang, profile, ticket=None, deadline=None):
+        """按调度顺序借用引擎并保证归还；lang=auto或走检测/识别分离流水线时只占用按单模型池大小发放的调度名额，不借用引擎"""
+        ticket = ticket or ScheduleTicket()
+        needs_engine = False
+        if lang == AUTO_LANG:
+            name, capacity = AUTO_LANG, TEXTLINE_MODEL_POOL_SIZE
+        elif uses_split_pipeline(profile):
+            name, capacity = f"{lang}:split", TEXTLINE_MODEL_POOL_SIZE
+        else:
+            name, capacity = ocr_engine_pool.pool_capacity(lang, profile)
+            needs_engine = True
+        purpose = f"client={ticket.client_id}"
+        holder_id = self.acquire(name, capacity, ticket, deadline, purpose=None if needs_engine else purpose)
+        started = time.monotonic()
+        lease = None
+        try:
+            if needs_engine:
+                lease = ocr_engine_pool.lease(lang, profile, purpose=purpose)
+            yield lease.engine if lease else None
+        finally:
+            if lease is not None:
+                lease.release()
+            self.release(name, ticket, time.monotonic() - started, holder_id)
+
+    def get_overdue_holders(self):
+        """占用时间超过 LEASE_MAX_SECONDS 且尚未告警的名额记录（标记为已告警）"""
+        now = time.monotonic()
+        overdue = []
+        with self._cond:
+            for holder in self.holders.values():
+                if not holder['overdue_reported'] and now - holder['acquired_at'] > LEASE_MAX_SECONDS:
+                    holder['overdue_reported'] = True
+                    overdue.append(dict(holder, held_seconds=now - holder['acquired_at']))
+        return overdue
+
+    def get_status(self):
+        """调度器状态：各引擎池占用名额数和各优先级类别的等待请求数"""
+        with self._cond:
+            now = time.monotonic()
+            waiting = {cls: 0 for cls in PRIORITY_CLASSES}
+            for waiter in self.waiters:
+                waiting[waiter['ticket'].priority] += 1
+            return {
+                'in_use': dict(self.in_use),
+                'waiting': waiting,
+                'overdue_holders': sum(1 for holder in self.holders.values()
+                                       if now - holder['acquired_at'] > LEASE_MAX_SECONDS),
+                'client_usage_seconds': {
+                    client_id: round(self._usage(client_id, now), 2) for client_id in self.client_usage
+                },
+            }
+
+
+engine_scheduler = EngineScheduler()
+
+
+def create_textline_model(kind, model_name, params=None):
+    """创建检测/方向分类/识别单模型实例"""
+    params = dict(params or {})
+    # 分阶段流水线中检测和识别线程同时推理，两组实例一起平分预算
+    concurrency = TEXTLINE_MODEL_POOL_SIZE * (2 if STAGED_PIPELINE else 1)
+    cpu_threads = thread_budget.threads_for('textline', concurrency)
+    if OCR_BACKEND == 'onnx':
+        model_classes = {'det': OnnxTextDetector, 'cls': OnnxTextlineClassifier, 'rec': OnnxTextRecognizer}
+    else:
+        model_classes = {'det': TextDetection, 'cls': TextLineOrientationClassification, 'rec': TextRecognition}
+        if OFFLINE_MODE:
+            params['model_dir'] = offline_model_dir(model_name)
+    if kind not in model_classes:
+        raise ValueError(f"未知的模型类型: {kind}")
+    return thread_budget.assign(model_classes[kind](model_name=model_name, cpu_threads=cpu_threads, **params),
+                                cpu_threads)
+
+
+class ModelPoolBusy(Exception):
+    """单模型实例池繁忙：实例全部借出且等待超时（503）"""
+
+
+class TextLineModelPool:
+    """线程安全的单模型实例池，供检测/识别分离流水线使用，按模型名称和参数懒加载"""
+
+    def __init__(self, max_size=TEXTLINE_MODEL_POOL_SIZE):
+        self.max_size = max_size
+        self.pools = {}
+        self.created_counts = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def model_key(kind, model_name, params=None):
+        """模型实例键：类型:模型名[:参数]"""
+        key = f"{kind}:{model_name}"
+        if params:
+            key += ':' + ','.join(f"{k}={v}" for k, v in sorted(params.items()))
+        return key
+
+    def get_model(self, kind, model_name, params=None):
+        """获取模型实例，池未满时按需创建"""
+        key = self.model_key(kind, model_name, params)
+        with self._lock:
+            if key not in self.pools:
+                self.pools[key] = Queue(maxsize=self.max_size)
+                self.created_counts[key] = 0
+            pool = self.pools[key]
+            try:
+                return key, pool.get_nowait()
+            except Empty:
+                can_create = self.created_counts[key] < self.max_size
+                if can_create:
+                    self.created_counts[key] += 1
+
+        if can_create:
+            try:
+                logger.info(f"创建单模型实例: {key}")
+                return key, create_textline_model(kind, model_name, params)
+            except Exception:
+                with self._lock:
+                    self.created_counts[key] -= 1
+                raise
+        try:
+            return key, pool.get(timeout=30)
+        except Empty:
+            raise ModelPoolBusy(f"单模型实例池繁忙: {key} 的 {self.max_size} 个实例均已借出，等待30秒超时")
+
+    def return_model(self, key, model):
+        """归还模型实例"""
+        if key in self.pools and model is not None:
+            try:
+                self.pools[key].put_nowait(model)
+            except:
+                pass
+
+    @contextmanager
+    def checkout(self, kind, model_name, params=None):
+        """以上下文管理器方式借用模型实例，保证归还"""
+        key, model = self.get_model(kind, model_name, params)
+        try:
+            yield model
+        finally:
+            self.return_model(key, model)
+
+    def get_pool_status(self):
+        """获取单模型池状态"""
+        return {
+            key: {'available': pool.qsize(), 'created': self.created_counts.get(key, 0)}
+            for key, pool in list(self.pools.items())
+        }
+
+
+class TextLineRecCache:
+    """线程安全的文本行识别结果LRU缓存，键为规范化文本行图像的哈希加识别模型名"""
+
+    def __init__(self, max_size=REC_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    @staticmethod
+    def crop_key(crop, model_name):
+        """规范化文本行图像（灰度、固定高度、4位量化）后计算哈希，吸收渲染和缩放带来的微小差异"""
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        width = max(1, round(gray.shape[1] * REC_CACHE_NORM_HEIGHT / max(1, gray.shape[0])))
+        normalized = cv2.resize(gray, (width, REC_CACHE_NORM_HEIGHT), interpolation=cv2.INTER_AREA) >> 4
+        digest = hashlib.sha1(np.ascontiguousarray(normalized).tobytes()).hexdigest()
+        return f"{model_name}:{width}:{digest}"
+
+    def get(self, key):
+        """命中时返回 (文本, 置信度) 并移到最近使用位置，未命中返回None"""
+        with self._lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """写入识别结果，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def get_status(self):
+        """缓存状态和命中率"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+rec_cache = TextLineRecCache()
+
+
+# ONNX Runtime 推理后端：用 paddle2onnx 导出的检测/方向分类/识别模型替代 Paddle Inference，
+# 前后处理与PP-OCRv5一致，输出与PaddleOCR predict相同的结果结构
+def create_onnx_session(model_name, cpu_threads=1):
+    """加载模型目录中的 inference.onnx 创建推理会话，cpu_threads 为算子内线程数（由线程预算确定）"""
+    if ort is None:
+        raise RuntimeError("ONNX后端需要安装onnxruntime: pip install onnxruntime")
+    model_path = os.path.join(model_dir_path(model_name), 'inference.onnx')
+    if not os.path.exists(model_path):
+        raise ModelManifestError(f"ONNX模型不存在: {model_path}")
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = cpu_threads
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+
+def load_onnx_model_config(model_name):
+    """读取模型目录中随模型导出的 inference.yml，不存在时返回空字典"""
+    config_path = os.path.join(model_dir_path(model_name), 'inference.yml')
+    if not os.path.exists(config_path):
+        return {}
+    import yaml
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+
+class OnnxTextDetector:
+    """PP-OCRv5 DB文本检测（ONNX），predict 输出与 paddleocr.TextDetection 一致"""
+
+    def __init__(self, model_name, limit_side_len=64, limit_type='min', thresh=0.3,
+                 box_thresh=0.6, unclip_ratio=1.5, max_side_limit=4000, max_candidates=1000, cpu_threads=1):
+        self.session = create_onnx_session(model_name, cpu_threads)
+        self.input_name = self.session.get_inputs()[0].name
+        self.limit_side_len = limit_side_len
+        self.limit_type = limit_type
+        self.thresh = thresh
+        self.box_thresh = box_thresh
+        self.unclip_ratio = unclip_ratio
+        self.max_side_limit = max_side_limit
+        self.max_candidates = max_candidates
+        self.mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+        self.std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+    def _resize(self, img):
+        height, width = img.shape[:2]
+        if self.limit_type == 'max':
+            ratio = min(1.0, self.limit_side_len / max(height, width))
+        else:
+            ratio = max(1.0, self.limit_side_len / min(height, width))
+        if max(height, width) * ratio > self.max_side_limit:
+            ratio = self.max_side_limit / max(height, width)
+        resize_h = max(32, int(round(height * ratio / 32) * 32))
+        resize_w = max(32, int(round(width * ratio / 32) * 32))
+        return cv2.resize(img, (resize_w, resize_h)), resize_h / height, resize_w / width
+
+    @staticmethod
+    def _mini_box(contour):
+        rect = cv2.minAreaRect(contour)
+        points = sorted(cv2.boxPoints(rect).tolist(), key=lambda p: p[0])
+        left = [points[0], points[1]] if points[0][1] <= points[1][1] else [points[1], points[0]]
+        right = [points[2], points[3]] if points[2][1] <= points[3][1] else [points[3], points[2]]
+        return np.array([left[0], right[0], right[1], left[1]], dtype=np.float32), rect
+
+    @staticmethod
+    def _box_score(pred, box):
+        height, width = pred.shape
+        xmin = int(np.clip(np.floor(box[:, 0].min()), 0, width - 1))
+        xmax = int(np.clip(np.ceil(box[:, 0].max()), 0, width - 1))
+        ymin = int(np.clip(np.floor(box[:, 1].min()), 0, height - 1))
+        ymax = int(np.clip(np.ceil(box[:, 1].max()), 0, height - 1))
+        mask = np.zeros((ymax - ymin + 1, xmax - xmin + 1), dtype=np.uint8)
+        shifted = box - np.array([xmin, ymin], dtype=np.float32)
+        cv2.fillPoly(mask, shifted.reshape(1, -1, 2).astype(np.int32), 1)
+        return cv2.mean(pred[ymin:ymax + 1, xmin:xmax + 1], mask)[0]
+
+    def _unclip(self, box):
+        """DB后处理的unclip：文本框按 面积 × unclip_ratio / 周长 向外偏移（圆角连接），返回外扩后的多边形列表"""
+        distance = cv2.contourArea(box) * self.unclip_ratio / cv2.arcLength(box, True)
+        if pyclipper is not None:
+            offset = pyclipper.PyclipperOffset()
+            offset.AddPath(box.tolist(), pyclipper.JT_ROUND, pyclipper.ET_CLOSEDPOLYGON)
+            return [np.array(path, dtype=np.float32) for path in offset.Execute(distance)]
+        # 凸多边形的圆角偏移即与半径为 distance 的圆的闵可夫斯基和：各顶点周围的圆上采样点的凸包
+        angles = np.linspace(0, 2 * np.pi, 32, endpoint=False)
+        circle = np.stack([np.cos(angles), np.sin(angles)], axis=1).astype(np.float32) * distance
+        points = (box[:, np.newaxis, :] + circle[np.newaxis]).reshape(-1, 2)
+        return [cv2.convexHull(points).reshape(-1, 2)]
+
+    def _boxes_from_bitmap(self, pred, src_height, src_width):
+        bitmap = (pred > self.thresh).astype(np.uint8)
+        contours, _ = cv2.findContours(bitmap * 255, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        scale_x = src_width / pred.shape[1]
+        scale_y = src_height / pred.shape[0]
+        polys, scores = [], []
+        for contour in contours[:self.max_candidates]:
+            box, rect = self._mini_box(contour)
+            if min(rect[1]) < 3:
+                continue
+            score = self._box_score(pred, box)
+            if score < self.box_thresh:
+                continue
+            # 与PaddleOCR的DB后处理一致：对最小外接矩形做unclip，再取外扩多边形的最小外接矩形
+            expanded_polys = self._unclip(box)
+            if len(expanded_polys) != 1:
+                continue
+            box, expanded = self._mini_box(expanded_polys[0].reshape(-1, 1, 2))
+            if min(expanded[1]) < 5:
+                continue
+            box[:, 0] = np.clip(np.round(box[:, 0] * scale_x), 0, src_width)
+            box[:, 1] = np.clip(np.round(box[:, 1] * scale_y), 0, src_height)
+            polys.append(box.astype(np.int32))
+            scores.append(float(score))
+        return polys, scores
+
+    def predict(self, input, batch_size=1):
+        img = load_image_bgr(input)
+        resized, _, _ = self._resize(img)
+        tensor = ((resized.astype(np.float32) / 255.0 - self.mean) / self.std).transpose(2, 0, 1)[np.newaxis]
+        pred = self.session.run(None, {self.input_name: tensor})[0][0, 0]
+        polys, scores = self._boxes_from_bitmap(pred, img.shape[0], img.shape[1])
+        return [{'dt_polys': np.array(polys).reshape(-1, 4, 2), 'dt_scores': scores}]
+
+
+class OnnxTextlineClassifier:
+    """文本行方向分类（ONNX），predict 输出与 paddleocr.TextLineOrientationClassification 一致"""
+
+    def __init__(self, model_name, cpu_threads=1):
+        self.session = create_onnx_session(model_name, cpu_threads)
+        self.input_name = self.session.get_inputs()[0].name
+        config = load_onnx_model_config(model_name)
+        self.labels = (config.get('PostProcess', {}).get('Topk', {}).get('label_list')
+                       or ['0_degree', '180_degree'])
+        self.mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+        self.std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+    def predict(self, input, batch_size=TEXTLINE_REC_BATCH_SIZE):
+        crops = input if isinstance(input, list) else [input]
+        results = []
+        for start in range(0, len(crops), batch_size):
+            batch = [
+                ((cv2.resize(crop, (160, 80)).astype(np.float32) / 255.0 - self.mean) / self.std).transpose(2, 0, 1)
+                for crop in crops[start:start + batch_size]
+            ]
+            probs = self.session.run(None, {self.input_name: np.stack(batch)})[0]
+            for prob in probs:
+                class_id = int(np.argmax(prob))
+                results.append({'class_ids': [class_id], 'scores': [float(prob[class_id])],
+                                'label_names': [self.labels[class_id]]})
+        return results
+
+
+class OnnxTextRecognizer:
+    """PP-OCRv5 CTC文本识别（ONNX），predict 输出与 paddleocr.TextRecognition 一致"""
+
+    def __init__(self, model_name, image_height=48, base_width=320, cpu_threads=1):
+        self.session = create_onnx_session(model_name, cpu_threads)
+        self.input_name = self.session.get_inputs()[0].name
+        self.image_height = image_height
+        self.base_width = base_width
+        self.characters = ['blank'] + self._load_characters(model_name) + [' ']
+
+    @staticmethod
+    def _load_characters(model_name):
+        """字符字典：优先读取 inference.yml 的 PostProcess.character_dict，其次读取 dict.txt"""
+        config = load_onnx_model_config(model_name)
+        characters = config.get('PostProcess', {}).get('character_dict')
+        if characters:
+            return [str(c) for c in characters]
+        dict_path = os.path.join(model_dir_path(model_name), 'dict.txt')
+        if os.path.exists(dict_path):
+            with open(dict_path, 'r', encoding='utf-8') as f:
+                return [line.rstrip('\r\n') for line in f]
+        raise ModelManifestError(f"识别模型缺少字符字典: {model_name}")
+
+    def _normalize(self, crop, target_width):
+        height, width = crop.shape[:2]
+        resized_w = min(target_width, int(math.ceil(self.image_height * width / max(height, 1))))
+        resized = cv2.resize(crop, (max(resized_w, 1), self.image_height)).astype(np.float32)
+        tensor = np.zeros((3, self.image_height, target_width), dtype=np.float32)
+        tensor[:, :, :resized.shape[1]] = ((resized / 255.0 - 0.5) / 0.5).transpose(2, 0, 1)
+        return tensor
+
+    def _decode(self, probs):
+        indices = probs.argmax(axis=1)
+        max_probs = probs.max(axis=1)
+        keep = indices != 0
+        keep[1:] &= indices[1:] != indices[:-1]
+        chars = [self.characters[i] for i in indices[keep] if i < len(self.characters)]
+        score = float(max_probs[keep].mean()) if keep.any() else 0.0
+        return ''.join(chars), score
+
+    def predict(self, input, batch_size=TEXTLINE_REC_BATCH_SIZE):
+        crops = input if isinstance(input, list) else [input]
+        # 按宽高比排序后分批，减少同批次内的填充
+        order = sorted(range(len(crops)), key=lambda i: crops[i].shape[1] / max(crops[i].shape[0], 1))
+        results = [None] * len(crops)
+        for start in range(0, len(order), batch_size):
+            batch_indices = order[start:start + batch_size]
+            max_ratio = max([self.base_width / self.image_height]
+                            + [crops[i].shape[1] / max(crops[i].shape[0], 1) for i in batch_indices])
+            target_width = int(self.image_height * max_ratio)
+            batch = np.stack([self._normalize(crops[i], target_width) for i in batch_indices])
+            probs = self.session.run(None, {self.input_name: batch})[0]
+            for i, prob in zip(batch_indices, probs):
+                text, score = self._decode(prob)
+                results[i] = {'rec_text': text, 'rec_score': score}
+        return results
+
+
+class OnnxOCREngine:
+    """ONNX Runtime 版OCR引擎：检测 + 文本行方向分类(可选) + 识别，predict 输出与 PaddleOCR 一致
+
+    各子模型的会话使用 cpu_threads 个算子内线程，推理时各自从线程预算中领取，引擎本身不占用预算。
+    """
+
+    def __init__(self, lang, profile=DEFAULT_PROFILE, cpu_threads=1):
+        names = required_model_names(lang, profile)
+        params = OCR_PROFILES[profile]['params']
+        skipped = [key for key in ('use_doc_orientation_classify', 'use_doc_unwarping') if params.get(key)]
+        if skipped:
+            logger.warning(f"ONNX后端不支持文档方向分类/文档矫正，{profile}配置已跳过: {skipped}")
+        self.detector = thread_budget.assign(
+            OnnxTextDetector(names['det'], cpu_threads=cpu_threads, **textline_det_params(profile)), cpu_threads)
+        self.classifier = thread_budget.assign(
+            OnnxTextlineClassifier(names['textline_ori'], cpu_threads), cpu_threads) if 'textline_ori' in names else None
+        self.recognizer = thread_budget.assign(OnnxTextRecognizer(names['rec'], cpu_threads=cpu_threads), cpu_threads)
+
+    def predict(self, input):
+        img = load_image_bgr(input)
+        polys = run_text_detection(self.detector, img)
+        crops = [crop_text_line(img, poly) for poly in polys]
+        if self.classifier is not None:
+            crops = run_textline_orientation(self.classifier, crops)
+        recognized = run_text_recognition(self.recognizer, crops)
+        return [{
+            'rec_texts': [text for text, _ in recognized],
+            'rec_scores': [score for _, score in recognized],
+            'rec_polys': polys,
+        }]
+
 
 # OCR相关命名空间
 ocr_ns = api.namespace('ocr', description='PaddleOCR V5文字识别操作')
 
-# 初始化PaddleOCR引擎池
-try:
-    # 检查和准备模型文件
-    if not check_and_prepare_models():
-        logger.error("模型目录权限检查失败，可能影响模型下载")
-    
-    logger.info("开始创建PaddleOCR引擎池...")
-    ocr_engine_pool = PaddleOCREnginePool()
-    logger.info("PaddleOCR引擎池创建成功")
-except Exception as e:
-    logger.error(f"PaddleOCR引擎池初始化失败: {e}")
-    ocr_engine_pool = None
-
-# 确保临时文件目录存在
-TMP_DIR = os.path.join(os.getcwd(), 'picture')
-os.makedirs(TMP_DIR, exist_ok=True)
+# PaddleOCR引擎池
+ocr_engine_pool = None
+
+
+def init_engine_pool(langs=None, pool_size=None, profile=DEFAULT_PROFILE):
+    """检查模型并创建PaddleOCR引擎池（预加载 profile 配置的引擎）；离线模式下模型清单校验失败时直接退出进程"""
+    global ocr_engine_pool
+    try:
+        # 检查和准备模型文件
+        if not check_and_prepare_models():
+            logger.error("模型目录权限检查失败，可能影响模型下载")
+
+        logger.info("开始创建PaddleOCR引擎池...")
+        ocr_engine_pool = PaddleOCREnginePool(background=BACKGROUND_POOL_INIT, langs=langs, pool_size=pool_size,
+                                              profile=profile)
+        logger.info("PaddleOCR引擎池创建成功" + ("（后台初始化中）" if BACKGROUND_POOL_INIT else ""))
+    except ModelManifestError as e:
+        logger.error(f"模型清单校验失败，服务无法在离线模式下启动: {e}")
+        raise SystemExit(f"模型清单校验失败: {e}")
+    except Exception as e:
+        logger.error(f"PaddleOCR引擎池初始化失败: {e}")
+        ocr_engine_pool = None
+    return ocr_engine_pool
+
+
+# 检测/识别分离流水线的单模型池（按需加载）
+textline_model_pool = TextLineModelPool()
+
+# 启动暂存目录清理线程（启动时先清理一次上次运行遗留的文件）
+cleanup_spool_dir()
+start_spool_janitor()
+
+# 支持的上传/下载文件格式
+SUPPORTED_FILE_FORMATS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.pdf']
+# 识别接口的响应输出格式；响应体不小于 COMPRESS_MIN_BYTES 且客户端接受gzip时压缩
+OUTPUT_FORMATS = ['json', 'text', 'msgpack']
+COMPRESS_MIN_BYTES = int(os.environ.get('OCR_COMPRESS_MIN_BYTES', '1024'))
 
 # 定义文件上传解析器
 file_parser = api.parser()
@@ -251,8 +1739,54 @@ file_parser.add_argument('lang', location='form',
                          type=str,
                          required=False,
                          default='ch',
-                         choices=['ch', 'en', 'japan', 'korean', 'server'],
-                         help='识别语言类型：ch(中文), en(英文), japan(日文), korean(韩文), server(高精度中文)')
+                         choices=SUPPORTED_LANGS + [AUTO_LANG],
+                         help='识别语言类型：ch(中文), en(英文), japan(日文), korean(韩文), server(高精度中文), auto(自动判断文字系统，不做文档方向分类和矫正)')
+file_parser.add_argument('profile', location='form',
+                         type=str,
+                         required=False,
+                         default=DEFAULT_PROFILE,
+                         choices=list(OCR_PROFILES.keys()),
+                         help='流水线配置：fast(快速), balanced(均衡), accurate(高精度，启用全部预处理)')
+
+
+def add_page_render_arguments(parser, location=None):
+    """添加多页文档的页码范围和PDF渲染分辨率参数"""
+    kwargs = {'location': location} if location else {}
+    parser.add_argument('pages', type=str, required=False, **kwargs,
+                        help='页码范围（PDF/多页TIFF），如 "1-3,5" 或 "2-"，页码从1开始，默认全部页')
+    parser.add_argument('dpi', type=int, required=False, **kwargs,
+                        help=f'PDF渲染DPI（固定DPI或其他策略的上限），默认{PDF_DEFAULT_DPI}')
+    parser.add_argument('dpi_mode', type=str, required=False, choices=PDF_DPI_MODES, **kwargs,
+                        help='PDF渲染DPI策略：fixed(固定DPI), max_pixels(按单页最大像素数限制), page_size(按页面尺寸限制长边像素)')
+    parser.add_argument('max_pixels', type=int, required=False, **kwargs,
+                        help=f'dpi_mode=max_pixels时单页最大像素数，默认{PDF_DEFAULT_MAX_PIXELS}')
+
+
+add_page_render_arguments(file_parser, location='form')
+file_parser.add_argument('timeout', location='form', type=float, required=False,
+                         help='请求截止时间（秒），也可用 X-OCR-Deadline 请求头；超时后跳过剩余页面并返回已完成页面的部分结果')
+
+
+def add_output_arguments(parser, location=None):
+    """添加响应输出格式参数"""
+    kwargs = {'location': location} if location else {}
+    parser.add_argument('format', type=str, required=False, default='json', choices=OUTPUT_FORMATS, **kwargs,
+                        help='输出格式：json(默认), text(纯文本，每行一个文本区域), msgpack(MessagePack二进制)')
+    parser.add_argument('int_coords', type=inputs.boolean, required=False, default=False, **kwargs,
+                        help='坐标四舍五入为整数，减小响应体积')
+
+
+add_output_arguments(file_parser, location='form')
+
+
+def add_callback_arguments(parser, location=None):
+    """添加完成回调地址参数"""
+    kwargs = {'location': location} if location else {}
+    parser.add_argument('callback_url', type=str, required=False, **kwargs,
+                        help='完成回调地址（http/https）：指定后立即返回202和job_id，识别完成后把结果POST到该地址')
+
+
+add_callback_arguments(file_parser, location='form')
 
 # URL识别的解析器
 url_parser = api.parser()
@@ -262,44 +1796,53 @@ url_parser.add_argument('url',
 url_parser.add_argument('lang',
                         required=False,
                         default='ch',
-                        choices=['ch', 'en', 'japan', 'korean', 'server'],
-                        help='识别语言类型：ch(中文), en(英文), japan(日文), korean(韩文), server(高精度中文)')
+                        choices=SUPPORTED_LANGS + [AUTO_LANG],
+                        help='识别语言类型：ch(中文), en(英文), japan(日文), korean(韩文), server(高精度中文), auto(自动判断文字系统，不做文档方向分类和矫正)')
+url_parser.add_argument('profile',
+                        required=False,
+                        default=DEFAULT_PROFILE,
+                        choices=list(OCR_PROFILES.keys()),
+                        help='流水线配置：fast(快速), balanced(均衡), accurate(高精度，启用全部预处理)')
+add_page_render_arguments(url_parser)
+url_parser.add_argument('timeout', type=float, required=False,
+                        help='请求截止时间（秒），也可用 X-OCR-Deadline 请求头；超时后跳过剩余页面并返回已完成页面的部分结果')
+add_output_arguments(url_parser)
+add_callback_arguments(url_parser)
 
 # OCR结果响应模型
 ocr_model = api.model('OCRResult', {
     'message': fields.Raw(description='OCR识别结果或错误信息', required=True),
-    'error_type': fields.String(description='错误类型：HTTP_PARSE|FILE_PROCESS|OCR_ENGINE|SYSTEM_ERROR', required=False),
+    'error_type': fields.String(description='错误类型：HTTP_PARSE|FILE_PROCESS|OCR_ENGINE|DEADLINE|CANCELLED|MEMORY_BUDGET|SYSTEM_ERROR', required=False),
     'error_details': fields.String(description='详细错误信息', required=False),
-    'suggestions': fields.List(fields.String, description='解决建议列表', required=False)
+    'suggestions': fields.List(fields.String, description='解决建议列表', required=False),
+    'partial': fields.Boolean(description='是否因截止时间跳过了部分页面', required=False),
+    'completed_pages': fields.List(fields.Integer, description='多页文档中已完成识别的页码', required=False),
+    'pages': fields.Raw(description='多页文档每页的处理方式：ocr(识别)/blank(空白页跳过)/duplicate(复用duplicate_of页结果)', required=False),
+    'job_id': fields.String(description='回调模式下的任务ID，回调请求中同时放在 X-OCR-Job-Id 头', required=False)
 })
 
 
+def get_page_render_options(args):
+    """从请求参数中提取页码范围和PDF渲染选项，页码范围格式错误时抛出ValueError"""
+    options = {
+        'pages': args.get('pages') or None,
+        'dpi': args.get('dpi') or None,
+        'dpi_mode': args.get('dpi_mode') or None,
+        'max_pixels': args.get('max_pixels') or None,
+    }
+    parse_page_ranges(options['pages'])
+    if options['dpi'] is not None and options['dpi'] <= 0:
+        raise ValueError(f"无效的DPI: {options['dpi']}")
+    if options['max_pixels'] is not None and options['max_pixels'] <= 0:
+        raise ValueError(f"无效的最大像素数: {options['max_pixels']}")
+    return options
+
+
 def extract_filename_from_url(url):
     """从URL提取文件名"""
     return url.split('/')[-1]
 
 
-def safe_filename_handler(original_filename):
-    """处理中文文件名编码问题，生成安全的临时文件名"""
-    try:
-        if not original_filename:
-            return str(uuid.uuid4()) + '.tmp'
-
-        # 获取文件扩展名
-        file_path = Path(original_filename)
-        file_ext = file_path.suffix.lower()
-
-        # 生成UUID文件名，保留原始扩展名
-        safe_name = str(uuid.uuid4()) + file_ext
-
-        logger.info(f"文件名处理: '{original_filename}' -> '{safe_name}'")
-        return safe_name
-
-    except Exception as e:
-        logger.warning(f"文件名处理失败: {e}")
-        return str(uuid.uuid4()) + '.tmp'
-
-
 def download_image(url, file_path):
     """从URL下载图像文件"""
     with requests.get(url, stream=True) as response:
@@ -309,6 +1852,431 @@ def download_image(url, file_path):
                 file.write(chunk)
 
 
+# 远程PDF按需读取：/ocr/url 只识别PDF的部分页面时，用HTTP Range请求按块读取交叉引用表、页面树和目标页面引用到的对象，
+# 写入与远程文件同样大小的本地稀疏文件（未读取的区域为空洞），PyMuPDF打开该文件时只会访问已写入的区域；
+# 服务器不支持Range、PDF结构无法解析或需要读取的数据过多时整文件下载
+RANGE_READ_ENABLED = os.environ.get('OCR_RANGE_READ', '1') == '1'
+RANGE_BLOCK_SIZE = int(os.environ.get('OCR_RANGE_BLOCK_SIZE', str(256 * 1024)))
+# 小于该大小的文件直接整文件下载
+RANGE_MIN_FILE_SIZE = int(os.environ.get('OCR_RANGE_MIN_SIZE', str(4 * 1024 * 1024)))
+# 按需读取的数据量超过文件大小的该比例时放弃，改为整文件下载
+RANGE_MAX_FETCH_RATIO = 0.5
+# 交叉引用流和对象流解压后的大小上限
+RANGE_MAX_INFLATED_SIZE = 64 * MB
+# MuPDF的警告缓冲区是进程全局的，并发校验稀疏文件时串行执行，避免互相清空或混入对方的警告
+SPARSE_PDF_VERIFY_LOCK = threading.Lock()
+
+
+class RangeReadUnavailable(Exception):
+    """无法（或不值得）按范围读取远程文件，需要整文件下载"""
+
+
+class RemoteRangeFile:
+    """按块读取远程文件并写入同样大小的本地稀疏文件；已读取的块不会重复请求，缺失的相邻块合并为一次Range请求"""
+
+    def __init__(self, url, local_path, block_size=RANGE_BLOCK_SIZE, session=None):
+        self.url = url
+        self.block_size = block_size
+        self.owns_session = session is None
+        self.session = session or requests.Session()
+        self.fetched_blocks = set()
+        self.fetched_bytes = 0
+        self.request_count = 0
+        try:
+            self.size = self._probe_size()
+        except Exception:
+            if self.owns_session:
+                self.session.close()
+            raise
+        self.file = open(local_path, 'w+b')
+        self.file.truncate(self.size)
+
+    def _probe_size(self):
+        with self.session.get(self.url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            total = response.headers.get('Content-Range', '').rpartition('/')[2]
+            if response.status_code != 206 or not total.isdigit():
+                raise RangeReadUnavailable(f"服务器不支持Range请求(状态码 {response.status_code})")
+            return int(total)
+
+    def _fetch(self, first_block, last_block):
+        start = first_block * self.block_size
+        end = min(self.size, (last_block + 1) * self.block_size)
+        if self.fetched_bytes + end - start > self.size * RANGE_MAX_FETCH_RATIO:
+            raise RangeReadUnavailable("所需数据超过文件的一半，改为整文件下载")
+        response = self.session.get(self.url, headers={'Range': f'bytes={start}-{end - 1}'}, timeout=60)
+        response.raise_for_status()
+        if response.status_code != 206 or len(response.content) != end - start:
+            raise RangeReadUnavailable(f"Range请求返回异常(状态码 {response.status_code})")
+        self.file.seek(start)
+        self.file.write(response.content)
+        self.fetched_blocks.update(range(first_block, last_block + 1))
+        self.fetched_bytes += end - start
+        self.request_count += 1
+
+    def read(self, offset, length):
+        """读取 [offset, offset + length)，缺失的块先从远程读取"""
+        start, end = max(0, offset), min(self.size, offset + length)
+        if end <= start:
+            return b''
+        first_block, last_block = start // self.block_size, (end - 1) // self.block_size
+        missing_from = None
+        for block in range(first_block, last_block + 2):
+            missing = block <= last_block and block not in self.fetched_blocks
+            if missing and missing_from is None:
+                missing_from = block
+            elif not missing and missing_from is not None:
+                self._fetch(missing_from, block - 1)
+                missing_from = None
+        self.file.seek(start)
+        return self.file.read(end - start)
+
+    def is_fetched(self, offset, length):
+        """[offset, offset + length) 所在的块是否都已读取"""
+        return all(block in self.fetched_blocks
+                   for block in range(offset // self.block_size, (offset + length - 1) // self.block_size + 1))
+
+    def write_local(self, offset, data):
+        """向稀疏文件中未读取的区域写入本地生成的数据"""
+        self.file.seek(offset)
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+        if self.owns_session:
+            self.session.close()
+
+
+PDF_REF_PATTERN = re.compile(rb'(\d+)\s+(\d+)\s+R\b')
+# 收集页面依赖对象时不跟随的引用：回指父节点/页面、页面树子节点和大纲链表
+PDF_SKIPPED_REF_PATTERN = re.compile(
+    rb'/(?:Parent|P|Prev|Next|First|Last)\s+\d+\s+\d+\s+R|/Kids\s*\[[^\]]*\]')
+
+
+def pdf_dict_int(text, key):
+    """读取PDF字典中的整数值（不含间接引用）"""
+    match = re.search(rb'/' + key + rb'\s+(\d+)(?!\s+\d+\s+R)', text)
+    return int(match.group(1)) if match else None
+
+
+def pdf_dict_ref(text, key):
+    """读取PDF字典中间接引用的对象号"""
+    match = re.search(rb'/' + key + rb'\s+(\d+)\s+\d+\s+R', text)
+    return int(match.group(1)) if match else None
+
+
+def pdf_png_unpredict(data, columns):
+    """还原PNG预测器(Predictor>=10)编码的行数据"""
+    row_size = columns + 1
+    previous = bytearray(columns)
+    output = bytearray()
+    for offset in range(0, len(data) - row_size + 1, row_size):
+        filter_type, row = data[offset], bytearray(data[offset + 1:offset + row_size])
+        for i in range(columns):
+            left = row[i - 1] if i else 0
+            up = previous[i]
+            up_left = previous[i - 1] if i else 0
+            if filter_type == 1:
+                row[i] = (row[i] + left) & 0xFF
+            elif filter_type == 2:
+                row[i] = (row[i] + up) & 0xFF
+            elif filter_type == 3:
+                row[i] = (row[i] + ((left + up) >> 1)) & 0xFF
+            elif filter_type == 4:
+                p = left + up - up_left
+                pa, pb, pc = abs(p - left), abs(p - up), abs(p - up_left)
+                predictor = left if pa <= pb and pa <= pc else (up if pb <= pc else up_left)
+                row[i] = (row[i] + predictor) & 0xFF
+        output += row
+        previous = row
+    return bytes(output)
+
+
+class RemotePdfPages:
+    """解析远程PDF的交叉引用表和页面树，只读取指定页面（及其继承属性）引用到的对象"""
+
+    def __init__(self, remote):
+        self.remote = remote
+        self.offsets = {}  # 对象号 -> 文件偏移
+        self.generations = {}
+        self.compressed = {}  # 对象号 -> (对象流对象号, 序号)
+        self.boundaries = []  # 对象和交叉引用表的起始偏移（升序），用于确定对象的字节范围
+        self.object_streams = {}
+        self.texts = {}
+        self.placeholders = {}  # 不需要识别的页面对象号 -> 父节点对象号
+        self.trailer = b''
+        self._load_xref()
+
+    def _read_until(self, offset, marker, initial=16 * 1024):
+        """从 offset 开始读取，直到数据中出现 marker"""
+        length = initial
+        while True:
+            data = self.remote.read(offset, length)
+            index = data.find(marker)
+            if index >= 0:
+                return data, index
+            if offset + length >= self.remote.size:
+                raise RangeReadUnavailable(f"PDF结构不完整：未找到 {marker.decode()}")
+            length *= 4
+
+    def _load_xref(self):
+        tail = self.remote.read(self.remote.size - 2048, 2048)
+        match = re.search(rb'startxref\s+(\d+)', tail[tail.rfind(b'startxref'):])
+        if not match:
+            raise RangeReadUnavailable("未找到startxref")
+        offset, visited = int(match.group(1)), set()
+        while offset is not None and offset not in visited:
+            visited.add(offset)
+            self.boundaries.append(offset)
+            head = self.remote.read(offset, 16)
+            if head.lstrip().startswith(b'xref'):
+                trailer = self._parse_xref_table(offset)
+                xref_stream = pdf_dict_int(trailer, b'XRefStm')
+                if xref_stream is not None:
+                    self.boundaries.append(xref_stream)
+                    self._parse_xref_stream(xref_stream)
+            else:
+                trailer = self._parse_xref_stream(offset)
+            if not self.trailer:
+                self.trailer = trailer
+            offset = pdf_dict_int(trailer, b'Prev')
+        if b'/Encrypt' in self.trailer:
+            raise RangeReadUnavailable("不支持加密的PDF")
+        self.boundaries = sorted(set(self.boundaries) | set(self.offsets.values()))
+
+    def _add_entry(self, number, entry):
+        # 较新的交叉引用段先解析，已有的条目不再覆盖
+        if number not in self.offsets and number not in self.compressed:
+            kind, value = entry
+            if kind == 1:
+                self.offsets[number], self.generations[number] = value
+            elif kind == 2:
+                self.compressed[number] = value
+            else:
+                self.compressed[number] = None
+
+    def _parse_xref_table(self, offset):
+        data, index = self._read_until(offset, b'startxref')
+        section, _, trailer = data[:index].partition(b'trailer')
+        tokens = section.split()[1:]
+        position = 0
+        while position + 1 < len(tokens):
+            start, count = int(tokens[position]), int(tokens[position + 1])
+            position += 2
+            for number in range(start, start + count):
+                entry_offset, _, kind = tokens[position:position + 3]
+                position += 3
+                generation = tokens[position - 2]
+                self._add_entry(number, (1, (int(entry_offset), int(generation))) if kind == b'n' else (0, None))
+        return trailer
+
+    def _stream_data(self, offset, end):
+        """读取 offset 处的流对象，返回 (字典文本, 解压后的数据)"""
+        data = self.remote.read(offset, end - offset)
+        header_end = data.find(b'stream')
+        if header_end < 0:
+            raise RangeReadUnavailable("无效的流对象")
+        header = data[:header_end]
+        filters = re.findall(rb'/Filter\s*\[?\s*((?:/\w+\s*)*)', header)
+        names = filters[0].split() if filters else []
+        if names not in ([], [b'/FlateDecode']):
+            raise RangeReadUnavailable(f"不支持的流编码: {names}")
+        body = data[header_end + 6:]
+        body = body[2:] if body.startswith(b'\r\n') else body[1:]
+        if names:
+            inflater = zlib.decompressobj()
+            body = inflater.decompress(body, RANGE_MAX_INFLATED_SIZE)
+            if inflater.unconsumed_tail:
+                raise RangeReadUnavailable("流对象解压后过大")
+        predictor = pdf_dict_int(header, b'Predictor')
+        if predictor and predictor >= 10:
+            body = pdf_png_unpredict(body, pdf_dict_int(header, b'Columns') or 1)
+        return header, body
+
+    def _parse_xref_stream(self, offset):
+        # 交叉引用流的字典只含直接对象，/Length 之后即为数据；读取到 endstream 为止
+        data, index = self._read_until(offset, b'endstream')
+        header, body = self._stream_data(offset, offset + index)
+        widths = [int(w) for w in re.search(rb'/W\s*\[([^\]]*)\]', header).group(1).split()]
+        index_match = re.search(rb'/Index\s*\[([^\]]*)\]', header)
+        ranges = [int(v) for v in index_match.group(1).split()] if index_match else [0, pdf_dict_int(header, b'Size')]
+        entry_size, position = sum(widths), 0
+        for start, count in zip(ranges[::2], ranges[1::2]):
+            for number in range(start, start + count):
+                fields, field_offset = [], position
+                for width in widths:
+                    fields.append(int.from_bytes(body[field_offset:field_offset + width], 'big') if width else None)
+                    field_offset += width
+                position += entry_size
+                kind = 1 if fields[0] is None else fields[0]
+                if kind == 1:
+                    self._add_entry(number, (1, (fields[1], fields[2] or 0)))
+                elif kind == 2:
+                    self._add_entry(number, (2, (fields[1], fields[2])))
+                else:
+                    self._add_entry(number, (0, None))
+        return header
+
+    def _object_end(self, offset):
+        position = bisect.bisect_right(self.boundaries, offset)
+        return self.boundaries[position] if position < len(self.boundaries) else self.remote.size
+
+    def object_text(self, number):
+        """对象的字典/数组部分（不含流数据）；读取时对象的全部字节写入稀疏文件"""
+        if number in self.texts:
+            return self.texts[number]
+        if number in self.offsets:
+            offset = self.offsets[number]
+            data = self.remote.read(offset, self._object_end(offset) - offset)
+            start = data.find(b'obj') + 3
+            end = min(i for i in (data.find(b'stream', start), data.find(b'endobj', start), len(data)) if i >= 0)
+            text = data[start:end]
+        elif self.compressed.get(number):
+            stream_number, index = self.compressed[number]
+            text = self._object_stream(stream_number)[index]
+        else:
+            text = b'null'
+        self.texts[number] = text
+        return text
+
+    def _object_stream(self, number):
+        if number not in self.object_streams:
+            offset = self.offsets[number]
+            header, body = self._stream_data(offset, self._object_end(offset))
+            count, first = pdf_dict_int(header, b'N'), pdf_dict_int(header, b'First')
+            pairs = [int(v) for v in body[:first].split()[:count * 2]]
+            starts = pairs[1::2] + [len(body) - first]
+            self.object_streams[number] = [body[first + starts[i]:first + starts[i + 1]] for i in range(count)]
+        return self.object_streams[number]
+
+    def page_count(self):
+        """页面树根节点的 /Count"""
+        return pdf_dict_int(self.object_text(self._pages_root()), b'Count') or 0
+
+    def _pages_root(self):
+        return pdf_dict_ref(self.object_text(pdf_dict_ref(self.trailer, b'Root')), b'Pages')
+
+    def _find_pages(self, node, wanted, first_index, found):
+        """遍历页面树（页面库打开文档时会加载整棵树），返回 node 子树中的页数；
+        目标页面和其路径上的页面树节点加入 found"""
+        text = self.object_text(node)
+        kids_match = re.search(rb'/Kids\s*\[([^\]]*)\]', text)
+        if not kids_match:
+            if first_index in wanted:
+                found.append(node)
+            return 1
+        kids = [int(n) for n, _ in PDF_REF_PATTERN.findall(kids_match.group(1))]
+        count = pdf_dict_int(text, b'Count') or len(kids)
+        if any(first_index <= index < first_index + count for index in wanted):
+            found.append(node)
+        if count == len(kids):
+            # 子节点全部是页面：目标页读取原对象，其余页面只需要页面树结构，写入占位页面对象
+            for i, kid in enumerate(kids):
+                if first_index + i in wanted:
+                    found.append(kid)
+                elif kid in self.offsets:
+                    self.placeholders[kid] = node
+                else:
+                    self.object_text(kid)
+            return count
+        index = first_index
+        for kid in kids:
+            # 定位页面时页面库会读取目标页之前的兄弟节点，这些节点的字典同样需要写入
+            index += self._find_pages(kid, wanted, index, found)
+        return count
+
+    def _write_placeholders(self):
+        """在非目标页面对象的位置写入只含页面树结构的占位对象（原对象所在的块已读取时跳过）"""
+        for number, parent in self.placeholders.items():
+            offset = self.offsets[number]
+            data = (f"{number} {self.generations[number]} obj\n<</Type/Page/Parent {parent} 0 R"
+                    f"/MediaBox[0 0 1 1]>>\nendobj\n").encode('ascii')
+            if self.remote.is_fetched(offset, len(data)):
+                continue
+            if len(data) > self._object_end(offset) - offset:
+                self.object_text(number)
+                continue
+            self.remote.write_local(offset, data)
+
+    def fetch_pages(self, page_indices):
+        """读取目标页面及其依赖对象，返回读取的对象数"""
+        root = pdf_dict_ref(self.trailer, b'Root')
+        self.object_text(root)
+        found = []
+        self._find_pages(self._pages_root(), set(page_indices), 0, found)
+        pending, visited = list(found), set()
+        while pending:
+            number = pending.pop()
+            if number in visited:
+                continue
+            visited.add(number)
+            text = PDF_SKIPPED_REF_PATTERN.sub(b'', self.object_text(number))
+            pending.extend(int(n) for n, _ in PDF_REF_PATTERN.findall(text))
+        self._write_placeholders()
+        return len(visited)
+
+
+def uses_range_read(file_path, pages):
+    """是否按范围读取远程文件：PDF且只需部分页面"""
+    return RANGE_READ_ENABLED and bool(pages) and file_path.lower().endswith('.pdf')
+
+
+def verify_sparse_pdf(file_path, page_indices, page_count):
+    """确认稀疏文件中目标页面完整：PyMuPDF按需加载对象，缺失的对象在提取文本、渲染时才触发修复，
+    因此逐页提取文本并低分辨率渲染（加载内容流、字体和图像）后再检查是否触发了修复或产生了对象读取警告"""
+    with SPARSE_PDF_VERIFY_LOCK:
+        fitz.TOOLS.mupdf_warnings(reset=True)
+        with fitz.open(file_path) as doc:
+            if doc.is_repaired or doc.page_count != page_count:
+                raise RangeReadUnavailable("按范围读取的PDF不完整")
+            for index in page_indices:
+                page = doc.load_page(index)
+                page.get_text()
+                page.get_pixmap(matrix=fitz.Matrix(0.2, 0.2), alpha=False)
+            if doc.is_repaired:
+                raise RangeReadUnavailable("按范围读取的PDF缺少对象")
+        warnings = fitz.TOOLS.mupdf_warnings(reset=True)
+    if warnings:
+        raise RangeReadUnavailable(f"按范围读取的PDF加载出错: {warnings.splitlines()[0]}")
+
+
+def download_pdf_pages(url, file_path, pages):
+    """按范围读取远程PDF中指定页面所需的对象到稀疏文件，文件较小时返回False（由调用方整文件下载）"""
+    remote = RemoteRangeFile(url, file_path)
+    try:
+        if remote.size < RANGE_MIN_FILE_SIZE:
+            return False
+        pdf = RemotePdfPages(remote)
+        page_indices = select_page_indices(parse_page_ranges(pages), pdf.page_count())
+        object_count = pdf.fetch_pages(page_indices)
+    finally:
+        remote.close()
+
+    verify_sparse_pdf(file_path, page_indices, pdf.page_count())
+    logger.info(f"按范围读取远程PDF: {url}, 页面 {len(page_indices)}, 对象 {object_count}, "
+                f"读取 {remote.fetched_bytes / MB:.1f}MB / {remote.size / MB:.1f}MB, 请求 {remote.request_count} 次")
+    return True
+
+
+def download_remote_file(url, file_path, pages=None):
+    """下载URL文件到暂存路径；只需PDF的部分页面时优先按范围读取，不可用时整文件下载"""
+    if uses_range_read(file_path, pages):
+        try:
+            if download_pdf_pages(url, file_path, pages):
+                return
+        except Exception as e:
+            logger.info(f"按范围读取远程PDF不可用，改为整文件下载: {e}")
+    download_image(url, file_path)
+
+
+def link_or_copy_file(src_path, dst_path):
+    """为文件建立硬链接，跨文件系统时复制"""
+    try:
+        os.link(src_path, dst_path)
+    except OSError:
+        shutil.copyfile(src_path, dst_path)
+
+
 def safe_remove_file(file_path):
     """安全删除文件"""
     try:
@@ -387,7 +2355,6 @@ def validate_image_file(file_path):
     """验证图像文件完整性和格式兼容性，并进行必要的预处理"""
     try:
         from PIL import Image
-        import tempfile
 
         # 检查文件是否存在
         if not os.path.exists(file_path):
@@ -427,7 +2394,7 @@ def validate_image_file(file_path):
                     rgb_img.paste(img, mask=img.split()[-1])  # 使用alpha通道作为mask
                     
                     # 保存为新的临时文件
-                    converted_path = tempfile.mktemp(suffix='_rgb.jpg')
+                    converted_path = new_spool_path('_rgb.jpg')
                     rgb_img.save(converted_path, 'JPEG', quality=95)
                     
                     logger.info(f"RGBA图像已转换为RGB: {converted_path}")
@@ -437,7 +2404,7 @@ def validate_image_file(file_path):
                 elif mode in ['P', 'L']:
                     logger.info(f"检测到{mode}模式，转换为RGB以确保兼容性")
                     rgb_img = img.convert('RGB')
-                    converted_path = tempfile.mktemp(suffix='_rgb.jpg')
+                    converted_path = new_spool_path('_rgb.jpg')
                     rgb_img.save(converted_path, 'JPEG', quality=95)
                     
                     logger.info(f"{mode}图像已转换为RGB: {converted_path}")
@@ -453,45 +2420,323 @@ def validate_image_file(file_path):
         return False, f"验证过程出错: {e}", file_path
 
 
-def pdf_to_images(pdf_path):
-    """将PDF转换为图像列表"""
-    images = []
-    temp_files = []
+def parse_page_ranges(spec):
+    """解析页码范围字符串（如 "1-3,5,8-"，页码从1开始），返回 [(起始页, 结束页或None)] 列表"""
+    ranges = []
+    if not spec or not str(spec).strip():
+        return ranges
+    for part in str(spec).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if '-' in part:
+                start_str, end_str = part.split('-', 1)
+                start = int(start_str) if start_str.strip() else 1
+                end = int(end_str) if end_str.strip() else None
+            else:
+                start = end = int(part)
+        except ValueError:
+            raise ValueError(f"无效的页码范围: {part}")
+        if start < 1 or (end is not None and end < start):
+            raise ValueError(f"无效的页码范围: {part}")
+        ranges.append((start, end))
+    return ranges
+
+
+def select_page_indices(page_ranges, page_count):
+    """根据页码范围和总页数计算需要处理的页索引（0基，升序去重），未指定范围时返回全部页"""
+    if not page_ranges:
+        return list(range(page_count))
+    indices = set()
+    for start, end in page_ranges:
+        end = page_count if end is None else min(end, page_count)
+        indices.update(range(start - 1, end))
+    return sorted(indices)
+
+
+def compute_render_dpi(width_pt, height_pt, dpi=None, dpi_mode=None, max_pixels=None):
+    """按DPI策略计算页面渲染分辨率（页面尺寸单位为pt，1英寸=72pt）"""
+    dpi = dpi or PDF_DEFAULT_DPI
+    dpi_mode = dpi_mode or PDF_DEFAULT_DPI_MODE
+    max_pixels = max_pixels or PDF_DEFAULT_MAX_PIXELS
+    width_in = max(width_pt, 1) / 72.0
+    height_in = max(height_pt, 1) / 72.0
+
+    effective_dpi = float(dpi)
+    if dpi_mode == 'max_pixels':
+        effective_dpi = min(effective_dpi, math.sqrt(max_pixels / (width_in * height_in)))
+    elif dpi_mode == 'page_size':
+        effective_dpi = min(effective_dpi, PDF_TARGET_LONG_SIDE / max(width_in, height_in))
+
+    # 大幅面页面无论何种策略都不超过单边像素上限
+    return min(effective_dpi, MAX_RENDER_SIDE / max(width_in, height_in))
+
+
+def iter_pdf_pages(pdf_path, page_ranges=None, dpi=None, dpi_mode=None, max_pixels=None):
+    """惰性渲染PDF页面，生成 (页索引, BGR数组)，只打开和渲染请求的页面；单页渲染失败时生成 (页索引, 异常)"""
+    try:
+        doc = fitz.open(pdf_path)
+    except Exception as e:
+        logger.warning(f"PyMuPDF打开PDF失败，改用pdf2image逐页渲染: {e}")
+        yield from _iter_pdf_pages_pdf2image(pdf_path, page_ranges, dpi, dpi_mode, max_pixels)
+        return
 
     try:
-        # 方法1: 使用pdf2image
+        page_indices = select_page_indices(page_ranges, doc.page_count)
+        logger.info(f"PDF共{doc.page_count}页，本次处理{len(page_indices)}页")
+        for page_index in page_indices:
+            try:
+                page = doc.load_page(page_index)
+                render_dpi = compute_render_dpi(page.rect.width, page.rect.height, dpi, dpi_mode, max_pixels)
+                zoom = render_dpi / 72.0
+                pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csRGB, alpha=False)
+                img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+            except Exception as e:
+                yield page_index, e
+                continue
+            logger.info(f"PDF第{page_index + 1}页渲染完成: {pix.width}x{pix.height} ({render_dpi:.0f} DPI)")
+            yield page_index, img[:, :, ::-1].copy()
+    finally:
+        doc.close()
+
+
+def parse_pdfinfo_size(value):
+    """解析pdfinfo的页面尺寸（如 "595 x 842 pts (A4)"），返回 (宽, 高) pt，格式不符时返回None"""
+    parts = str(value or '').split()
+    if len(parts) < 3:
+        return None
+    try:
+        return float(parts[0]), float(parts[2])
+    except ValueError:
+        return None
+
+
+def pdfinfo_page_size(pdf_path, page_number):
+    """用pdfinfo读取第 page_number 页（从1开始）的显示尺寸（pt，旋转90/270度的页面交换宽高），读取失败时返回None"""
+    try:
+        info = pdfinfo_from_path(pdf_path, first_page=page_number, last_page=page_number)
+    except Exception as e:
+        logger.warning(f"pdfinfo读取第{page_number}页尺寸失败: {e}")
+        return None
+    size, rotation = None, 0
+    # 指定页码范围时pdfinfo逐页输出 "Page    N size" 和 "Page    N rot"
+    for key, value in info.items():
+        words = key.split()
+        if len(words) == 3 and words[0] == 'Page' and words[1] == str(page_number):
+            if words[2] == 'size':
+                size = parse_pdfinfo_size(value)
+            elif words[2] == 'rot' and str(value).strip() in ('90', '270'):
+                rotation = 90
+    if size is not None and rotation:
+        size = (size[1], size[0])
+    return size
+
+
+def _iter_pdf_pages_pdf2image(pdf_path, page_ranges=None, dpi=None, dpi_mode=None, max_pixels=None):
+    """pdf2image备选渲染：逐页调用pdftoppm，只渲染请求的页面；每页先用pdfinfo读取该页尺寸计算渲染DPI，
+    读取失败时使用首页尺寸（再失败时按A4）"""
+    info = pdfinfo_from_path(pdf_path)
+    page_count = int(info.get('Pages', 0))
+    default_size = parse_pdfinfo_size(info.get('Page size')) or (595.0, 842.0)
+
+    for page_index in select_page_indices(page_ranges, page_count):
         try:
-            pages = convert_from_path(pdf_path, dpi=200)
-            for i, page in enumerate(pages):
-                # 保存为临时文件
-                temp_img_path = tempfile.mktemp(suffix=f'_page_{i}.png')
-                page.save(temp_img_path, 'PNG')
-                images.append(temp_img_path)
-                temp_files.append(temp_img_path)
-            logger.info(f"使用pdf2image成功转换PDF，共{len(images)}页")
-            return images, temp_files
+            width_pt, height_pt = pdfinfo_page_size(pdf_path, page_index + 1) or default_size
+            render_dpi = compute_render_dpi(width_pt, height_pt, dpi, dpi_mode, max_pixels)
+            rendered = convert_from_path(pdf_path, dpi=render_dpi,
+                                         first_page=page_index + 1, last_page=page_index + 1)
         except Exception as e:
-            logger.warning(f"pdf2image转换失败: {e}")
+            yield page_index, e
+            continue
+        if not rendered:
+            continue
+        logger.info(f"PDF第{page_index + 1}页渲染完成(pdf2image): {rendered[0].size[0]}x{rendered[0].size[1]} "
+                    f"({render_dpi:.0f} DPI)")
+        yield page_index, pil_frame_to_bgr(rendered[0])
 
-        # 方法2: 使用PyMuPDF作为备选
-        doc = fitz.open(pdf_path)
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2倍缩放提高质量
-            temp_img_path = tempfile.mktemp(suffix=f'_page_{page_num}.png')
-            pix.save(temp_img_path)
-            images.append(temp_img_path)
-            temp_files.append(temp_img_path)
-        doc.close()
-        logger.info(f"使用PyMuPDF成功转换PDF，共{len(images)}页")
-        return images, temp_files
 
+def get_image_frame_count(file_path):
+    """获取图像文件的帧数（多页TIFF大于1），读取失败时返回1"""
+    try:
+        from PIL import Image
+        with Image.open(file_path) as img:
+            return getattr(img, 'n_frames', 1)
     except Exception as e:
-        logger.error(f"PDF转换失败: {e}")
-        # 清理已创建的临时文件
-        for temp_file in temp_files:
-            safe_remove_file(temp_file)
-        return [], []
+        logger.warning(f"读取图像帧数失败 {file_path}: {e}")
+        return 1
+
+
+def pil_frame_to_bgr(frame):
+    """将PIL图像帧转换为BGR numpy数组（透明背景填充白色，传真等1位/灰度图转为三通道）"""
+    from PIL import Image
+
+    if frame.mode in ('RGBA', 'LA') or (frame.mode == 'P' and 'transparency' in frame.info):
+        frame = frame.convert('RGBA')
+        rgb = Image.new('RGB', frame.size, (255, 255, 255))
+        rgb.paste(frame, mask=frame.split()[-1])
+    else:
+        try:
+            rgb = frame.convert('RGB')
+        except ValueError:
+            # 16位灰度等模式先转为8位灰度
+            rgb = frame.convert('L').convert('RGB')
+    return np.array(rgb)[:, :, ::-1].copy()
+
+
+def iter_tiff_frames(tiff_path, page_ranges=None):
+    """逐帧惰性解码多页TIFF，生成 (页索引, BGR数组)，内存中只保留当前帧；单帧解码失败时生成 (页索引, 异常)"""
+    from PIL import Image
+
+    with Image.open(tiff_path) as img:
+        frame_count = getattr(img, 'n_frames', 1)
+        page_indices = select_page_indices(page_ranges, frame_count)
+        logger.info(f"多页TIFF共{frame_count}帧，本次处理{len(page_indices)}帧: {tiff_path}")
+        for i in page_indices:
+            try:
+                img.seek(i)
+                width, height = img.size
+                if width < 10 or height < 10 or width > 10000 or height > 10000:
+                    logger.warning(f"TIFF第{i + 1}帧尺寸异常，跳过: {width}x{height}")
+                    continue
+                frame = pil_frame_to_bgr(img)
+            except Exception as e:
+                yield i, e
+                continue
+            yield i, frame
+
+
+def estimate_request_memory(file_path, is_pdf, page_ranges=None, dpi=None, dpi_mode=None, max_pixels=None):
+    """估算请求的峰值内存（字节）：同时驻留的页面数（当前页 + 预取页 + 渲染中页）× 最大页面像素 × 3字节，
+    加上推理中页面的工作缓冲（每像素 MEMORY_BYTES_PER_PIXEL 字节）；只读取页面尺寸，不渲染或解码"""
+    page_pixels = []
+    try:
+        if is_pdf:
+            with fitz.open(file_path) as doc:
+                for page_index in select_page_indices(page_ranges, doc.page_count):
+                    rect = doc[page_index].rect
+                    scale = compute_render_dpi(rect.width, rect.height, dpi, dpi_mode, max_pixels) / 72.0
+                    page_pixels.append(rect.width * scale * rect.height * scale)
+        else:
+            from PIL import Image
+            with Image.open(file_path) as img:
+                frame_count = getattr(img, 'n_frames', 1)
+                page_count = len(select_page_indices(page_ranges, frame_count)) if frame_count > 1 else 1
+                page_pixels = [img.width * img.height] * page_count
+    except Exception as e:
+        # 无法读取尺寸（如PyMuPDF打不开的PDF）时按单页最大像素数估算
+        logger.warning(f"读取页面尺寸失败，按默认页面大小估算内存: {e}")
+        page_pixels = [PDF_DEFAULT_MAX_PIXELS]
+
+    if not page_pixels:
+        return 0
+    largest = max(page_pixels)
+    resident_pages = min(len(page_pixels), PAGE_PREFETCH_DEPTH + 2)
+    return int(largest * 3 * resident_pages + largest * MEMORY_BYTES_PER_PIXEL)
+
+
+def prefetch_pages(pages, depth=PAGE_PREFETCH_DEPTH):
+    """在后台线程中提前解码/渲染后续页面，与当前页OCR并行，内存中最多缓冲 depth 页"""
+    if depth <= 0:
+        yield from pages
+        return
+
+    buffer = Queue(maxsize=depth)
+    stop_event = threading.Event()
+
+    def put(item):
+        while not stop_event.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return True
+            except Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            for page in pages:
+                if not put(('page', page)):
+                    break
+        except Exception as e:
+            put(('error', e))
+        finally:
+            close = getattr(pages, 'close', None)
+            if close:
+                close()
+            put(('done', None))
+
+    thread = threading.Thread(target=producer, name='page-prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, item = buffer.get()
+            if kind == 'done':
+                break
+            if kind == 'error':
+                raise item
+            yield item
+    finally:
+        stop_event.set()
+
+
+def analyze_page(page_image):
+    """OCR前的页面统计：在缩小的灰度图上计算墨迹占比（与背景灰度差异明显的像素比例），对全分辨率像素计算SHA256"""
+    info = {}
+    if not SKIP_BLANK_PAGES and not DEDUP_PAGES:
+        return info
+    image = load_image_bgr(page_image)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    scale = PAGE_ANALYSIS_SIDE / max(gray.shape[:2])
+    if scale < 1:
+        gray = cv2.resize(gray, (max(1, round(gray.shape[1] * scale)), max(1, round(gray.shape[0] * scale))),
+                          interpolation=cv2.INTER_AREA)
+
+    if SKIP_BLANK_PAGES:
+        # 去掉3%的页边，避免扫描件黑边被当作内容
+        h, w = gray.shape[:2]
+        margin_y, margin_x = int(h * 0.03), int(w * 0.03)
+        body = gray[margin_y:h - margin_y, margin_x:w - margin_x]
+        if body.size:
+            background = np.median(body)
+            info['ink_ratio'] = float(np.mean(np.abs(body.astype(np.int16) - background) > BLANK_PAGE_PIXEL_DELTA))
+            info['blank'] = info['ink_ratio'] < BLANK_PAGE_INK_RATIO
+
+    if DEDUP_PAGES:
+        # 页面指纹：尺寸 + 解码后全部像素的SHA256，只有逐像素相同的页面才视为重复
+        digest = hashlib.sha256(np.ascontiguousarray(image).data).hexdigest()
+        info['hash'] = (image.shape, digest)
+    return info
+
+
+def analyze_pages(pages):
+    """为页面迭代器中的每页附加OCR前置检查结果，检查失败时该页照常识别；渲染/解码失败的页面附带 error。
+    结束或被关闭时同时关闭 pages，其中打开的文档在迭代所在的线程中关闭"""
+    try:
+        for i, page_image in pages:
+            if isinstance(page_image, Exception):
+                yield i, None, {'error': page_image}
+                continue
+            try:
+                info = analyze_page(page_image)
+            except Exception as e:
+                logger.warning(f"第{i + 1}页空白页/重复页检查失败: {e}")
+                info = {}
+            yield i, page_image, info
+    finally:
+        close = getattr(pages, 'close', None)
+        if close:
+            close()
+
+
+def find_duplicate_page(page_hash, seen_pages):
+    """在已识别页面中查找像素完全相同（尺寸和SHA256一致）的页面，返回(页码, 识别结果)，未找到返回(None, None)"""
+    if page_hash is None:
+        return None, None
+    for seen_hash, page_number, page_results in seen_pages:
+        if seen_hash == page_hash:
+            return page_number, page_results
+    return None, None
 
 
 def convert_paddleocr_to_standard_format(paddleocr_result):
@@ -613,27 +2858,461 @@ def convert_paddleocr_to_standard_format(paddleocr_result):
     return results
 
 
-def process_file_ocr(file_path, filename, lang='ch'):
-    """处理文件OCR识别（支持图片和PDF）- 使用PaddleOCR引擎池"""
+def load_image_bgr(image):
+    """读取图像为BGR格式的numpy数组（已是数组时直接返回）"""
+    if isinstance(image, np.ndarray):
+        return image
+    img = cv2.imread(image)
+    if img is None:
+        from PIL import Image
+        with Image.open(image) as pil_img:
+            img = np.array(pil_img.convert('RGB'))[:, :, ::-1].copy()
+    return img
+
+
+def sort_text_polys(polys):
+    """按从上到下、从左到右的阅读顺序排序文本框"""
+    boxes = sorted(polys, key=lambda p: (p[0][1], p[0][0]))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+
+def crop_text_line(img, poly):
+    """按四边形透视变换裁剪文本行图像，竖排文本旋转为横排"""
+    points = np.array(poly, dtype=np.float32).reshape(-1, 2)
+    if len(points) != 4:
+        points = cv2.boxPoints(cv2.minAreaRect(points)).astype(np.float32)
+    width = max(1, int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3]))))
+    height = max(1, int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2]))))
+    dst = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(points, dst)
+    crop = cv2.warpPerspective(img, matrix, (width, height),
+                               borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    if height / width >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+def textline_det_params(profile):
+    """从流水线配置中提取文本检测模型参数"""
+    params = OCR_PROFILES[profile]['params']
+    det_params = {}
+    if params.get('text_det_limit_side_len'):
+        det_params['limit_side_len'] = params['text_det_limit_side_len']
+    if params.get('text_det_limit_type'):
+        det_params['limit_type'] = params['text_det_limit_type']
+    return det_params
+
+
+def run_text_detection(det_model, img):
+    """用检测模型实例运行文本检测，返回按阅读顺序排列的文本框"""
+    with thread_budget.running(det_model):
+        output = list(det_model.predict(img))
+    if not output:
+        return []
+    polys = [np.array(poly).reshape(-1, 2) for poly in output[0]['dt_polys']]
+    return sort_text_polys(polys)
+
+
+def run_textline_orientation(cls_model, crops):
+    """用方向分类模型实例将倒置(180度)的文本行旋转回正"""
+    if not crops:
+        return crops
+    with thread_budget.running(cls_model):
+        outputs = list(cls_model.predict(crops, batch_size=TEXTLINE_REC_BATCH_SIZE))
+    corrected = []
+    for crop, res in zip(crops, outputs):
+        label_names = res.get('label_names') or []
+        if label_names and str(label_names[0]).startswith('180'):
+            crop = cv2.rotate(crop, cv2.ROTATE_180)
+        corrected.append(crop)
+    return corrected
+
+
+def run_text_recognition(rec_model, crops):
+    """用识别模型实例批量识别文本行图像，返回 (文本, 置信度) 列表"""
+    if not crops:
+        return []
+    with thread_budget.running(rec_model):
+        outputs = list(rec_model.predict(crops, batch_size=TEXTLINE_REC_BATCH_SIZE))
+    return [(str(res['rec_text']), float(res['rec_score'])) for res in outputs]
+
+
+def detect_text_lines(img, profile, model_name=AUTO_LANG_DET_MODEL):
+    """从单模型池借用检测模型运行文本检测"""
+    with textline_model_pool.checkout('det', model_name, textline_det_params(profile)) as det_model:
+        return run_text_detection(det_model, img)
+
+
+def correct_textline_orientation(crops):
+    """从单模型池借用方向分类模型校正文本行方向"""
+    if not crops:
+        return crops
+    with textline_model_pool.checkout('cls', TEXTLINE_ORI_MODEL_NAME) as cls_model:
+        return run_textline_orientation(cls_model, crops)
+
+
+def recognize_text_lines(crops, model_name):
+    """从单模型池借用识别模型批量识别文本行；开启识别缓存时只识别未命中的文本行"""
+    if not crops:
+        return []
+    if not rec_cache.enabled:
+        with textline_model_pool.checkout('rec', model_name) as rec_model:
+            return run_text_recognition(rec_model, crops)
+
+    keys = [TextLineRecCache.crop_key(crop, model_name) for crop in crops]
+    results = [rec_cache.get(key) for key in keys]
+    pending = [i for i, result in enumerate(results) if result is None]
+    if pending:
+        with textline_model_pool.checkout('rec', model_name) as rec_model:
+            recognized = run_text_recognition(rec_model, [crops[i] for i in pending])
+        for i, result in zip(pending, recognized):
+            results[i] = result
+            rec_cache.put(keys[i], result)
+    return results
+
+
+def classify_text_script(texts):
+    """根据识别文本的Unicode字符分布判断文字系统，返回对应语言，无法判断时返回None"""
+    counts = {'hangul': 0, 'kana': 0, 'han': 0, 'latin': 0}
+    for char in ''.join(texts):
+        code = ord(char)
+        if 0xAC00 <= code <= 0xD7A3 or 0x1100 <= code <= 0x11FF or 0x3130 <= code <= 0x318F:
+            counts['hangul'] += 1
+        elif 0x3040 <= code <= 0x30FF or 0x31F0 <= code <= 0x31FF or 0xFF66 <= code <= 0xFF9F:
+            counts['kana'] += 1
+        elif 0x4E00 <= code <= 0x9FFF or 0x3400 <= code <= 0x4DBF or 0xF900 <= code <= 0xFAFF:
+            counts['han'] += 1
+        elif char.isascii() and char.isalpha():
+            counts['latin'] += 1
+
+    total = sum(counts.values())
+    if total == 0:
+        return None
+    if counts['hangul'] / total >= 0.3:
+        return 'korean'
+    if counts['kana'] and counts['kana'] / (counts['kana'] + counts['han']) >= 0.1:
+        return 'japan'
+    if counts['han'] / total >= 0.3:
+        return 'ch'
+    if counts['latin'] / total >= 0.5:
+        return 'en'
+    return None
+
+
+def detect_script_lang(crops):
+    """抽取面积最大的若干文本行，依次用各抽样语言的完整识别模型识别以判断语言（抽样行数少，但不是单独的分类模型），
+    返回 (语言, 抽样模型名, {索引: (文本, 置信度)})"""
+    sample_indices = sorted(range(len(crops)),
+                            key=lambda i: crops[i].shape[0] * crops[i].shape[1],
+                            reverse=True)[:AUTO_LANG_SAMPLE_LINES]
+    sample_crops = [crops[i] for i in sample_indices]
+
+    best = (None, None, {}, 0.0)
+    for probe_lang in AUTO_LANG_PROBE_LANGS:
+        model_name = TEXTLINE_MODEL_NAMES[probe_lang]['rec']
+        recognized = recognize_text_lines(sample_crops, model_name)
+        texts = [text for text, _ in recognized]
+        mean_score = sum(score for _, score in recognized) / len(recognized) if recognized else 0.0
+        script_lang = classify_text_script(texts)
+        logger.info(f"自动语言抽样（{probe_lang}模型）: 判断为 {script_lang}, 平均置信度 {mean_score:.3f}")
+
+        if script_lang and mean_score > best[3]:
+            best = (script_lang, model_name, dict(zip(sample_indices, recognized)), mean_score)
+        if best[0] and best[3] >= AUTO_LANG_MIN_SCORE:
+            break
+
+    return best[0], best[1], best[2]
+
+
+def detect_and_crop_text_lines(image, profile, det_model_name):
+    """检测文本行并裁剪（按配置校正方向），返回 (文本框列表, 文本行图像列表)"""
+    img = load_image_bgr(image)
+    polys = detect_text_lines(img, profile, det_model_name)
+    if not polys:
+        return [], []
+
+    crops = [crop_text_line(img, poly) for poly in polys]
+    if OCR_PROFILES[profile]['params'].get('use_textline_orientation'):
+        crops = correct_textline_orientation(crops)
+    return polys, crops
+
+
+def uses_split_pipeline(profile):
+    """固定语言是否走检测/识别分离流水线：开启识别缓存且配置不含文档方向分类和文档矫正时"""
+    params = OCR_PROFILES[profile]['params']
+    return rec_cache.enabled and not params.get('use_doc_orientation_classify') and not params.get('use_doc_unwarping')
+
+
+def run_split_pipeline_ocr(image, lang, profile):
+    """固定语言的检测/识别分离流水线，识别阶段经过文本行识别缓存，返回与PaddleOCR predict兼容的结果列表"""
+    polys, crops = detect_and_crop_text_lines(image, profile, TEXTLINE_MODEL_NAMES[lang]['det'])
+    if not polys:
+        return []
+    return recognize_split_pipeline(polys, crops, lang)
+
+
+def recognize_split_pipeline(polys, crops, lang):
+    """分离流水线的识别阶段：用固定语言的识别模型识别已裁剪的文本行"""
+    recognized = recognize_text_lines(crops, TEXTLINE_MODEL_NAMES[lang]['rec'])
+    return [{
+        'rec_texts': [text for text, _ in recognized],
+        'rec_scores': [score for _, score in recognized],
+        'rec_polys': polys,
+    }]
+
+
+def run_auto_lang_ocr(image, profile, auto_state):
+    """lang=auto：检测一次，抽样判断文字系统后只用对应语言的识别模型识别一次
+
+    只做检测、（配置开启时的）文本行方向分类和识别，任何配置下都不做文档方向分类和文档矫正。
+    auto_state 在同一文档的多页之间共享，首个判断出的语言会被后续页面沿用。
+    返回与PaddleOCR predict兼容的结果列表。
+    """
+    polys, crops = detect_and_crop_text_lines(image, profile, AUTO_LANG_DET_MODEL)
+    if not polys:
+        return []
+    return recognize_auto_lang(polys, crops, auto_state)
+
+
+def recognize_auto_lang(polys, crops, auto_state):
+    """lang=auto 的识别阶段：沿用或抽样判断文字系统，再用对应语言的识别模型识别已裁剪的文本行"""
+    known = {}
+    lang = auto_state.get('lang')
+    if lang is None:
+        lang, probe_model, probe_results = detect_script_lang(crops)
+        if lang:
+            auto_state['lang'] = lang
+            logger.info(f"自动语言识别结果: {lang}")
+            # 抽样所用模型与最终识别模型一致时直接复用抽样结果
+            if probe_model == TEXTLINE_MODEL_NAMES[lang]['rec']:
+                known = probe_results
+    rec_model_name = TEXTLINE_MODEL_NAMES[lang or AUTO_LANG_FALLBACK]['rec']
+
+    pending = [i for i in range(len(crops)) if i not in known]
+    for i, recognized in zip(pending, recognize_text_lines([crops[i] for i in pending], rec_model_name)):
+        known[i] = recognized
+
+    return [{
+        'rec_texts': [known[i][0] for i in range(len(crops))],
+        'rec_scores': [known[i][1] for i in range(len(crops))],
+        'rec_polys': polys,
+    }]
+
+
+def predict_image(engine, image, lang, profile, auto_state=None):
+    """对单张图像（路径或数组）运行OCR，返回PaddleOCR原始格式结果"""
+    if lang == AUTO_LANG:
+        return run_auto_lang_ocr(image, profile, auto_state if auto_state is not None else {})
+    if uses_split_pipeline(profile):
+        return run_split_pipeline_ocr(image, lang, profile)
+    with thread_budget.running(engine):
+        return engine.predict(image)
+
+
+def uses_staged_pipeline(lang, profile):
+    """是否走分阶段流水线：已开启，且为 lang=auto 或配置不含文档方向分类和文档矫正"""
+    if not STAGED_PIPELINE:
+        return False
+    params = OCR_PROFILES[profile]['params']
+    return lang == AUTO_LANG or (not params.get('use_doc_orientation_classify') and not params.get('use_doc_unwarping'))
+
+
+class StagedOCRPipeline:
+    """检测/识别分阶段流水线：检测线程组和识别线程组各自从单模型池借用模型，
+    检测结果经有界队列交给识别阶段（队列满时检测阶段等待），记录各阶段耗时用于调整两组线程数。
+    每页提交前经调度器申请名额（按优先级类别、客户端占用和等待老化排序），页面完成后归还并按两阶段处理耗时计入客户端占用"""
+
+    scheduler_name = 'staged'
+
+    def __init__(self, det_workers=STAGE_DET_WORKERS, rec_workers=STAGE_REC_WORKERS, queue_depth=STAGE_QUEUE_DEPTH):
+        # 每个阶段的线程数不超过单模型池中每个模型的实例数，避免线程空等模型实例
+        self.det_workers = max(1, min(det_workers, TEXTLINE_MODEL_POOL_SIZE))
+        self.rec_workers = max(1, min(rec_workers, TEXTLINE_MODEL_POOL_SIZE))
+        self.det_queue = PriorityQueue()  # (优先级类别, 序号, 任务)
+        self.rec_queue = Queue(maxsize=queue_depth)
+        self.stats = {stage: {'processed': 0, 'busy_seconds': 0.0, 'wait_seconds': 0.0} for stage in ('det', 'rec')}
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._started = False
+
+    def _ensure_started(self):
+        """首次提交任务时启动工作线程"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for stage, count, target in (('det', self.det_workers, self._det_worker),
+                                     ('rec', self.rec_workers, self._rec_worker)):
+            for i in range(count):
+                threading.Thread(target=target, name=f'stage-{stage}-{i}', daemon=True).start()
+        logger.info(f"分阶段流水线已启动: 检测线程 {self.det_workers}, 识别线程 {self.rec_workers}")
+
+    def submit(self, image, lang, profile, auto_state=None, ticket=None, deadline=None):
+        """提交一页图像（路径或数组），返回Future，结果为与PaddleOCR predict兼容的结果列表"""
+        self._ensure_started()
+        ticket = ticket or ScheduleTicket()
+        holder_id = engine_scheduler.acquire(self.scheduler_name, self.det_workers + self.rec_workers, ticket,
+                                             deadline, purpose=f"staged client={ticket.client_id}")
+        if lang == AUTO_LANG:
+            auto_state = auto_state if auto_state is not None else {}
+            det_model_name = AUTO_LANG_DET_MODEL
+            recognize = partial(recognize_auto_lang, auto_state=auto_state)
+        else:
+            det_model_name = TEXTLINE_MODEL_NAMES[lang]['det']
+            recognize = partial(recognize_split_pipeline, lang=lang)
+
+        future = Future()
+        job = {'future': future, 'image': image, 'profile': profile, 'det_model_name': det_model_name,
+               'recognize': recognize, 'deadline': deadline, 'queued_at': time.monotonic(), 'service_seconds': 0.0}
+        # 完成、出错或取消时归还名额
+        future.add_done_callback(lambda _: engine_scheduler.release(
+            self.scheduler_name, ticket, job['service_seconds'], holder_id))
+        priority = PRIORITY_CLASSES[ticket.priority]
+        with self._lock:
+            self._sequence += 1
+            self.det_queue.put((priority, self._sequence, job))
+        return future
+
+    def wait(self, future, deadline=None):
+        """等待结果；截止时间到达或客户端断开时取消尚未开始的任务并抛出对应异常"""
+        while True:
+            try:
+                return future.result(timeout=0.2)
+            except FutureTimeoutError:
+                pass
+            if deadline is not None:
+                try:
+                    deadline.check()
+                except (DeadlineExceeded, RequestCancelled):
+                    future.cancel()
+                    raise
+
+    def run(self, image, lang, profile, auto_state=None, ticket=None, deadline=None):
+        """提交一页并等待结果"""
+        return self.wait(self.submit(image, lang, profile, auto_state, ticket, deadline), deadline)
+
+    def _record(self, stage, started, job):
+        now = time.monotonic()
+        queued_at = job['queued_at']
+        job['service_seconds'] += now - started
+        with self._lock:
+            stats = self.stats[stage]
+            stats['processed'] += 1
+            stats['busy_seconds'] += now - started
+            stats['wait_seconds'] += started - queued_at
+
+    def _det_worker(self):
+        while True:
+            _, _, job = self.det_queue.get()
+            future = job['future']
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.monotonic()
+            try:
+                if job['deadline'] is not None:
+                    job['deadline'].check()
+                polys, crops = detect_and_crop_text_lines(job['image'], job['profile'], job['det_model_name'])
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            self._record('det', started, job)
+            if not polys:
+                future.set_result([])
+                continue
+            job.update(image=None, polys=polys, crops=crops, queued_at=time.monotonic())
+            self.rec_queue.put(job)
+
+    def _rec_worker(self):
+        while True:
+            job = self.rec_queue.get()
+            started = time.monotonic()
+            try:
+                if job['deadline'] is not None:
+                    job['deadline'].check()
+                result = job['recognize'](job['polys'], job['crops'])
+            except Exception as e:
+                job['future'].set_exception(e)
+                continue
+            self._record('rec', started, job)
+            job['future'].set_result(result)
+
+    def get_status(self):
+        """各阶段线程数、排队数、平均处理/排队耗时，以及按平均处理耗时建议的检测/识别线程分配"""
+        with self._lock:
+            stats = {stage: dict(values) for stage, values in self.stats.items()}
+        status = {'enabled': STAGED_PIPELINE}
+        for stage, workers, queue in (('det', self.det_workers, self.det_queue),
+                                      ('rec', self.rec_workers, self.rec_queue)):
+            processed = stats[stage]['processed']
+            status[stage] = {
+                'workers': workers,
+                'queued': queue.qsize(),
+                'processed': processed,
+                'avg_seconds': round(stats[stage]['busy_seconds'] / processed, 4) if processed else None,
+                'avg_wait_seconds': round(stats[stage]['wait_seconds'] / processed, 4) if processed else None,
+            }
+        det_avg, rec_avg = status['det']['avg_seconds'], status['rec']['avg_seconds']
+        if det_avg and rec_avg:
+            # 两阶段吞吐量相等时线程数与平均耗时成正比
+            total = self.det_workers + self.rec_workers
+            det_workers = min(total - 1, max(1, round(total * det_avg / (det_avg + rec_avg))))
+            status['suggested_split'] = {'det_workers': det_workers, 'rec_workers': total - det_workers}
+        return status
+
+
+staged_pipeline = StagedOCRPipeline()
+
+
+def process_file_ocr(file_path, filename, lang='ch', profile=None,
+                     pages=None, dpi=None, dpi_mode=None, max_pixels=None, ticket=None,
+                     deadline=None, page_report=None):
+    """处理文件OCR识别（支持图片和PDF）- 使用PaddleOCR引擎池
+
+    pages 为页码范围字符串（如 "1-3,5"），仅对PDF和多页TIFF生效；
+    dpi / dpi_mode / max_pixels 控制PDF页面的渲染分辨率策略。
+    ticket 为请求的调度凭据（优先级类别和客户端），引擎经调度器逐页借用。
+    deadline 为请求截止时间：多页文档超时后跳过剩余页面，已完成的页码和是否部分完成写入 page_report；
+    客户端断开时抛出RequestCancelled，放弃整个请求。
+    多页文档中的空白页跳过OCR，与前面页面相同的页复用其结果，每页的处理方式写入 page_report['pages']。
+    """
     if not ocr_engine_pool:
         raise Exception("PaddleOCR引擎池未初始化")
 
     # 验证语言支持
-    if lang not in ['ch', 'en', 'japan', 'korean', 'server']:
+    if lang not in SUPPORTED_LANGS and lang != AUTO_LANG:
         raise Exception(f"不支持的语言: {lang}")
 
+    profile = profile or DEFAULT_PROFILE
+    if profile not in OCR_PROFILES:
+        raise Exception(f"不支持的流水线配置: {profile}")
+    profile_params = OCR_PROFILES[profile]['params']
+    if lang == AUTO_LANG and (profile_params.get('use_doc_orientation_classify') or profile_params.get('use_doc_unwarping')):
+        logger.info(f"lang=auto 不做文档方向分类和文档矫正，配置 {profile} 中的这两项预处理不生效: {filename}")
+    if dpi_mode and dpi_mode not in PDF_DPI_MODES:
+        raise Exception(f"不支持的DPI策略: {dpi_mode}")
+    page_ranges = parse_page_ranges(pages)
+
     file_ext = os.path.splitext(filename)[1].lower()
     temp_files_to_clean = [file_path]  # 需要清理的临时文件列表
     all_results = []
-    engine = None
+    auto_state = {}  # lang=auto时在多页之间共享的语言判断结果
+    memory_reservation = None
+    page_report = page_report if page_report is not None else {}
+    page_report.update({'partial': False, 'completed': [], 'pages': []})
 
     try:
-        # 从引擎池获取引擎实例
-        engine = ocr_engine_pool.get_engine(lang)
-        logger.info(f"获取{lang}引擎成功")
+        # 多页TIFF与PDF一样按页流水处理，单页图像走图像处理流程
+        is_multipage_tiff = file_ext in MULTIPAGE_TIFF_EXTS and get_image_frame_count(file_path) > 1
+        is_document = file_ext == '.pdf' or is_multipage_tiff
 
         # 对于图像文件，先进行预处理验证
-        if file_ext != '.pdf':
+        if not is_document:
             is_valid, validation_msg, processed_file_path = validate_image_file(file_path)
             if not is_valid:
                 raise Exception(f"图像文件验证失败: {validation_msg}")
@@ -644,63 +3323,146 @@ def process_file_ocr(file_path, filename, lang='ch'):
                 file_path = processed_file_path
                 temp_files_to_clean.append(processed_file_path)
 
-        if file_ext == '.pdf':
-            # PDF文件处理
-            logger.info(f"处理PDF文件: {filename} (语言: {lang})")
-            image_paths, pdf_temp_files = pdf_to_images(file_path)
-            temp_files_to_clean.extend(pdf_temp_files)
+        # 按预估峰值内存在全局内存预算中预留，放不下时排队
+        memory_estimate = estimate_request_memory(file_path, file_ext == '.pdf', page_ranges, dpi, dpi_mode, max_pixels)
+        memory_reservation = memory_budget.reserve(memory_estimate, deadline)
+        logger.info(f"预留内存 {memory_estimate / MB:.0f}MB: {filename}")
+
+        if is_document:
+            if file_ext == '.pdf':
+                # PDF文件处理
+                doc_kind = 'PDF'
+                logger.info(f"处理PDF文件: {filename} (语言: {lang}, 配置: {profile}, 页码: {pages or '全部'})")
+                page_iter = iter_pdf_pages(file_path, page_ranges, dpi, dpi_mode, max_pixels)
+            else:
+                # 多页TIFF逐帧惰性解码
+                doc_kind = 'TIFF'
+                logger.info(f"处理多页TIFF文件: {filename} (语言: {lang}, 配置: {profile}, 页码: {pages or '全部'})")
+                page_iter = iter_tiff_frames(file_path, page_ranges)
+
+            # 对每一页进行OCR识别（后台预取下一页）
+            # 截止时间到达时退出循环，预取生成器随之关闭，后台不再渲染后续页面；
+            # 空白页判断和页面哈希在预取线程中随渲染一起完成。页面迭代器中打开的fitz文档（或TIFF图像）
+            # 只在预取线程中使用，并由预取线程在结束时关闭（analyze_pages 关闭时同时关闭页面迭代器）
+            seen_pages = []  # 已识别页面的(页面指纹, 页码, 识别结果)，用于文档内重复页复用
+            # 分阶段流水线中已提交、尚未取回结果的页面 (页索引, 页面信息, Future)，按页序取回
+            use_staged = uses_staged_pipeline(lang, profile)
+            staged_pages = deque()
+
+            def record_page(i, page_info, ocr_output):
+                """把一页的识别输出加入结果和页面报告"""
+                page_results = []
+                if ocr_output:
+                    logger.info(f"{doc_kind}第{i+1}页OCR输出: {ocr_output[:2] if len(ocr_output) > 2 else ocr_output}")
+                    # 直接处理PaddleOCR返回的结果列表
+                    converted = convert_paddleocr_to_standard_format(ocr_output)
+                    page_results.extend(converted)
+                else:
+                    logger.warning(f"{doc_kind}第{i+1}页OCR返回空结果")
+
+                # 为每页结果添加页码信息
+                for item in page_results:
+                    if len(item) >= 3:
+                        coords = item[0]
+                        text = item[1]
+                        confidence = item[2]
+                        all_results.append(
+                            [coords, f"[第{i + 1}页] {text}", confidence])
+
+                if page_info.get('hash') is not None:
+                    seen_pages.append((page_info['hash'], i + 1, page_results))
+                page_report['completed'].append(i + 1)
+                page_report['pages'].append({'page': i + 1, 'status': 'ocr', 'text_regions': len(page_results)})
+                logger.info(f"{doc_kind}第{i + 1}页识别完成，识别到 {len(page_results)} 个文本区域")
+
+            def drain_staged_pages(keep=0):
+                """按页序取回流水线中的页面，直到最多剩 keep 页；截止时间到达时取消剩余页面"""
+                while len(staged_pages) > keep:
+                    j, info, future = staged_pages.popleft()
+                    try:
+                        record_page(j, info, staged_pipeline.wait(future, deadline))
+                    except (DeadlineExceeded, RequestCancelled):
+                        for _, _, pending in staged_pages:
+                            pending.cancel()
+                        staged_pages.clear()
+                        raise
+                    except Exception as e:
+                        logger.error(f"{doc_kind}第{j + 1}页识别失败: {e}")
+
+            for i, page_image, page_info in prefetch_pages(analyze_pages(page_iter)):
+                try:
+                    if page_info.get('error') is not None:
+                        raise page_info['error']
+                    if deadline is not None:
+                        deadline.check()
+                    # 空白页和与流水线中页面重复的页需要前面页面的结果，先取回以保持结果顺序
+                    pending_hashes = [(info['hash'], j + 1, None) for j, info, _ in staged_pages
+                                      if info.get('hash') is not None]
+                    if page_info.get('blank') or find_duplicate_page(page_info.get('hash'), pending_hashes)[0]:
+                        drain_staged_pages()
+                    if page_info.get('blank'):
+                        logger.info(f"{doc_kind}第{i + 1}页为空白页（墨迹占比 {page_info['ink_ratio']:.5f}），跳过OCR")
+                        page_report['completed'].append(i + 1)
+                        page_report['pages'].append({'page': i + 1, 'status': 'blank', 'text_regions': 0})
+                        continue
+
+                    duplicate_of, page_results = find_duplicate_page(page_info.get('hash'), seen_pages)
+                    if duplicate_of:
+                        logger.info(f"{doc_kind}第{i + 1}页与第{duplicate_of}页相同，复用其识别结果")
+                        for item in page_results:
+                            all_results.append([item[0], f"[第{i + 1}页] {item[1]}", item[2]])
+                        page_report['completed'].append(i + 1)
+                        page_report['pages'].append({'page': i + 1, 'status': 'duplicate',
+                                                     'duplicate_of': duplicate_of, 'text_regions': len(page_results)})
+                        continue
 
-            if not image_paths:
-                raise Exception("PDF转换为图像失败")
+                    logger.info(f"调用PaddleOCR识别{doc_kind}第{i+1}页: {page_image.shape[1]}x{page_image.shape[0]}")
 
-            # 对每一页进行OCR识别
-            for i, img_path in enumerate(image_paths):
-                try:
-                    # 验证转换后的图像
-                    is_valid, validation_msg, processed_img_path = validate_image_file(img_path)
-                    if not is_valid:
-                        logger.warning(f"PDF第{i + 1}页图像验证失败: {validation_msg}")
+                    if use_staged:
+                        # lang=auto 尚未判断出文字系统时先取回前面的页面，每个文档只判断一次，也不会有两页同时写 auto_state
+                        if lang == AUTO_LANG and 'lang' not in auto_state:
+                            drain_staged_pages()
+                        # 提交到分阶段流水线，当前页检测时前一页可能仍在识别
+                        staged_pages.append((i, page_info, staged_pipeline.submit(
+                            page_image, lang, profile, auto_state, ticket, deadline)))
+                        drain_staged_pages(STAGE_PAGE_WINDOW - 1)
                         continue
-                    
-                    # 如果图像被转换，更新路径并添加到清理列表
-                    if processed_img_path != img_path:
-                        img_path = processed_img_path
-                        temp_files_to_clean.append(processed_img_path)
-
-                    # 使用PaddleOCR进行识别
-                    logger.info(f"调用PaddleOCR识别PDF第{i+1}页: {img_path}")
-                    ocr_output = engine.predict(img_path)
-                    
-                    # 处理PaddleOCR结果
-                    page_results = []
-                    if ocr_output:
-                        logger.info(f"PDF第{i+1}页OCR输出: {ocr_output[:2] if len(ocr_output) > 2 else ocr_output}")
-                        # 直接处理PaddleOCR返回的结果列表
-                        converted = convert_paddleocr_to_standard_format(ocr_output)
-                        page_results.extend(converted)
-                    else:
-                        logger.warning(f"PDF第{i+1}页OCR返回空结果")
-
-                    # 为每页结果添加页码信息
-                    for item in page_results:
-                        if len(item) >= 3:
-                            coords = item[0]
-                            text = item[1]
-                            confidence = item[2]
-                            all_results.append(
-                                [coords, f"[第{i + 1}页] {text}", confidence])
-
-                    logger.info(f"PDF第{i + 1}页识别完成，识别到 {len(page_results)} 个文本区域")
+
+                    # 使用PaddleOCR进行识别（每页重新申请引擎，页间让出给更高优先级的请求）
+                    with engine_scheduler.checkout(lang, profile, ticket, deadline) as engine:
+                        ocr_output = predict_image(engine, page_image, lang, profile, auto_state)
+                    record_page(i, page_info, ocr_output)
+                except DeadlineExceeded as e:
+                    logger.warning(f"{e}，跳过{doc_kind}第{i + 1}页及之后的页面")
+                    page_report['partial'] = True
+                    break
+                except RequestCancelled:
+                    raise
                 except Exception as e:
-                    logger.error(f"PDF第{i + 1}页识别失败: {e}")
+                    logger.error(f"{doc_kind}第{i + 1}页识别失败: {e}")
                     continue
+
+            try:
+                drain_staged_pages()
+            except DeadlineExceeded as e:
+                logger.warning(f"{e}，放弃{doc_kind}流水线中尚未完成的页面")
+                page_report['partial'] = True
+
+            if page_report['partial'] and not page_report['completed']:
+                raise DeadlineExceeded("截止时间内未完成任何页面")
         else:
             # 图像文件处理
-            logger.info(f"处理图像文件: {filename} (语言: {lang})")
+            logger.info(f"处理图像文件: {filename} (语言: {lang}, 配置: {profile})")
             try:
                 # 使用PaddleOCR进行识别
                 logger.info(f"调用PaddleOCR引擎识别文件: {file_path}")
-                ocr_output = engine.predict(file_path)
+                if deadline is not None:
+                    deadline.check()
+                if uses_staged_pipeline(lang, profile):
+                    ocr_output = staged_pipeline.run(file_path, lang, profile, auto_state, ticket, deadline)
+                else:
+                    with engine_scheduler.checkout(lang, profile, ticket, deadline) as engine:
+                        ocr_output = predict_image(engine, file_path, lang, profile, auto_state)
                 
                 # 详细记录OCR输出结果
                 logger.info(f"PaddleOCR原始输出类型: {type(ocr_output)}")
@@ -718,6 +3480,8 @@ def process_file_ocr(file_path, filename, lang='ch'):
                     logger.warning("PaddleOCR返回空结果")
                 
                 logger.info(f"图像OCR处理完成，识别到 {len(all_results)} 个文本区域")
+            except (DeadlineExceeded, RequestCancelled):
+                raise
             except Exception as ocr_error:
                 # 详细的OCR错误诊断
                 diagnosis = diagnose_paddleocr_error(ocr_error, file_path, filename)
@@ -728,15 +3492,15 @@ def process_file_ocr(file_path, filename, lang='ch'):
         logger.error(f"文件OCR处理失败 - 文件: {filename}, 错误: {e}")
         raise e
     finally:
-        # 归还引擎实例到池中
-        if engine and ocr_engine_pool:
-            ocr_engine_pool.return_engine(lang, engine)
-            logger.info(f"归还{lang}引擎到池中")
+        if memory_reservation is not None:
+            memory_budget.release(memory_reservation)
 
         # 清理所有临时文件
         for temp_file in temp_files_to_clean:
             safe_remove_file(temp_file)
 
+    if lang == AUTO_LANG:
+        logger.info(f"自动语言识别完成: {filename} -> {auto_state.get('lang') or AUTO_LANG_FALLBACK}")
     return all_results
 
 
@@ -766,36 +3530,218 @@ def log_ocr_performance(lang, processing_time, success, result_count=0):
         logger.info(f"引擎池状态: {pool_status}")
 
 
-def get_engine_pool_health():
-    """获取引擎池健康状态"""
-    if not ocr_engine_pool:
-        return {"status": "error", "message": "引擎池未初始化"}
+def get_engine_pool_health():
+    """获取引擎池健康状态"""
+    if USE_JOB_QUEUE:
+        # 前端只提交任务，引擎池在工作进程中
+        try:
+            return {"status": "healthy", "mode": "job_queue", "job_queue": job_queue.get_status(),
+                    "coalescing": request_coalescer.get_status(), "callbacks": callback_jobs.get_status()}
+        except Exception as e:
+            return {"status": "error", "message": f"任务队列不可用: {str(e)}"}
+
+    if not ocr_engine_pool:
+        return {"status": "error", "message": "引擎池未初始化"}
+
+    try:
+        pool_status = ocr_engine_pool.get_pool_status()
+        total_engines = sum(status['max_size'] for status in pool_status.values())
+        available_engines = sum(status['available'] for status in pool_status.values())
+
+        return {
+            "status": "healthy",
+            "ready": ocr_engine_pool.get_readiness()['ready'],
+            "backend": OCR_BACKEND,
+            "thread_budget": thread_budget.get_status(),
+            "memory_budget": memory_budget.get_status(),
+            "scheduler": engine_scheduler.get_status(),
+            "total_engines": total_engines,
+            "available_engines": available_engines,
+            "pool_details": pool_status,
+            "leases": ocr_engine_pool.get_lease_status(),
+            "textline_models": textline_model_pool.get_pool_status(),
+            "rec_cache": rec_cache.get_status(),
+            "coalescing": request_coalescer.get_status(),
+            "staged_pipeline": staged_pipeline.get_status(),
+            "callbacks": callback_jobs.get_status()
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+def get_output_options(values):
+    """从请求参数中提取输出格式选项，格式不支持或缺少依赖时抛出ValueError"""
+    output_format = (values.get('format') or 'json').lower()
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {output_format}")
+    if output_format == 'msgpack' and msgpack is None:
+        raise ValueError("format=msgpack 需要安装msgpack: pip install msgpack")
+    int_coords = values.get('int_coords')
+    if not isinstance(int_coords, bool):
+        int_coords = inputs.boolean(int_coords) if int_coords not in (None, '') else False
+    return {'output_format': output_format, 'int_coords': int_coords}
+
+
+def to_builtin(value):
+    """JSON/MessagePack序列化时把numpy类型转换为Python原生类型"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def round_result_coords(results):
+    """识别结果中的坐标四舍五入为整数"""
+    return [[[[int(round(float(v))) for v in point] for point in item[0]]] + list(item[1:]) for item in results]
+
+
+def serialize_ocr_response(body, status, output_options=None, accept_encoding=''):
+    """序列化识别接口响应，返回 (响应体字节, 响应头)
+
+    不经过 flask-restx 的 marshal 和缩进JSON：直接按 ocr_model 的字段补齐键，用orjson（未安装时用紧凑的json）编码；
+    text 格式只输出文本，msgpack 格式输出二进制；客户端接受gzip时压缩较大的响应体。
+    """
+    output_options = output_options or {}
+    output_format = output_options.get('output_format', 'json')
+    results = body.get('message')
+    is_result_list = isinstance(results, list) and 200 <= status < 300
+    if is_result_list and output_options.get('int_coords'):
+        body = dict(body, message=round_result_coords(results))
+
+    if output_format == 'text' and is_result_list:
+        payload = '\n'.join(str(item[1]) for item in body['message']).encode('utf-8')
+        content_type = 'text/plain; charset=utf-8'
+    else:
+        data = {key: body.get(key) for key in ocr_model}
+        if output_format == 'msgpack':
+            payload = msgpack.packb(data, use_bin_type=True, default=to_builtin)
+            content_type = 'application/msgpack'
+        elif orjson is not None:
+            payload = orjson.dumps(data, default=to_builtin, option=orjson.OPT_SERIALIZE_NUMPY)
+            content_type = 'application/json'
+        else:
+            payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=to_builtin).encode('utf-8')
+            content_type = 'application/json'
+
+    headers = {'Content-Type': content_type, 'Vary': 'Accept-Encoding'}
+    # 按 Accept-Encoding 的q值判断（gzip;q=0 或 *;q=0 表示拒绝gzip），不做子串匹配
+    if len(payload) >= COMPRESS_MIN_BYTES and parse_accept_header(accept_encoding or '')['gzip'] > 0:
+        payload = gzip.compress(payload, compresslevel=5)
+        headers['Content-Encoding'] = 'gzip'
+    return payload, headers
+
+
+def make_ocr_http_response(body, status, output_options=None):
+    """构造Flask识别接口响应"""
+    payload, headers = serialize_ocr_response(body, status, output_options, request.headers.get('Accept-Encoding', ''))
+    return app.response_class(payload, status=status, headers=headers)
+
+
+def page_report_response(result, page_report):
+    """成功响应体：识别结果，多页文档附带已完成页码和是否因截止时间部分完成"""
+    response = {"message": result}
+    if page_report.get('completed') or page_report.get('partial'):
+        response['partial'] = page_report['partial']
+        response['completed_pages'] = page_report['completed']
+        response['pages'] = page_report['pages']
+    return response
+
+
+def run_file_ocr_job(temp_file_path, original_filename, lang, profile, render_options, ticket=None, deadline=None):
+    """对已暂存的上传文件执行OCR并构造 /ocr/file 的响应体和状态码（Flask处理器与异步前端共用）"""
+    page_report = {}
+    try:
+        start_time = time.time()
+
+        result = process_file_ocr(temp_file_path, original_filename, lang, profile, ticket=ticket,
+                                  deadline=deadline, page_report=page_report, **render_options)
+
+        processing_time = time.time() - start_time
+
+        if not result and not page_report['partial']:
+            log_ocr_performance(lang, processing_time, False, 0)
+            return {
+                "message": "未识别到任何文字内容",
+                "error_type": "OCR_ENGINE",
+                "error_details": "OCR处理完成但未检测到文字",
+                "suggestions": [
+                    "确认图像中包含清晰的文字内容",
+                    "尝试提高图像质量或分辨率",
+                    "检查图像是否为正确的方向"
+                ]
+            }, 200
+
+        # 转换numpy类型以确保JSON序列化
+        result = convert_np_float32(result)
+        log_ocr_performance(lang, processing_time, True, len(result))
+        logger.info(f"PaddleOCR处理成功完成: {original_filename}, 耗时: {processing_time:.2f}s")
+        return page_report_response(result, page_report), 200
+
+    except DeadlineExceeded as e:
+        log_ocr_performance(lang, time.time() - start_time, False, 0)
+        return {
+            "message": "请求超过截止时间",
+            "error_type": "DEADLINE",
+            "error_details": str(e),
+            "suggestions": ["增大截止时间（timeout 参数或 X-OCR-Deadline 请求头）", "使用pages参数减少需要识别的页数"]
+        }, 504
+    except RequestCancelled as e:
+        logger.warning(f"请求已放弃: {original_filename}, {e}")
+        return {"message": "客户端已断开，请求已放弃", "error_type": "CANCELLED", "error_details": str(e)}, 499
+    except MemoryBudgetExceeded as e:
+        logger.warning(f"内存预算不足，拒绝请求: {original_filename}, {e}")
+        return {
+            "message": "服务器内存预算不足",
+            "error_type": "MEMORY_BUDGET",
+            "error_details": str(e),
+            "suggestions": ["稍后重试", "使用pages参数减少页数", "降低dpi或使用 dpi_mode=max_pixels"]
+        }, e.status_code
+    except ModelPoolBusy as e:
+        logger.warning(f"单模型实例池繁忙，拒绝请求: {original_filename}, {e}")
+        return {
+            "message": "服务器繁忙，模型实例等待超时",
+            "error_type": "POOL_BUSY",
+            "error_details": str(e),
+            "suggestions": ["稍后重试", "增大 OCR_TEXTLINE_MODEL_POOL_SIZE"]
+        }, 503
+
+    except Exception as ocr_error:
+        # 记录失败的性能统计
+        processing_time = 0
+        if 'start_time' in locals():
+            processing_time = time.time() - start_time
+        log_ocr_performance(lang, processing_time, False, 0)
 
-    try:
-        pool_status = ocr_engine_pool.get_pool_status()
-        total_engines = sum(status['max_size'] for status in pool_status.values())
-        available_engines = sum(status['available'] for status in pool_status.values())
+        # 使用详细的OCR错误诊断
+        diagnosis = diagnose_paddleocr_error(ocr_error, temp_file_path, original_filename)
+        logger.error(f"PaddleOCR处理失败: {original_filename}")
 
         return {
-            "status": "healthy",
-            "total_engines": total_engines,
-            "available_engines": available_engines,
-            "pool_details": pool_status
-        }
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+            "message": "OCR识别失败",
+            "error_type": diagnosis["error_type"],
+            "error_details": diagnosis["error_details"],
+            "suggestions": diagnosis["suggestions"]
+        }, 500
 
 
 @ocr_ns.route('/file')
 class OCRFromFile(Resource):
     @api.expect(file_parser)
-    @api.marshal_with(ocr_model)
+    @api.response(200, 'OCR识别结果', ocr_model)
+    @api.response(202, '已接受，完成后回调（指定callback_url时）', ocr_model)
     def post(self):
         """
         从上传的文件进行OCR识别 - 使用PaddleOCR V5引擎
         支持图像文件（jpg/png/bmp/tiff）和PDF文档
         支持中英日韩多语言识别，线程安全，高精度识别
         """
+        output_options = {}
+        body, status = self.recognize(output_options)
+        return make_ocr_http_response(body, status, output_options)
+
+    def recognize(self, output_options):
+        """处理上传文件识别请求，返回响应体和状态码，解析出的输出格式写入 output_options"""
         temp_file_path = None
         original_filename = None
 
@@ -805,6 +3751,11 @@ class OCRFromFile(Resource):
                 args = file_parser.parse_args()
                 uploaded_file = args['file']
                 lang = args.get('lang', 'ch')
+                profile = args.get('profile') or DEFAULT_PROFILE
+                render_options = get_page_render_options(args)
+                deadline = make_request_deadline(request.headers, args.get('timeout'))
+                output_options.update(get_output_options(args))
+                callback_url = validate_callback_url(args.get('callback_url'))
             except Exception as parse_error:
                 logger.error(f"HTTP请求解析失败: {parse_error}")
                 return {
@@ -814,7 +3765,9 @@ class OCRFromFile(Resource):
                     "suggestions": [
                         "确认使用multipart/form-data格式上传文件",
                         "检查文件字段名是否为'file'",
-                        "验证请求头Content-Type是否正确"
+                        "验证请求头Content-Type是否正确",
+                        "检查页码范围(pages)和DPI参数格式",
+                        "检查回调地址(callback_url)是否为http/https地址"
                     ]
                 }, 400
 
@@ -833,7 +3786,7 @@ class OCRFromFile(Resource):
 
                 # 检查文件类型
                 file_ext = os.path.splitext(original_filename)[1].lower()
-                supported_formats = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.pdf']
+                supported_formats = SUPPORTED_FILE_FORMATS
 
                 if file_ext not in supported_formats:
                     return {
@@ -843,13 +3796,9 @@ class OCRFromFile(Resource):
                         "suggestions": [f"支持的格式: {', '.join(supported_formats)}", "请转换文件格式后重试"]
                     }, 400
 
-                # 使用安全的文件名处理
-                safe_filename = safe_filename_handler(original_filename)
-                temp_file_path = tempfile.mktemp(suffix=file_ext)
-
-                # 保存上传文件
-                uploaded_file.save(temp_file_path)
-                logger.info(f"文件已保存到临时路径: {temp_file_path}")
+                # 上传文件已在请求解析时流式写入暂存目录，直接接管
+                temp_file_path = spool_uploaded_file(uploaded_file, file_ext)
+                logger.info(f"文件已保存到暂存路径: {temp_file_path}")
 
             except Exception as file_error:
                 logger.error(f"文件处理失败: {file_error}")
@@ -864,54 +3813,17 @@ class OCRFromFile(Resource):
                     ]
                 }, 500
 
-            logger.info(f"开始OCR处理: {original_filename} ({file_ext}, 语言: {lang})")
+            logger.info(f"开始OCR处理: {original_filename} ({file_ext}, 语言: {lang}, 配置: {profile})")
 
             # OCR处理层错误处理
-            try:
-                import time
-                start_time = time.time()
-
-                result = process_file_ocr(temp_file_path, original_filename, lang)
-
-                processing_time = time.time() - start_time
-
-                if not result:
-                    log_ocr_performance(lang, processing_time, False, 0)
-                    return {
-                        "message": "未识别到任何文字内容",
-                        "error_type": "OCR_ENGINE",
-                        "error_details": "OCR处理完成但未检测到文字",
-                        "suggestions": [
-                            "确认图像中包含清晰的文字内容",
-                            "尝试提高图像质量或分辨率",
-                            "检查图像是否为正确的方向"
-                        ]
-                    }, 200
-
-                # 转换numpy类型以确保JSON序列化
-                result = convert_np_float32(result)
-                log_ocr_performance(lang, processing_time, True, len(result))
-                logger.info(f"PaddleOCR处理成功完成: {original_filename}, 耗时: {processing_time:.2f}s")
-                return {"message": result}, 200
-
-            except Exception as ocr_error:
-                # 记录失败的性能统计
-                processing_time = 0
-                if 'start_time' in locals():
-                    import time
-                    processing_time = time.time() - start_time
-                log_ocr_performance(lang, processing_time, False, 0)
-
-                # 使用详细的OCR错误诊断
-                diagnosis = diagnose_paddleocr_error(ocr_error, temp_file_path, original_filename)
-                logger.error(f"PaddleOCR处理失败: {original_filename}")
-
-                return {
-                    "message": "OCR识别失败",
-                    "error_type": diagnosis["error_type"],
-                    "error_details": diagnosis["error_details"],
-                    "suggestions": diagnosis["suggestions"]
-                }, 500
+            ticket = make_schedule_ticket(request.headers, request.remote_addr)
+            params = {'filename': original_filename, 'lang': lang, 'profile': profile, 'render_options': render_options}
+            if callback_url:
+                # 暂存文件交由后台任务负责删除
+                owned_path, temp_file_path = temp_file_path, None
+                return callback_jobs.submit('file', callback_url, output_options, params, ticket, deadline,
+                                            request.host_url, owned_path)
+            return dispatch_ocr_job('file', temp_file_path, params, ticket, deadline)
 
         except Exception as unexpected_error:
             # 捕获所有未预期的错误
@@ -933,56 +3845,98 @@ class OCRFromFile(Resource):
                 safe_remove_file(temp_file_path)
 
 
+def run_url_ocr_job(temp_file_path, file_name, url, lang, profile, render_options, ticket=None, deadline=None):
+    """对已下载到暂存目录的URL文件执行OCR并构造 /ocr/url 的响应体和状态码（Flask处理器与异步前端共用）"""
+    start_time = time.time()
+    page_report = {}
+    try:
+        result = process_file_ocr(temp_file_path, file_name, lang, profile, ticket=ticket,
+                                  deadline=deadline, page_report=page_report, **render_options)
+
+        processing_time = time.time() - start_time
+
+        if not result and not page_report['partial']:
+            log_ocr_performance(lang, processing_time, False, 0)
+            return {"message": "未识别到任何文字内容"}, 200
+
+        # 转换numpy类型以确保JSON序列化
+        result = convert_np_float32(result)
+        log_ocr_performance(lang, processing_time, True, len(result))
+        logger.info(f"PaddleOCR URL处理成功: {url}, 耗时: {processing_time:.2f}s")
+        return page_report_response(result, page_report), 200
+
+    except DeadlineExceeded as e:
+        log_ocr_performance(lang, time.time() - start_time, False, 0)
+        return {'message': f'识别超时: {str(e)}', 'error_type': 'DEADLINE'}, 504
+    except RequestCancelled as e:
+        logger.warning(f"请求已放弃: {url}, {e}")
+        return {'message': '客户端已断开，请求已放弃', 'error_type': 'CANCELLED'}, 499
+    except MemoryBudgetExceeded as e:
+        logger.warning(f"内存预算不足，拒绝请求: {url}, {e}")
+        return {'message': f'服务器内存预算不足: {str(e)}', 'error_type': 'MEMORY_BUDGET'}, e.status_code
+    except ModelPoolBusy as e:
+        logger.warning(f"单模型实例池繁忙，拒绝请求: {url}, {e}")
+        return {'message': f'服务器繁忙: {str(e)}', 'error_type': 'POOL_BUSY'}, 503
+    except Exception as e:
+        # 记录失败的性能统计
+        log_ocr_performance(lang, time.time() - start_time, False, 0)
+        logger.error(f'[PaddleOCR URL]错误: {e}')
+        return {'message': f'识别失败: {str(e)}'}, 500
+
+
 @ocr_ns.route('/url')
 class OCRFromURL(Resource):
     @api.expect(url_parser)
-    @api.marshal_with(ocr_model)
+    @api.response(200, 'OCR识别结果', ocr_model)
+    @api.response(202, '已接受，完成后回调（指定callback_url时）', ocr_model)
     def post(self):
         """
         从URL识别图像文字 - 使用PaddleOCR V5引擎
         提供图像文件的URL并获取文字识别结果
         支持中英日韩多语言识别，线程安全，高精度识别
         """
+        output_options = {}
+        body, status = self.recognize(output_options)
+        return make_ocr_http_response(body, status, output_options)
+
+    def recognize(self, output_options):
+        """处理URL识别请求，返回响应体和状态码，解析出的输出格式写入 output_options"""
         temp_file_path = None
         try:
             args = url_parser.parse_args()
             url = args['url']
             lang = args.get('lang', 'ch')
+            profile = args.get('profile') or DEFAULT_PROFILE
+            try:
+                render_options = get_page_render_options(args)
+                deadline = make_request_deadline(request.headers, args.get('timeout'))
+                output_options.update(get_output_options(args))
+                callback_url = validate_callback_url(args.get('callback_url'))
+            except ValueError as option_error:
+                return {'message': f'参数错误: {option_error}'}, 400
 
             # 提取文件名并下载到临时文件
             file_name = extract_filename_from_url(url)
+            if callback_url:
+                # 回调模式下载也在后台进行
+                ticket = make_schedule_ticket(request.headers, request.remote_addr)
+                params = {'filename': file_name, 'url': url, 'lang': lang, 'profile': profile, 'render_options': render_options}
+                return callback_jobs.submit('url', callback_url, output_options, params, ticket, deadline,
+                                            request.host_url)
             file_ext = os.path.splitext(file_name)[1].lower()
-            temp_file_path = tempfile.mktemp(suffix=file_ext)
+            temp_file_path = new_spool_path(file_ext)
 
-            download_image(url, temp_file_path)
+            download_remote_file(url, temp_file_path, render_options['pages'])
             logger.info(f"从URL下载文件: {url} (语言: {lang})")
 
             # 处理文件OCR识别
-            import time
-            start_time = time.time()
-
-            result = process_file_ocr(temp_file_path, file_name, lang)
-
-            processing_time = time.time() - start_time
-
-            if not result:
-                log_ocr_performance(lang, processing_time, False, 0)
-                return {"message": "未识别到任何文字内容"}, 200
-
-            # 转换numpy类型以确保JSON序列化
-            result = convert_np_float32(result)
-            log_ocr_performance(lang, processing_time, True, len(result))
-            logger.info(f"PaddleOCR URL处理成功: {url}, 耗时: {processing_time:.2f}s")
-            return {"message": result}, 200
+            ticket = make_schedule_ticket(request.headers, request.remote_addr)
+            params = {'filename': file_name, 'url': url, 'lang': lang, 'profile': profile, 'render_options': render_options}
+            return dispatch_ocr_job('url', temp_file_path, params, ticket, deadline)
 
         except Exception as e:
-            # 记录失败的性能统计
-            processing_time = 0
             lang = args.get('lang', 'ch') if 'args' in locals() else 'ch'
-            if 'start_time' in locals():
-                import time
-                processing_time = time.time() - start_time
-            log_ocr_performance(lang, processing_time, False, 0)
+            log_ocr_performance(lang, 0, False, 0)
 
             logger.error(f'[PaddleOCR URL]错误: {e}')
             return {'message': f'识别失败: {str(e)}'}, 500
@@ -992,6 +3946,983 @@ class OCRFromURL(Resource):
                 safe_remove_file(temp_file_path)
 
 
+# 多节点工作模式：HTTP前端把识别任务写入共享卷上的SQLite任务队列，由 `python app.py worker` 进程领取执行。
+# 任务持久化在数据库中，服务重启后仍可继续；领取后未在可见性超时内续期（工作进程退出）的任务重新可见，失败任务按次数重试
+JOB_QUEUE_DIR = os.environ.get('OCR_QUEUE_DIR', os.path.join(ROOT_DIR, 'queue'))
+USE_JOB_QUEUE = os.environ.get('OCR_USE_JOB_QUEUE', '0') == '1'
+JOB_VISIBILITY_TIMEOUT = float(os.environ.get('OCR_JOB_VISIBILITY_TIMEOUT', '120'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('OCR_JOB_MAX_ATTEMPTS', '3'))
+JOB_RESULT_TIMEOUT = float(os.environ.get('OCR_JOB_RESULT_TIMEOUT', '600'))
+JOB_POLL_INTERVAL = 0.2
+# 工作进程得到这些状态码时把任务放回队列，由其它（或稍后的）工作进程重试
+JOB_RETRY_STATUSES = (503,)
+# 已结束但结果未被取走（前端已退出）的任务保留时长
+JOB_RETENTION_SECONDS = JOB_RESULT_TIMEOUT * 2
+
+
+class JobQueue:
+    """基于SQLite的持久化任务队列：WAL模式，每次操作使用独立连接，可被多个进程/容器通过共享卷同时使用"""
+
+    def __init__(self, queue_dir=JOB_QUEUE_DIR):
+        self.queue_dir = queue_dir
+        self.input_dir = os.path.join(queue_dir, 'inputs')
+        self.db_path = os.path.join(queue_dir, 'jobs.db')
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _ensure_schema(self):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            os.makedirs(self.input_dir, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        id TEXT PRIMARY KEY,
+                        kind TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        result TEXT,
+                        http_status INTEGER,
+                        priority INTEGER NOT NULL,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        visible_at REAL NOT NULL,
+                        worker_id TEXT,
+                        created_at REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    )""")
+                conn.execute('CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority, visible_at)')
+            finally:
+                conn.close()
+            self._schema_ready = True
+
+    @contextmanager
+    def _connect(self, immediate=False):
+        """打开连接；immediate=True 时在写事务中执行，退出时提交（异常时回滚）"""
+        self._ensure_schema()
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            if not immediate:
+                yield conn
+                return
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def input_path(self, name):
+        return os.path.join(self.input_dir, name)
+
+    def submit(self, kind, file_path, params, ticket=None, deadline=None):
+        """把已暂存的输入文件移入队列目录并登记任务，返回任务ID"""
+        self._ensure_schema()
+        ticket = ticket or ScheduleTicket()
+        job_id = uuid.uuid4().hex
+        input_name = job_id + os.path.splitext(file_path)[1]
+        shutil.move(file_path, self.input_path(input_name))
+
+        now = time.time()
+        remaining = deadline.remaining() if deadline is not None else None
+        payload = {
+            'input': input_name,
+            'params': params,
+            'priority': ticket.priority,
+            'client_id': ticket.client_id,
+            'expires_at': now + remaining if remaining is not None else None,
+        }
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, status, payload, priority, visible_at, created_at, updated_at) "
+                    "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                    (job_id, kind, json.dumps(payload, ensure_ascii=False), PRIORITY_CLASSES[ticket.priority],
+                     now, now, now))
+        except Exception:
+            safe_remove_file(self.input_path(input_name))
+            raise
+        logger.info(f"任务已提交: {job_id} ({kind}, {params.get('filename')})")
+        return job_id
+
+    def claim(self, worker_id):
+        """领取一个可见的任务（按优先级类别和提交顺序），返回任务字典，没有任务时返回None"""
+        now = time.time()
+        with self._connect(immediate=True) as conn:
+            while True:
+                row = conn.execute(
+                    "SELECT id, kind, payload, attempts FROM jobs "
+                    "WHERE status IN ('queued', 'running') AND visible_at <= ? "
+                    "ORDER BY priority, created_at LIMIT 1", (now,)).fetchone()
+                if row is None:
+                    return None
+                job_id, kind, payload, attempts = row
+                payload = json.loads(payload)
+                if attempts >= JOB_MAX_ATTEMPTS:
+                    # 领取次数已用完：工作进程多次在处理中途退出
+                    logger.error(f"任务多次处理中断，标记为失败: {job_id}")
+                    self._finish(conn, job_id, 'failed', {
+                        "message": "OCR任务处理失败",
+                        "error_type": "SYSTEM_ERROR",
+                        "error_details": f"工作进程{attempts}次处理中断，超过最大尝试次数",
+                        "suggestions": ["检查工作进程日志", "确认文件未损坏后重试"]
+                    }, 500)
+                    safe_remove_file(self.input_path(payload['input']))
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, visible_at = ?, "
+                    "worker_id = ?, updated_at = ? WHERE id = ?",
+                    (now + JOB_VISIBILITY_TIMEOUT, worker_id, now, job_id))
+                return {'id': job_id, 'kind': kind, 'payload': payload, 'attempts': attempts + 1}
+
+    def extend(self, job_id, worker_id):
+        """续期处理中任务的可见性超时；任务已被取消或被其它工作进程接手时返回False"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET visible_at = ?, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now + JOB_VISIBILITY_TIMEOUT, now, job_id, worker_id))
+            return cursor.rowcount > 0
+
+    @staticmethod
+    def _finish(conn, job_id, status, body, http_status, worker_id=None):
+        query = "UPDATE jobs SET status = ?, result = ?, http_status = ?, updated_at = ? WHERE id = ?"
+        params = [status, json.dumps(body, ensure_ascii=False, default=to_builtin), http_status, time.time(), job_id]
+        if worker_id is not None:
+            query += " AND worker_id = ? AND status = 'running'"
+            params.append(worker_id)
+        return conn.execute(query, params).rowcount > 0
+
+    def complete(self, job_id, worker_id, body, http_status):
+        """写回任务结果；任务已被取消或被其它工作进程接手时返回False并删除已取消的任务"""
+        with self._connect(immediate=True) as conn:
+            if self._finish(conn, job_id, 'done', body, http_status, worker_id):
+                return True
+            conn.execute("DELETE FROM jobs WHERE id = ? AND status = 'cancelled'", (job_id,))
+            return False
+
+    def retry(self, job_id, worker_id, delay=0):
+        """把处理中的任务放回队列，delay秒后重新可见"""
+        now = time.time()
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = 'queued', worker_id = NULL, visible_at = ?, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now + delay, now, job_id, worker_id)).rowcount > 0
+
+    def get_result(self, job_id):
+        """已结束的任务返回 (响应体, 状态码)，未结束或不存在时返回None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result, http_status FROM jobs WHERE id = ? AND status IN ('done', 'failed')",
+                (job_id,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def delete(self, job_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def cancel(self, job_id):
+        """取消任务：排队中的任务直接删除，处理中的任务标记为已取消（工作进程在页间发现后放弃）"""
+        with self._connect(immediate=True) as conn:
+            row = conn.execute("SELECT status, payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            status, payload = row
+            if status == 'queued':
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                safe_remove_file(self.input_path(json.loads(payload)['input']))
+            elif status == 'running':
+                conn.execute("UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE id = ?",
+                             (time.time(), job_id))
+            else:
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def purge(self, max_age=JOB_RETENTION_SECONDS):
+        """删除结果长时间未被取走的已结束任务，返回删除数量"""
+        with self._connect() as conn:
+            return conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND updated_at < ?",
+                (time.time() - max_age,)).rowcount
+
+    def wait_for_result(self, job_id, deadline=None):
+        """轮询等待任务结果，返回 (响应体, 状态码)；超时或客户端断开时取消任务"""
+        timeout = JOB_RESULT_TIMEOUT
+        if deadline is not None and deadline.remaining() is not None:
+            timeout = min(timeout, deadline.remaining())
+        wait_until = time.monotonic() + timeout
+        while True:
+            outcome = self.get_result(job_id)
+            if outcome is not None:
+                self.delete(job_id)
+                return outcome
+            if deadline is not None and deadline.is_cancelled is not None and deadline.is_cancelled():
+                self.cancel(job_id)
+                return {"message": "客户端已断开，请求已放弃", "error_type": "CANCELLED",
+                        "error_details": f"任务 {job_id} 已取消"}, 499
+            if time.monotonic() >= wait_until:
+                self.cancel(job_id)
+                logger.warning(f"等待任务结果超时，已取消: {job_id}")
+                return {
+                    "message": "请求超过截止时间",
+                    "error_type": "DEADLINE",
+                    "error_details": f"任务 {job_id} 在{timeout:g}秒内未完成",
+                    "suggestions": ["增大截止时间（timeout 参数或 X-OCR-Deadline 请求头）", "增加工作进程数量"]
+                }, 504
+            time.sleep(JOB_POLL_INTERVAL)
+
+    def get_status(self):
+        """获取队列中各状态的任务数"""
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {'path': self.db_path, 'jobs': counts}
+
+
+job_queue = JobQueue()
+
+
+def run_ocr_job(kind, temp_file_path, params, ticket=None, deadline=None):
+    """在本进程中执行识别任务，返回响应体和状态码"""
+    if kind == 'url':
+        return run_url_ocr_job(temp_file_path, params['filename'], params['url'], params['lang'],
+                               params['profile'], params['render_options'], ticket, deadline)
+    return run_file_ocr_job(temp_file_path, params['filename'], params['lang'], params['profile'],
+                            params['render_options'], ticket, deadline)
+
+
+def execute_ocr_job(kind, temp_file_path, params, ticket=None, deadline=None):
+    """执行识别任务：启用任务队列时提交给工作进程并等待结果，否则在本进程中执行"""
+    if not USE_JOB_QUEUE:
+        return run_ocr_job(kind, temp_file_path, params, ticket, deadline)
+    try:
+        job_id = job_queue.submit(kind, temp_file_path, params, ticket, deadline)
+    except Exception as e:
+        logger.error(f"提交任务失败: {e}")
+        return {
+            "message": "任务队列不可用",
+            "error_type": "SYSTEM_ERROR",
+            "error_details": f"提交任务失败: {str(e)}",
+            "suggestions": ["稍后重试", "检查共享任务队列目录(OCR_QUEUE_DIR)是否可写"]
+        }, 503
+    return job_queue.wait_for_result(job_id, deadline)
+
+
+# 并发相同请求合并：文件内容哈希和识别参数都相同的请求，在已有计算进行中时等待并共享同一次计算的结果
+COALESCE_REQUESTS = os.environ.get('OCR_COALESCE_REQUESTS', '1') == '1'
+# 这些结果受发起请求自身的截止时间、连接或当时的资源状况（内存预算、任务队列不可用）影响，
+# 不共享给仍有剩余时间的等待者（等待者自行重新计算）
+COALESCE_UNSHARED_STATUSES = (499, 503, 504)
+
+
+class RequestCoalescer:
+    """进行中请求的合并表：同一键的第一个请求执行计算，其余请求等待其结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = {}  # 键 -> {'done': Event, 'outcome': (响应体, 状态码), 'error': 异常, 'waiters': 等待数}
+        self.computed_total = 0
+        self.coalesced_total = 0
+
+    def run(self, key, compute, deadline=None):
+        """执行或等待 compute()，返回 (响应体, 状态码)；等待超过 deadline 时抛出DeadlineExceeded/RequestCancelled"""
+        while True:
+            with self._lock:
+                flight = self.in_flight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = {'done': threading.Event(), 'outcome': None, 'error': None, 'waiters': 0}
+                    self.in_flight[key] = flight
+                    self.computed_total += 1
+                else:
+                    flight['waiters'] += 1
+                    self.coalesced_total += 1
+
+            if leader:
+                try:
+                    flight['outcome'] = compute()
+                    return flight['outcome']
+                except Exception as e:
+                    flight['error'] = e
+                    raise
+                finally:
+                    with self._lock:
+                        del self.in_flight[key]
+                    flight['done'].set()
+
+            try:
+                while not flight['done'].wait(JOB_POLL_INTERVAL):
+                    if deadline is not None:
+                        deadline.check()
+            finally:
+                with self._lock:
+                    flight['waiters'] -= 1
+            if flight['error'] is not None:
+                raise flight['error']
+            body, status = flight['outcome']
+            if status in COALESCE_UNSHARED_STATUSES or body.get('partial'):
+                logger.info(f"合并的请求结果受截止时间限制(状态码{status})，重新计算")
+                continue
+            return dict(body), status
+
+    def get_status(self):
+        """合并状态：进行中的计算数、正在等待的请求数和累计合并数"""
+        with self._lock:
+            return {
+                'enabled': COALESCE_REQUESTS,
+                'in_flight': len(self.in_flight),
+                'waiters': sum(flight['waiters'] for flight in self.in_flight.values()),
+                'computed_total': self.computed_total,
+                'coalesced_total': self.coalesced_total,
+            }
+
+
+request_coalescer = RequestCoalescer()
+
+
+def coalesce_key(kind, file_path, params, priority=DEFAULT_PRIORITY):
+    """合并键：文件内容SHA256 + 影响结果的参数（文件扩展名决定按图像还是文档处理）+ 优先级类别。
+    等待者沿用发起请求的调度凭据，因此不同优先级类别的请求不合并，高优先级请求不会排在低优先级计算之后"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    options = {
+        'kind': kind,
+        'ext': os.path.splitext(params['filename'])[1].lower(),
+        'lang': params['lang'],
+        'profile': params['profile'],
+        'render_options': params['render_options'],
+        'priority': priority,
+    }
+    return digest.hexdigest() + ':' + json.dumps(options, sort_keys=True)
+
+
+def dispatch_ocr_job(kind, temp_file_path, params, ticket=None, deadline=None):
+    """执行识别任务，相同内容和参数的并发请求合并为一次计算"""
+    if not COALESCE_REQUESTS:
+        return execute_ocr_job(kind, temp_file_path, params, ticket, deadline)
+    key = coalesce_key(kind, temp_file_path, params, (ticket or ScheduleTicket()).priority)
+    try:
+        return request_coalescer.run(
+            key, lambda: execute_ocr_job(kind, temp_file_path, params, ticket, deadline), deadline)
+    except DeadlineExceeded as e:
+        return {
+            "message": "请求超过截止时间",
+            "error_type": "DEADLINE",
+            "error_details": str(e),
+            "suggestions": ["增大截止时间（timeout 参数或 X-OCR-Deadline 请求头）", "使用pages参数减少需要识别的页数"]
+        }, 504
+    except RequestCancelled as e:
+        return {"message": "客户端已断开，请求已放弃", "error_type": "CANCELLED", "error_details": str(e)}, 499
+
+# 完成回调（webhook）：请求带 callback_url 时立即返回202和任务ID，任务和输入文件先持久化到共享队列目录下的SQLite，
+# 识别在有界后台线程池中执行，结果写回数据库后按请求的输出格式POST到回调地址；投递失败时按指数退避重试，
+# 多次失败后改为发送结果引用（GET /ocr/jobs/<job_id>），结果在保留期内都可以取回。进程退出后，
+# 租约过期的任务由其它进程或重启后的本进程接手：未完成的重新识别，未投递的重新投递
+CALLBACK_WORKERS = int(os.environ.get('OCR_CALLBACK_WORKERS', str(sum(ENGINE_POOL_SIZES.values()))))
+CALLBACK_MAX_PENDING = int(os.environ.get('OCR_CALLBACK_MAX_PENDING', '100'))
+CALLBACK_DELIVERY_WORKERS = int(os.environ.get('OCR_CALLBACK_DELIVERY_WORKERS', '4'))
+CALLBACK_MAX_ATTEMPTS = int(os.environ.get('OCR_CALLBACK_MAX_ATTEMPTS', '10'))
+CALLBACK_RETRY_BASE = float(os.environ.get('OCR_CALLBACK_RETRY_BASE', '1'))
+CALLBACK_TIMEOUT = float(os.environ.get('OCR_CALLBACK_TIMEOUT', '10'))
+CALLBACK_SECRET = os.environ.get('OCR_CALLBACK_SECRET', '')
+CALLBACK_RETENTION_SECONDS = float(os.environ.get('OCR_CALLBACK_RETENTION', '86400'))
+# 结果引用中的服务地址，服务位于反向代理之后时设置为对外地址，未设置时使用请求的Host
+CALLBACK_PUBLIC_URL = os.environ.get('OCR_PUBLIC_URL', '').rstrip('/')
+CALLBACK_RETRY_MAX_DELAY = 300.0
+CALLBACK_LEASE_SECONDS = 60.0
+# 回调地址返回这些状态码（或5xx、连接失败）时重试，其余4xx视为回调方拒绝，不再重试
+CALLBACK_RETRY_STATUSES = (408, 429)
+
+
+def validate_callback_url(value):
+    """校验回调地址，只接受 http/https 绝对地址，格式错误时抛出ValueError"""
+    if value in (None, ''):
+        return None
+    parts = urlsplit(value)
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        raise ValueError(f"无效的回调地址: {value}")
+    return value
+
+
+def sign_callback(payload, headers):
+    """配置了 OCR_CALLBACK_SECRET 时为回调请求体添加HMAC-SHA256签名头"""
+    if CALLBACK_SECRET:
+        signature = hmac.new(CALLBACK_SECRET.encode('utf-8'), payload, hashlib.sha256).hexdigest()
+        headers['X-OCR-Signature'] = f'sha256={signature}'
+    return headers
+
+
+class CallbackStore:
+    """回调任务的持久化存储：与任务队列相同的SQLite WAL用法，输入文件保存在队列目录下（不受暂存目录清理影响）
+
+    status 为 queued/running/done；delivery 为 waiting（未完成）、pending（待投递）、delivered（已投递结果）、
+    referenced（结果投递失败，已投递结果引用）或 failed（引用也投递失败）。owner 和 lease_until 是处理进程的租约。
+    """
+
+    def __init__(self, queue_dir=JOB_QUEUE_DIR):
+        self.queue_dir = queue_dir
+        self.input_dir = os.path.join(queue_dir, 'callback_inputs')
+        self.db_path = os.path.join(queue_dir, 'callbacks.db')
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _ensure_schema(self):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            os.makedirs(self.input_dir, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS callbacks (
+                        id TEXT PRIMARY KEY,
+                        kind TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        result BLOB,
+                        headers TEXT,
+                        http_status INTEGER,
+                        delivery TEXT NOT NULL,
+                        owner TEXT,
+                        lease_until REAL NOT NULL,
+                        created_at REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    )""")
+                conn.execute('CREATE INDEX IF NOT EXISTS callbacks_lease ON callbacks (delivery, lease_until)')
+            finally:
+                conn.close()
+            self._schema_ready = True
+
+    @contextmanager
+    def _connect(self, immediate=False):
+        """打开连接；immediate=True 时在写事务中执行，退出时提交（异常时回滚）"""
+        self._ensure_schema()
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            if not immediate:
+                yield conn
+                return
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def input_path(self, name):
+        return os.path.join(self.input_dir, name)
+
+    def submit(self, job_id, kind, owner, payload, file_path=None):
+        """登记任务；有输入文件时移入存储目录，payload 中记录文件名"""
+        self._ensure_schema()
+        if file_path:
+            payload = dict(payload, input=job_id + os.path.splitext(file_path)[1])
+            shutil.move(file_path, self.input_path(payload['input']))
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO callbacks (id, kind, status, payload, delivery, owner, lease_until, created_at, updated_at) "
+                    "VALUES (?, ?, 'queued', ?, 'waiting', ?, ?, ?, ?)",
+                    (job_id, kind, json.dumps(payload, ensure_ascii=False), owner,
+                     now + CALLBACK_LEASE_SECONDS, now, now))
+        except Exception:
+            if file_path:
+                safe_remove_file(self.input_path(payload['input']))
+            raise
+        return {'id': job_id, 'kind': kind, 'status': 'queued', 'payload': payload}
+
+    def mark_running(self, job_id, owner):
+        with self._connect() as conn:
+            conn.execute("UPDATE callbacks SET status = 'running', updated_at = ? WHERE id = ? AND owner = ?",
+                         (time.time(), job_id, owner))
+
+    def complete(self, job_id, owner, result, headers, http_status):
+        """保存序列化后的结果并转为待投递，删除输入文件；任务已被其它进程接手时返回False"""
+        with self._connect(immediate=True) as conn:
+            row = conn.execute("SELECT payload FROM callbacks WHERE id = ? AND owner = ? AND status != 'done'",
+                               (job_id, owner)).fetchone()
+            if row is None:
+                return False
+            conn.execute(
+                "UPDATE callbacks SET status = 'done', result = ?, headers = ?, http_status = ?, "
+                "delivery = 'pending', updated_at = ? WHERE id = ?",
+                (sqlite3.Binary(result), json.dumps(headers), http_status, time.time(), job_id))
+        input_name = json.loads(row[0]).get('input')
+        if input_name:
+            safe_remove_file(self.input_path(input_name))
+        return True
+
+    def set_delivery(self, job_id, owner, delivery):
+        with self._connect() as conn:
+            conn.execute("UPDATE callbacks SET delivery = ?, updated_at = ? WHERE id = ? AND owner = ?",
+                         (delivery, time.time(), job_id, owner))
+
+    def get(self, job_id):
+        """返回任务字典（含结果字节、响应头、状态码和投递状态），不存在时返回None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT kind, status, payload, result, headers, http_status, delivery FROM callbacks WHERE id = ?",
+                (job_id,)).fetchone()
+        if row is None:
+            return None
+        kind, status, payload, result, headers, http_status, delivery = row
+        return {
+            'id': job_id, 'kind': kind, 'status': status, 'payload': json.loads(payload),
+            'result': bytes(result) if result is not None else None,
+            'headers': json.loads(headers) if headers else None,
+            'http_status': http_status, 'delivery': delivery,
+        }
+
+    def extend(self, owner):
+        """续期本进程持有的未完成或待投递任务的租约"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE callbacks SET lease_until = ? WHERE owner = ? AND delivery IN ('waiting', 'pending')",
+                (now + CALLBACK_LEASE_SECONDS, owner))
+
+    def reclaim(self, owner):
+        """接手租约已过期（原处理进程已退出）的未完成或待投递任务，返回任务ID列表"""
+        now = time.time()
+        with self._connect(immediate=True) as conn:
+            job_ids = [row[0] for row in conn.execute(
+                "SELECT id FROM callbacks WHERE delivery IN ('waiting', 'pending') AND lease_until < ? "
+                "ORDER BY created_at", (now,)).fetchall()]
+            for job_id in job_ids:
+                conn.execute("UPDATE callbacks SET owner = ?, lease_until = ?, updated_at = ? WHERE id = ?",
+                             (owner, now + CALLBACK_LEASE_SECONDS, now, job_id))
+        return job_ids
+
+    def purge(self, max_age=CALLBACK_RETENTION_SECONDS):
+        """删除超过保留期的已投递（或已放弃投递）任务，返回删除数量"""
+        with self._connect() as conn:
+            return conn.execute(
+                "DELETE FROM callbacks WHERE delivery IN ('delivered', 'referenced', 'failed') AND updated_at < ?",
+                (time.time() - max_age,)).rowcount
+
+    def get_status(self):
+        """获取各投递状态的任务数"""
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT delivery, COUNT(*) FROM callbacks GROUP BY delivery").fetchall())
+        return {'path': self.db_path, 'jobs': counts}
+
+
+class WebhookDispatcher:
+    """回调投递：共享连接池的HTTP会话，固定数量的投递线程，失败时由定时器按指数退避重新排队"""
+
+    def __init__(self, workers=CALLBACK_DELIVERY_WORKERS):
+        self.workers = workers
+        self.session = None
+        self.executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.delivered_total = 0
+        self.failed_total = 0
+        self.retries_total = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self.executor is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.session = session
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='webhook')
+
+    def deliver(self, callback_url, payload, headers, on_finish=None):
+        """排队投递一次回调，投递成功或放弃后以 on_finish(是否成功) 通知"""
+        self._ensure_started()
+        with self._lock:
+            self.pending += 1
+        self.executor.submit(self._attempt, callback_url, payload, headers, on_finish, 1)
+
+    def _attempt(self, callback_url, payload, headers, on_finish, attempt):
+        job_id = headers.get('X-OCR-Job-Id')
+        try:
+            with self.session.post(callback_url, data=payload, headers=headers, timeout=CALLBACK_TIMEOUT) as response:
+                status = response.status_code
+            if status < 300:
+                with self._lock:
+                    self.pending -= 1
+                    self.delivered_total += 1
+                logger.info(f"回调投递成功: 任务 {job_id} -> {callback_url} (第{attempt}次)")
+                self._finish(on_finish, True)
+                return
+            retryable = status >= 500 or status in CALLBACK_RETRY_STATUSES
+            error = f"状态码 {status}"
+        except requests.RequestException as e:
+            retryable = True
+            error = str(e)
+
+        if retryable and attempt < CALLBACK_MAX_ATTEMPTS:
+            delay = min(CALLBACK_RETRY_MAX_DELAY, CALLBACK_RETRY_BASE * 2 ** (attempt - 1))
+            with self._lock:
+                self.retries_total += 1
+            logger.warning(f"回调投递失败: 任务 {job_id} -> {callback_url} ({error})，{delay:.1f}秒后第{attempt + 1}次重试")
+            timer = threading.Timer(delay, self.executor.submit,
+                                    args=(self._attempt, callback_url, payload, headers, on_finish, attempt + 1))
+            timer.daemon = True
+            timer.start()
+            return
+
+        with self._lock:
+            self.pending -= 1
+            self.failed_total += 1
+        logger.error(f"回调投递放弃: 任务 {job_id} -> {callback_url} ({error}，共尝试{attempt}次)")
+        self._finish(on_finish, False)
+
+    @staticmethod
+    def _finish(on_finish, delivered):
+        if on_finish is None:
+            return
+        try:
+            on_finish(delivered)
+        except Exception as e:
+            logger.error(f"记录回调投递状态失败: {e}")
+
+    def get_status(self):
+        """投递状态：待投递（含等待重试）数和累计成功、失败、重试次数"""
+        with self._lock:
+            return {
+                'pending': self.pending,
+                'delivered_total': self.delivered_total,
+                'failed_total': self.failed_total,
+                'retries_total': self.retries_total,
+            }
+
+
+class CallbackJobRunner:
+    """后台执行带回调地址的识别任务：有界线程池，进行中和排队的任务数超过上限时拒绝新任务；
+    维护线程续期本进程任务的租约、接手已退出进程留下的任务并清理过期结果"""
+
+    def __init__(self, workers=CALLBACK_WORKERS, max_pending=CALLBACK_MAX_PENDING, dispatcher=None, store=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.dispatcher = dispatcher or WebhookDispatcher()
+        self.store = store or CallbackStore()
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.executor = None
+        self._lock = threading.Lock()
+        self._maintenance = None
+        self.active = 0
+        self.accepted_total = 0
+        self.rejected_total = 0
+        self.recovered_total = 0
+
+    def start(self):
+        """启动维护线程（重复调用无副作用）"""
+        with self._lock:
+            if self._maintenance is not None:
+                return
+            self._maintenance = threading.Thread(target=self._maintain, daemon=True, name='callback-maintenance')
+        self._maintenance.start()
+
+    def _ensure_executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='callback-ocr')
+
+    def submit(self, kind, callback_url, output_options, params, ticket=None, deadline=None,
+               base_url='', owned_path=None):
+        """登记任务（接管 owned_path 暂存文件）并在后台执行，完成后回调；返回立即响应的 (响应体, 状态码)"""
+        with self._lock:
+            if self.active >= self.max_pending:
+                self.rejected_total += 1
+                accepted = False
+            else:
+                self._ensure_executor()
+                self.active += 1
+                self.accepted_total += 1
+                accepted = True
+        if not accepted:
+            if owned_path:
+                safe_remove_file(owned_path)
+            return {
+                "message": "回调任务过多，请稍后重试",
+                "error_type": "SYSTEM_ERROR",
+                "error_details": f"后台回调任务数已达上限({self.max_pending})",
+                "suggestions": ["稍后重试", "不带callback_url同步识别"]
+            }, 503
+
+        ticket = ticket or ScheduleTicket()
+        job_id = uuid.uuid4().hex
+        remaining = deadline.remaining() if deadline is not None else None
+        payload = {
+            'params': params,
+            'callback_url': callback_url,
+            'output_options': output_options,
+            'result_url': f"{CALLBACK_PUBLIC_URL or base_url.rstrip('/')}/ocr/jobs/{job_id}",
+            'priority': ticket.priority,
+            'client_id': ticket.client_id,
+            'expires_at': time.time() + remaining if remaining is not None else None,
+        }
+        try:
+            job = self.store.submit(job_id, kind, self.owner, payload, owned_path)
+        except Exception as e:
+            with self._lock:
+                self.active -= 1
+            if owned_path:
+                safe_remove_file(owned_path)
+            logger.error(f"登记回调任务失败: {e}")
+            return {
+                "message": "回调任务存储不可用",
+                "error_type": "SYSTEM_ERROR",
+                "error_details": f"登记回调任务失败: {str(e)}",
+                "suggestions": ["稍后重试", "检查任务队列目录(OCR_QUEUE_DIR)是否可写"]
+            }, 503
+
+        self.start()
+        self.executor.submit(self._run, job)
+        logger.info(f"接受回调任务: {job_id} -> {callback_url}")
+        return {"message": "已接受，识别完成后将结果发送到回调地址", "job_id": job_id}, 202
+
+    def _execute(self, job):
+        payload = job['payload']
+        params = payload['params']
+        ticket = ScheduleTicket(payload['priority'], payload['client_id'])
+        deadline = None
+        if payload.get('expires_at') is not None:
+            # 截止时间已过时保留一个极小的剩余时间，由识别流程按超时返回504
+            deadline = RequestDeadline(max(0.001, payload['expires_at'] - time.time()))
+        if job['kind'] == 'url':
+            return run_url_callback_job(params['url'], params['filename'], params, ticket, deadline)
+        # process_file_ocr 会删除输入文件，使用副本处理，进程中途退出时存储中的输入仍在
+        input_path = self.store.input_path(payload['input'])
+        work_path = new_spool_path(os.path.splitext(input_path)[1])
+        try:
+            link_or_copy_file(input_path, work_path)
+            return dispatch_ocr_job('file', work_path, params, ticket, deadline)
+        finally:
+            safe_remove_file(work_path)
+
+    def _run(self, job):
+        job_id = job['id']
+        payload = job['payload']
+        try:
+            self.store.mark_running(job_id, self.owner)
+            try:
+                body, status = self._execute(job)
+            except Exception as e:
+                logger.error(f"回调任务 {job_id} 执行失败: {e}")
+                body, status = {
+                    "message": "服务器内部错误",
+                    "error_type": "SYSTEM_ERROR",
+                    "error_details": f"未预期的系统错误: {str(e)}"
+                }, 500
+            body = dict(body, job_id=job_id)
+            result, headers = serialize_ocr_response(body, status, payload['output_options'])
+            headers.pop('Vary', None)
+            headers['X-OCR-Job-Id'] = job_id
+            headers['X-OCR-Status'] = str(status)
+            if not self.store.complete(job_id, self.owner, result, headers, status):
+                logger.warning(f"回调任务已被其它进程接手，丢弃本次结果: {job_id}")
+                return
+            self._deliver(job_id, payload, result, headers, status)
+        except Exception as e:
+            logger.error(f"回调任务 {job_id} 保存结果失败: {e}")
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def _deliver(self, job_id, payload, result, headers, status):
+        self.dispatcher.deliver(payload['callback_url'], result, sign_callback(result, dict(headers)),
+                                partial(self._on_result_delivered, job_id, payload, status))
+
+    def _on_result_delivered(self, job_id, payload, status, delivered):
+        if delivered:
+            self.store.set_delivery(job_id, self.owner, 'delivered')
+            return
+        # 结果多次投递失败：改为发送体积很小的结果引用，回调方凭 result_url 取回结果
+        reference = json.dumps({'job_id': job_id, 'status': status, 'result_url': payload['result_url']}).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'X-OCR-Job-Id': job_id, 'X-OCR-Status': str(status),
+                   'X-OCR-Result-Url': payload['result_url']}
+        logger.warning(f"回调任务 {job_id} 的结果投递失败，改为发送结果引用: {payload['result_url']}")
+        self.dispatcher.deliver(
+            payload['callback_url'], reference, sign_callback(reference, headers),
+            lambda referenced: self.store.set_delivery(job_id, self.owner, 'referenced' if referenced else 'failed'))
+
+    def _resume(self, job_id):
+        """继续处理接手的任务：已有结果的重新投递，未完成的重新识别"""
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        with self._lock:
+            self.recovered_total += 1
+        if job['status'] == 'done':
+            logger.info(f"接手待投递的回调任务: {job_id}")
+            self._deliver(job_id, job['payload'], job['result'], job['headers'], job['http_status'])
+            return
+        logger.info(f"接手未完成的回调任务，重新识别: {job_id}")
+        with self._lock:
+            self._ensure_executor()
+            self.active += 1
+        self.executor.submit(self._run, job)
+
+    def _maintain(self):
+        while True:
+            try:
+                self.store.extend(self.owner)
+                for job_id in self.store.reclaim(self.owner):
+                    self._resume(job_id)
+                purged = self.store.purge()
+                if purged:
+                    logger.info(f"已清理 {purged} 个过期回调任务")
+            except Exception as e:
+                logger.warning(f"回调任务维护失败: {e}")
+            time.sleep(CALLBACK_LEASE_SECONDS / 3)
+
+    def get_status(self):
+        """回调任务状态：进行中和排队的任务数、累计接受/拒绝/接手数、投递状态和存储中各状态的任务数"""
+        with self._lock:
+            status = {
+                'active': self.active,
+                'max_pending': self.max_pending,
+                'accepted_total': self.accepted_total,
+                'rejected_total': self.rejected_total,
+                'recovered_total': self.recovered_total,
+            }
+        status['delivery'] = self.dispatcher.get_status()
+        try:
+            status['store'] = self.store.get_status()
+        except Exception as e:
+            status['store'] = {'error': str(e)}
+        return status
+
+
+callback_jobs = CallbackJobRunner()
+
+
+def run_url_callback_job(url, file_name, params, ticket, deadline):
+    """回调模式的URL识别：在后台下载并识别，下载失败返回与同步接口相同的错误响应"""
+    temp_file_path = new_spool_path(os.path.splitext(file_name)[1].lower())
+    try:
+        download_remote_file(url, temp_file_path, params['render_options']['pages'])
+        logger.info(f"从URL下载文件: {url} (语言: {params['lang']})")
+        return dispatch_ocr_job('url', temp_file_path, params, ticket, deadline)
+    except Exception as e:
+        log_ocr_performance(params['lang'], 0, False, 0)
+        logger.error(f'[PaddleOCR URL]错误: {e}')
+        return {'message': f'识别失败: {str(e)}'}, 500
+    finally:
+        safe_remove_file(temp_file_path)
+
+
+@ocr_ns.route('/jobs/<string:job_id>')
+class OCRJobResult(Resource):
+    @api.response(200, '回调任务的识别结果（与回调请求体相同的格式和状态码）', ocr_model)
+    @api.response(202, '任务仍在处理中', ocr_model)
+    @api.response(404, '任务不存在或结果已过保留期', ocr_model)
+    def get(self, job_id):
+        """
+        取回回调任务的结果
+        回调投递失败时，回调方收到结果引用后可通过此接口取回结果
+        """
+        try:
+            job = callback_jobs.store.get(job_id)
+        except Exception as e:
+            logger.error(f"读取回调任务失败: {e}")
+            return make_ocr_http_response({"message": "回调任务存储不可用", "error_type": "SYSTEM_ERROR",
+                                           "error_details": str(e)}, 503)
+        if job is None:
+            return make_ocr_http_response({
+                "message": "任务不存在或结果已过期",
+                "error_type": "NOT_FOUND",
+                "error_details": f"任务 {job_id} 不存在，或已超过保留期({CALLBACK_RETENTION_SECONDS:g}秒)被清理"
+            }, 404)
+        if job['status'] != 'done':
+            return make_ocr_http_response({"message": "处理中", "job_id": job_id}, 202)
+        headers = dict(job['headers'], **{'X-OCR-Callback-Delivery': job['delivery']})
+        return app.response_class(job['result'], status=job['http_status'], headers=headers)
+
+
+def process_queued_job(job, worker_id):
+    """执行领取到的任务并写回结果；处理期间心跳线程续期可见性超时，发现任务被取消时在页间放弃"""
+    payload = job['payload']
+    input_path = job_queue.input_path(payload['input'])
+    # process_file_ocr 会删除输入文件，使用副本处理，重试时队列中的输入仍在
+    work_path = new_spool_path(os.path.splitext(input_path)[1])
+    cancelled = threading.Event()
+    stop_heartbeat = threading.Event()
+
+    def heartbeat():
+        while not stop_heartbeat.wait(JOB_VISIBILITY_TIMEOUT / 3):
+            try:
+                if not job_queue.extend(job['id'], worker_id):
+                    cancelled.set()
+                    return
+            except Exception as e:
+                logger.warning(f"任务续期失败 {job['id']}: {e}")
+
+    threading.Thread(target=heartbeat, daemon=True, name=f"job-heartbeat-{job['id'][:8]}").start()
+    retryable = False
+    try:
+        link_or_copy_file(input_path, work_path)
+        ticket = ScheduleTicket(payload['priority'], payload['client_id'])
+        expires_at = payload.get('expires_at')
+        timeout = max(expires_at - time.time(), 0.001) if expires_at else None
+        deadline = RequestDeadline(timeout, is_cancelled=cancelled.is_set)
+        body, status = run_ocr_job(job['kind'], work_path, payload['params'], ticket, deadline)
+        retryable = status in JOB_RETRY_STATUSES
+    except Exception as e:
+        logger.error(f"任务处理异常 {job['id']}: {e}")
+        logger.error(f"完整错误堆栈: {traceback.format_exc()}")
+        body, status = {
+            "message": "服务器内部错误",
+            "error_type": "SYSTEM_ERROR",
+            "error_details": f"工作进程处理任务出错: {str(e)}",
+            "suggestions": ["请稍后重试", "检查工作进程日志获取更多信息"]
+        }, 500
+        retryable = True
+    finally:
+        stop_heartbeat.set()
+        safe_remove_file(work_path)
+
+    if retryable and job['attempts'] < JOB_MAX_ATTEMPTS and not cancelled.is_set():
+        delay = min(2 ** job['attempts'], 30)
+        logger.warning(f"任务{job['id']}第{job['attempts']}次处理失败(状态码{status})，{delay}秒后重试")
+        job_queue.retry(job['id'], worker_id, delay)
+        return
+    if not job_queue.complete(job['id'], worker_id, body, status):
+        logger.warning(f"任务已取消或已被其它工作进程接手，丢弃结果: {job['id']}")
+    safe_remove_file(input_path)
+
+
+def run_queue_worker(worker_id, stop_event):
+    """工作线程：循环领取任务并执行，空闲时清理过期任务"""
+    next_purge = 0
+    while not stop_event.is_set():
+        try:
+            job = job_queue.claim(worker_id)
+        except Exception as e:
+            logger.error(f"领取任务失败: {e}")
+            stop_event.wait(JOB_POLL_INTERVAL * 10)
+            continue
+        if job is not None:
+            process_queued_job(job, worker_id)
+            continue
+        if time.monotonic() >= next_purge:
+            next_purge = time.monotonic() + 60
+            try:
+                job_queue.purge()
+            except Exception as e:
+                logger.warning(f"清理过期任务失败: {e}")
+        stop_event.wait(JOB_POLL_INTERVAL)
+
+
 @ocr_ns.route('/debug')
 class OCRDebug(Resource):
     @api.expect(file_parser)
@@ -1007,14 +4938,14 @@ class OCRDebug(Resource):
             args = file_parser.parse_args()
             uploaded_file = args['file']
             lang = args.get('lang', 'ch')
+            profile = args.get('profile') or DEFAULT_PROFILE
 
             if not uploaded_file or not uploaded_file.filename:
                 return {"error": "未提供有效文件"}, 400
 
             original_filename = uploaded_file.filename
             file_ext = os.path.splitext(original_filename)[1].lower()
-            temp_file_path = tempfile.mktemp(suffix=file_ext)
-            uploaded_file.save(temp_file_path)
+            temp_file_path = spool_uploaded_file(uploaded_file, file_ext)
 
             debug_info = {
                 "file_info": {
@@ -1070,13 +5001,14 @@ class OCRDebug(Resource):
             # 3. OCR识别测试
             if ocr_engine_pool and debug_info["image_validation"].get("is_valid", False):
                 try:
-                    engine = ocr_engine_pool.get_engine(lang)
-                    
                     # 记录引擎调用前状态
-                    logger.info(f"[调试模式] 开始调用{lang}引擎")
-                    
-                    # 调用OCR引擎
-                    ocr_output = engine.predict(temp_file_path)
+                    logger.info(f"[调试模式] 开始调用{lang}引擎（配置: {profile}）")
+
+                    # 经调度器借用引擎租约调用OCR引擎，识别出错时引擎同样归还到池中
+                    auto_state = {}
+                    ticket = make_schedule_ticket(request.headers, request.remote_addr)
+                    with engine_scheduler.checkout(lang, profile, ticket) as engine:
+                        ocr_output = predict_image(engine, temp_file_path, lang, profile, auto_state)
                     
                     # 详细记录输出
                     debug_info["ocr_result"] = {
@@ -1085,6 +5017,8 @@ class OCRDebug(Resource):
                         "raw_output_length": len(ocr_output) if ocr_output else 0,
                         "raw_output_sample": str(ocr_output[:1]) if ocr_output else "空结果"
                     }
+                    if lang == AUTO_LANG:
+                        debug_info["ocr_result"]["detected_lang"] = auto_state.get('lang')
                     
                     if ocr_output:
                         # 尝试处理结果
@@ -1104,10 +5038,7 @@ class OCRDebug(Resource):
                             debug_info["ocr_result"]["conversion_error"] = str(convert_error)
                     else:
                         debug_info["ocr_result"]["issue"] = "PaddleOCR返回空结果"
-                    
-                    # 归还引擎
-                    ocr_engine_pool.return_engine(lang, engine)
-                    
+
                 except Exception as ocr_error:
                     debug_info["ocr_result"] = {
                         "engine_called": False,
@@ -1146,6 +5077,36 @@ class OCRHealth(Resource):
             }, 500
 
 
+@ocr_ns.route('/live')
+class OCRLiveness(Resource):
+    def get(self):
+        """
+        存活检查 - 服务进程可响应请求即返回200
+        """
+        return {"status": "alive"}, 200
+
+
+@ocr_ns.route('/ready')
+class OCRReadiness(Resource):
+    def get(self):
+        """
+        就绪检查 - 每种语言的已预热引擎数达到 OCR_READY_MIN_ENGINES 后返回200，否则返回503；
+        任务队列模式下共享任务队列可访问即就绪
+        """
+        if USE_JOB_QUEUE:
+            try:
+                return {"status": "ready", "mode": "job_queue", "job_queue": job_queue.get_status()}, 200
+            except Exception as e:
+                return {"status": "not_ready", "message": f"任务队列不可用: {str(e)}"}, 503
+
+        if not ocr_engine_pool:
+            return {"status": "not_ready", "message": "引擎池未初始化"}, 503
+
+        readiness = ocr_engine_pool.get_readiness()
+        status_code = 200 if readiness['ready'] else 503
+        return {"status": "ready" if readiness['ready'] else "not_ready", **readiness}, status_code
+
+
 @ocr_ns.route('/models')
 class OCRModels(Resource):
     def get(self):
@@ -1159,11 +5120,16 @@ class OCRModels(Resource):
                     "en": "英文",
                     "japan": "日文",
                     "korean": "韩文",
-                    "server": "中文高精度（PP-OCRv5 Server模型）"
+                    "server": "中文高精度（PP-OCRv5 Server模型）",
+                    "auto": "自动判断文字系统（一次检测 + 抽样判断语言 + 一次识别）"
                 },
                 "supported_formats": [
                     "jpg", "jpeg", "png", "bmp", "tiff", "tif", "pdf"
                 ],
+                "profiles": {
+                    name: info['description'] for name, info in OCR_PROFILES.items()
+                },
+                "default_profile": DEFAULT_PROFILE,
                 "model_versions": {
                     "default": "PP-OCRv5",
                     "server": "PP-OCRv5 Server (高精度版本)"
@@ -1173,7 +5139,8 @@ class OCRModels(Resource):
                     "PDF文档识别",
                     "线程安全",
                     "引擎池管理",
-                    "高精度识别"
+                    "高精度识别",
+                    "按请求选择流水线配置"
                 ]
             }
             return models_info, 200
@@ -1182,10 +5149,567 @@ class OCRModels(Resource):
             return {"error": f"获取模型信息失败: {str(e)}"}, 500
 
 
-if __name__ == '__main__':
+# 异步前端（serve --asyncio）：上传、下载和慢客户端的网络/磁盘I/O在事件循环中完成，只有解码和推理占用有界OCR线程池
+ASYNC_OCR_WORKERS = int(os.environ.get('OCR_ASYNC_WORKERS', str(sum(ENGINE_POOL_SIZES.values()))))
+ASYNC_DOWNLOAD_TIMEOUT = int(os.environ.get('OCR_ASYNC_DOWNLOAD_TIMEOUT', '300'))
+ASYNC_IO_CHUNK_SIZE = 256 * 1024
+
+
+def parse_async_form_args(values):
+    """按 file_parser/url_parser 的规则校验异步前端的表单/查询参数，返回(语言, 配置, 页面渲染选项)，格式错误时抛出ValueError"""
+    lang = values.get('lang') or 'ch'
+    if lang not in SUPPORTED_LANGS + [AUTO_LANG]:
+        raise ValueError(f"不支持的语言: {lang}")
+    profile = values.get('profile') or DEFAULT_PROFILE
+    if profile not in OCR_PROFILES:
+        raise ValueError(f"未知的流水线配置: {profile}")
+    dpi_mode = values.get('dpi_mode') or None
+    if dpi_mode is not None and dpi_mode not in PDF_DPI_MODES:
+        raise ValueError(f"未知的DPI策略: {dpi_mode}")
+
+    args = {'pages': values.get('pages') or None, 'dpi_mode': dpi_mode}
+    for key in ('dpi', 'max_pixels'):
+        raw_value = values.get(key)
+        try:
+            args[key] = int(raw_value) if raw_value not in (None, '') else None
+        except (TypeError, ValueError):
+            raise ValueError(f"参数{key}必须为整数: {raw_value}")
+    return lang, profile, get_page_render_options(args)
+
+
+class AsyncOCRFrontend:
+    """asyncio前端：异步处理 /ocr/file 和 /ocr/url 的I/O，其余路径转交Flask应用，接口与Flask服务一致"""
+
+    def __init__(self, workers=ASYNC_OCR_WORKERS):
+        self.ocr_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ocr-worker')
+        self.http_session = None
+
+    def build_app(self):
+        """构建aiohttp应用"""
+        web_app = web.Application(client_max_size=app.config['MAX_CONTENT_LENGTH'])
+        web_app.router.add_post('/ocr/file', self.handle_file)
+        web_app.router.add_post('/ocr/url', self.handle_url)
+        web_app.router.add_route('*', '/{tail:.*}', self.handle_wsgi)
+        web_app.on_startup.append(self.on_startup)
+        web_app.on_cleanup.append(self.on_cleanup)
+        return web_app
+
+    async def on_startup(self, web_app):
+        self.http_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=ASYNC_DOWNLOAD_TIMEOUT))
+
+    async def on_cleanup(self, web_app):
+        await self.http_session.close()
+        self.ocr_executor.shutdown(wait=False)
+
+    async def run_io(self, func, *args):
+        """短时阻塞的磁盘操作交给事件循环的默认线程池"""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def run_ocr(self, func, *args):
+        """解码和推理交给有界OCR线程池"""
+        return await asyncio.get_running_loop().run_in_executor(self.ocr_executor, func, *args)
+
+    @staticmethod
+    def client_gone(request):
+        """返回检查客户端是否已断开的函数，供推理线程在页间调用"""
+        def is_cancelled():
+            transport = request.transport
+            return transport is None or transport.is_closing()
+        return is_cancelled
+
+    @staticmethod
+    def ocr_response(request, output_options, body, status):
+        """按请求的输出格式序列化响应，与Flask接口输出一致"""
+        payload, headers = serialize_ocr_response(body, status, output_options,
+                                                  request.headers.get('Accept-Encoding', ''))
+        return web.Response(body=payload, status=status, headers=headers)
+
+    async def receive_multipart(self, request):
+        """逐块读取multipart请求：文件字段流式写入暂存目录，其余字段作为表单参数，返回(参数, 文件名, 暂存路径)"""
+        values = {}
+        filename = None
+        temp_file_path = None
+        received = 0
+        size_limit = app.config['MAX_CONTENT_LENGTH']
+        reader = await request.multipart()
+        try:
+            while True:
+                part = await reader.next()
+                if part is None:
+                    break
+                if part.name != 'file':
+                    values[part.name] = await part.text()
+                    continue
+
+                filename = part.filename
+                file_ext = os.path.splitext(filename or '')[1].lower()
+                if temp_file_path or file_ext not in SUPPORTED_FILE_FORMATS:
+                    # 不支持的格式不落盘，由调用方返回格式错误
+                    await part.release()
+                    continue
+
+                temp_file_path = new_spool_path(file_ext)
+                spool_file = await self.run_io(open, temp_file_path, 'wb')
+                try:
+                    while True:
+                        chunk = await part.read_chunk(ASYNC_IO_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        received += len(chunk)
+                        if received > size_limit:
+                            raise ValueError(f"上传文件超过大小限制({size_limit}字节)")
+                        await self.run_io(spool_file.write, chunk)
+                finally:
+                    await self.run_io(spool_file.close)
+        except Exception:
+            if temp_file_path:
+                await self.run_io(safe_remove_file, temp_file_path)
+            raise
+        return values, filename, temp_file_path
+
+    async def download_to_spool(self, url, file_path):
+        """异步下载URL内容到暂存文件"""
+        async with self.http_session.get(url) as response:
+            response.raise_for_status()
+            spool_file = await self.run_io(open, file_path, 'wb')
+            try:
+                async for chunk in response.content.iter_chunked(ASYNC_IO_CHUNK_SIZE):
+                    await self.run_io(spool_file.write, chunk)
+            finally:
+                await self.run_io(spool_file.close)
+
+    async def handle_file(self, request):
+        """与 /ocr/file 相同：流式接收上传文件，在OCR线程池中识别"""
+        temp_file_path = None
+        output_options = {}
+        try:
+            try:
+                values, original_filename, temp_file_path = await self.receive_multipart(request)
+                lang, profile, render_options = parse_async_form_args(values)
+                output_options.update(get_output_options(values))
+                callback_url = validate_callback_url(values.get('callback_url'))
+                # 回调模式下客户端收到202后即断开，不据此取消识别
+                deadline = make_request_deadline(request.headers, values.get('timeout'),
+                                                 is_cancelled=None if callback_url else self.client_gone(request))
+            except Exception as parse_error:
+                logger.error(f"HTTP请求解析失败: {parse_error}")
+                return self.ocr_response(request, output_options, {
+                    "message": "请求格式错误",
+                    "error_type": "HTTP_PARSE",
+                    "error_details": f"无法解析上传请求: {str(parse_error)}",
+                    "suggestions": [
+                        "确认使用multipart/form-data格式上传文件",
+                        "检查文件字段名是否为'file'",
+                        "检查页码范围(pages)和DPI参数格式"
+                    ]
+                }, 400)
+
+            if not original_filename:
+                return self.ocr_response(request, output_options, {
+                    "message": "未提供有效文件",
+                    "error_type": "HTTP_PARSE",
+                    "error_details": "文件字段为空或文件名缺失",
+                    "suggestions": ["确认已选择文件进行上传", "检查文件字段名是否正确"]
+                }, 400)
+
+            file_ext = os.path.splitext(original_filename)[1].lower()
+            if file_ext not in SUPPORTED_FILE_FORMATS:
+                return self.ocr_response(request, output_options, {
+                    "message": f"不支持的文件格式: {file_ext}",
+                    "error_type": "FILE_PROCESS",
+                    "error_details": f"文件格式 {file_ext} 不在支持列表中",
+                    "suggestions": [f"支持的格式: {', '.join(SUPPORTED_FILE_FORMATS)}", "请转换文件格式后重试"]
+                }, 400)
+
+            logger.info(f"开始OCR处理: {original_filename} ({file_ext}, 语言: {lang}, 配置: {profile})")
+            ticket = make_schedule_ticket(request.headers, request.remote)
+            params = {'filename': original_filename, 'lang': lang, 'profile': profile, 'render_options': render_options}
+            if callback_url:
+                owned_path, temp_file_path = temp_file_path, None
+                body, status = callback_jobs.submit('file', callback_url, output_options, params, ticket, deadline,
+                                                    str(request.url.origin()), owned_path)
+                return self.ocr_response(request, output_options, body, status)
+            body, status = await self.run_ocr(dispatch_ocr_job, 'file', temp_file_path, params, ticket, deadline)
+            return self.ocr_response(request, output_options, body, status)
+
+        except Exception as unexpected_error:
+            logger.error(f'[OCR文件]未预期错误: {unexpected_error}')
+            logger.error(f'完整错误堆栈: {traceback.format_exc()}')
+            return self.ocr_response(request, output_options, {
+                "message": "服务器内部错误",
+                "error_type": "SYSTEM_ERROR",
+                "error_details": f"未预期的系统错误: {str(unexpected_error)}",
+                "suggestions": ["请稍后重试", "检查服务器日志获取更多信息"]
+            }, 500)
+        finally:
+            if temp_file_path:
+                await self.run_io(safe_remove_file, temp_file_path)
+
+    async def handle_url(self, request):
+        """与 /ocr/url 相同：异步下载到暂存目录，在OCR线程池中识别"""
+        temp_file_path = None
+        output_options = {}
+        lang = 'ch'
+        try:
+            values = dict(request.query)
+            if request.content_type == 'application/json':
+                values.update(await request.json())
+            elif request.body_exists:
+                values.update(await request.post())
+
+            url = values.get('url')
+            try:
+                if not url:
+                    raise ValueError("缺少url参数")
+                lang, profile, render_options = parse_async_form_args(values)
+                output_options.update(get_output_options(values))
+                callback_url = validate_callback_url(values.get('callback_url'))
+                deadline = make_request_deadline(request.headers, values.get('timeout'),
+                                                 is_cancelled=None if callback_url else self.client_gone(request))
+            except ValueError as option_error:
+                return self.ocr_response(request, output_options, {'message': f'参数错误: {option_error}'}, 400)
+
+            file_name = extract_filename_from_url(url)
+            if callback_url:
+                ticket = make_schedule_ticket(request.headers, request.remote)
+                params = {'filename': file_name, 'url': url, 'lang': lang, 'profile': profile, 'render_options': render_options}
+                body, status = callback_jobs.submit('url', callback_url, output_options, params, ticket, deadline,
+                                                    str(request.url.origin()))
+                return self.ocr_response(request, output_options, body, status)
+            temp_file_path = new_spool_path(os.path.splitext(file_name)[1].lower())
+            if uses_range_read(temp_file_path, render_options['pages']):
+                await self.run_io(download_remote_file, url, temp_file_path, render_options['pages'])
+            else:
+                await self.download_to_spool(url, temp_file_path)
+            logger.info(f"从URL下载文件: {url} (语言: {lang})")
+
+            ticket = make_schedule_ticket(request.headers, request.remote)
+            params = {'filename': file_name, 'url': url, 'lang': lang, 'profile': profile, 'render_options': render_options}
+            body, status = await self.run_ocr(dispatch_ocr_job, 'url', temp_file_path, params, ticket, deadline)
+            return self.ocr_response(request, output_options, body, status)
+
+        except Exception as e:
+            log_ocr_performance(lang, 0, False, 0)
+            logger.error(f'[PaddleOCR URL]错误: {e}')
+            return self.ocr_response(request, output_options, {'message': f'识别失败: {str(e)}'}, 500)
+        finally:
+            if temp_file_path:
+                await self.run_io(safe_remove_file, temp_file_path)
+
+    async def handle_wsgi(self, request):
+        """其余路径（健康检查、模型信息、调试接口、Swagger文档）转交Flask应用处理"""
+        body = await request.read()
+        headers = [(key, value) for key, value in request.headers.items() if key.lower() != 'content-length']
+        environ = EnvironBuilder(path=request.path, base_url=f"{request.scheme}://{request.host}",
+                                 query_string=request.query_string, method=request.method,
+                                 headers=headers, data=body).get_environ()
+        # 调试接口会运行推理，与识别请求共用有界OCR线程池；其余接口不排在推理之后
+        run = self.run_ocr if request.path.rstrip('/') == '/ocr/debug' else self.run_io
+        app_iter, status, response_headers = await run(run_wsgi_app, app, environ, True)
+        response_body = b''.join(app_iter)
+        return web.Response(body=response_body, status=int(status.split(' ', 1)[0]),
+                            headers=[(key, value) for key, value in response_headers.items()
+                                     if key.lower() != 'content-length'])
+
+
+# 被WSGI服务器作为模块导入时在模块加载完成后初始化（后台初始化线程依赖本模块中的全部定义）；
+# 直接运行时由命令行入口按子命令初始化；任务队列模式下前端不加载模型，但同样启动回调任务的维护线程
+if __name__ != '__main__' and INIT_ON_IMPORT and not USE_JOB_QUEUE:
+    init_engine_pool()
+if __name__ != '__main__' and INIT_ON_IMPORT:
+    callback_jobs.start()
+
+
+# 离线批处理（python app.py bulk）：遍历目录或压缩包，在多个工作进程中调用 process_file_ocr，结果逐行追加写入JSONL。
+# 输出文件同时是检查点：重新运行相同命令时跳过已有记录的文件
+BULK_ARCHIVE_EXTS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+BULK_PROGRESS_INTERVAL = 2.0
+
+
+def iter_bulk_sources(source):
+    """列出待处理文件，返回 [(记录键, 文件路径或压缩包成员名)]；记录键为相对路径或压缩包内成员名"""
+    supported = tuple(SUPPORTED_FILE_FORMATS)
+    if os.path.isdir(source):
+        items = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(supported):
+                    path = os.path.join(root, name)
+                    items.append((os.path.relpath(path, source).replace(os.sep, '/'), path))
+        return items
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            return [(info.filename, info.filename) for info in archive.infolist()
+                    if not info.is_dir() and info.filename.lower().endswith(supported)]
+    if tarfile.is_tarfile(source):
+        with tarfile.open(source) as archive:
+            return [(member.name, member.name) for member in archive
+                    if member.isfile() and member.name.lower().endswith(supported)]
+    raise ValueError(f"不支持的输入（需要目录或 {'/'.join(BULK_ARCHIVE_EXTS)} 压缩包）: {source}")
+
+
+class BulkSourceReader:
+    """把目录中的文件或压缩包成员放入暂存目录，供工作进程处理（process_file_ocr 处理完会删除暂存文件）"""
+
+    def __init__(self, source):
+        self.source = source
+        self.archive = None
+        if not os.path.isdir(source):
+            self.archive = zipfile.ZipFile(source) if zipfile.is_zipfile(source) else tarfile.open(source)
+
+    def spool(self, locator):
+        """locator 为文件路径或压缩包成员名，返回暂存路径"""
+        spool_path = new_spool_path(os.path.splitext(locator)[1].lower())
+        if self.archive is None:
+            link_or_copy_file(locator, spool_path)
+            return spool_path
+        if isinstance(self.archive, zipfile.ZipFile):
+            member = self.archive.open(locator)
+        else:
+            member = self.archive.extractfile(locator)
+        with member, open(spool_path, 'wb') as f:
+            shutil.copyfileobj(member, f, ASYNC_IO_CHUNK_SIZE)
+        return spool_path
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+
+def bulk_run_options(args, render_options):
+    """每条记录附带的识别参数，用于判断检查点能否继续使用"""
+    return {'lang': args.lang, 'profile': args.profile, 'render_options': render_options}
+
+
+def load_bulk_checkpoint(output_path, options, retry_errors=False):
+    """读取已有输出，返回已完成的记录键集合；中断时写了一半的末行被截掉。
+    已有记录的识别参数与本次不同时抛出ValueError，避免同一输出文件混入不同参数的结果"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    valid_size = 0
+    with open(output_path, 'rb') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b'\n'):
+                break
+            if record.get('options') != options:
+                raise ValueError(f"检查点 {output_path} 中的记录使用了不同的识别参数 {record.get('options')}，"
+                                 f"本次为 {options}；请使用相同参数继续或换一个输出文件")
+            valid_size += len(line)
+            if record.get('status') == 'ok' or not retry_errors:
+                done.add(record['source'])
+    if valid_size < os.path.getsize(output_path):
+        logger.warning(f"输出文件末尾有不完整的记录，已截断: {output_path}")
+        with open(output_path, 'r+b') as f:
+            f.truncate(valid_size)
+    return done
+
+
+def init_bulk_worker(lang, profile):
+    """批处理工作进程初始化：只加载所需语言和配置的一个引擎（自动判断语言和分离流水线按需加载模型）"""
+    langs = [] if lang == AUTO_LANG or uses_split_pipeline(profile) else [lang]
+    if init_engine_pool(langs=langs, pool_size=1, profile=profile) is None:
+        raise Exception("PaddleOCR引擎池初始化失败")
+
+
+def run_bulk_file(spool_path, filename, lang, profile, render_options):
+    """在工作进程中识别一个文件，返回结果记录（不含记录键）"""
+    start_time = time.time()
+    page_report = {}
+    try:
+        result = process_file_ocr(spool_path, filename, lang, profile, page_report=page_report, **render_options)
+        record = {'status': 'ok', 'results': convert_np_float32(result)}
+        if page_report.get('pages'):
+            record['pages'] = page_report['pages']
+    except Exception as e:
+        record = {'status': 'error', 'error': str(e)}
+    record['page_count'] = max(1, len(page_report.get('pages') or []))
+    record['seconds'] = round(time.time() - start_time, 3)
+    return record
+
+
+def format_bulk_progress(processed, total, pages, failed, elapsed):
+    """进度行：已处理数/总数、失败数、吞吐量和预计剩余时间"""
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    eta = (total - processed) / rate if rate > 0 else 0.0
+    return (f"[{processed}/{total}] 失败 {failed} | {rate * 60:.1f} 文件/分钟, "
+            f"{pages / elapsed if elapsed > 0 else 0.0:.2f} 页/秒 | 已用 {elapsed:.0f}s, 预计剩余 {eta:.0f}s")
+
+
+def run_bulk_command(args):
+    """离线批量识别目录或压缩包中的文件，结果写入JSONL，可从检查点继续"""
     try:
-        web_address = '0.0.0.0:5104'
-        host, port = web_address.split(':')
+        render_options = get_page_render_options({'pages': args.pages, 'dpi': args.dpi,
+                                                  'dpi_mode': args.dpi_mode, 'max_pixels': args.max_pixels})
+        items = iter_bulk_sources(args.source)
+    except (ValueError, OSError) as e:
+        print(f"参数错误: {e}")
+        return 1
+
+    args.workers = max(1, args.workers)
+    options = bulk_run_options(args, render_options)
+    try:
+        done = load_bulk_checkpoint(args.output, options, args.retry_errors)
+    except ValueError as e:
+        print(f"无法从检查点继续: {e}")
+        return 1
+    pending = [(key, locator) for key, locator in items if key not in done]
+    total = len(pending)
+    print(f"共 {len(items)} 个文件，检查点中已完成 {len(items) - total} 个，待处理 {total} 个，工作进程 {args.workers} 个")
+    if not pending:
+        return 0
+
+    # 子进程导入本模块时不自动初始化引擎池，CPU和内存预算在工作进程间平分
+    os.environ['OCR_INIT_ON_IMPORT'] = '0'
+    os.environ['OCR_BACKGROUND_INIT'] = '0'
+    os.environ.setdefault('OCR_CPU_BUDGET', str(max(1, thread_budget.total // args.workers)))
+    os.environ.setdefault('OCR_MEMORY_BUDGET_MB', str(max(1, memory_budget.total // MB // args.workers)))
+
+    reader = BulkSourceReader(args.source)
+    executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=init_bulk_worker, initargs=(args.lang, args.profile))
+    processed = pages = failed = 0
+    start_time = last_report = time.monotonic()
+    in_flight = {}
+    queue_iter = iter(pending)
+    interrupted = False
+    try:
+        with open(args.output, 'a', encoding='utf-8') as output:
+            while True:
+                # 暂存中的文件数控制在工作进程数的两倍以内
+                while len(in_flight) < args.workers * 2:
+                    key, locator = next(queue_iter, (None, None))
+                    if key is None:
+                        break
+                    try:
+                        spool_path = reader.spool(locator)
+                    except Exception as e:
+                        record = {'source': key, 'status': 'error', 'error': f"读取文件失败: {e}", 'options': options}
+                        output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                        processed += 1
+                        failed += 1
+                        continue
+                    future = executor.submit(run_bulk_file, spool_path, os.path.basename(key), args.lang,
+                                             args.profile, render_options)
+                    in_flight[future] = (key, spool_path)
+                if not in_flight:
+                    break
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    key, spool_path = in_flight.pop(future)
+                    try:
+                        record = future.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        record = {'status': 'error', 'error': str(e)}
+                    safe_remove_file(spool_path)
+                    output.write(json.dumps({'source': key, **record, 'options': options},
+                                            ensure_ascii=False, default=to_builtin) + '\n')
+                    processed += 1
+                    pages += record.get('page_count', 0)
+                    failed += record['status'] != 'ok'
+                output.flush()
+
+                now = time.monotonic()
+                if now - last_report >= BULK_PROGRESS_INTERVAL:
+                    last_report = now
+                    print(format_bulk_progress(processed, total, pages, failed, now - start_time), flush=True)
+    except KeyboardInterrupt:
+        interrupted = True
+    except BrokenProcessPool as e:
+        print(f"工作进程异常退出: {e}")
+        return 1
+    finally:
+        executor.shutdown(wait=not interrupted, cancel_futures=True)
+        reader.close()
+        for key, spool_path in in_flight.values():
+            safe_remove_file(spool_path)
+
+    print(format_bulk_progress(processed, total, pages, failed, time.monotonic() - start_time))
+    if interrupted:
+        print(f"已中断，重新运行相同命令可从检查点继续: {args.output}")
+        return 130
+    return 0
+
+
+def run_manifest_command(args):
+    """生成或校验模型清单"""
+    if args.verify:
+        manifest = load_model_manifest(args.output)
+        if manifest is None:
+            print(f"模型清单不存在: {args.output}")
+            return 1
+        requirements = manifest.get('requirements', {})
+        model_names = sorted({name for profiles in requirements.values() for names in profiles.values() for name in names})
+        problems = verify_model_manifest(manifest, model_names, verify_mode='sha256')
+        for problem in problems:
+            print(problem)
+        print(f"校验{'失败' if problems else '通过'}: {len(model_names)}个模型, {len(problems)}个问题")
+        return 1 if problems else 0
+
+    try:
+        manifest = build_model_manifest()
+    except ModelManifestError as e:
+        print(f"生成模型清单失败: {e}")
+        return 1
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"模型清单已写入 {args.output}，共{len(manifest['models'])}个模型")
+    return 0
+
+
+def build_arg_parser():
+    """命令行参数：serve(默认，启动API服务) / worker(从任务队列领取任务) / bulk(离线批量识别) / manifest(生成或校验模型清单)"""
+    parser = argparse.ArgumentParser(description='PaddleOCR V5文字识别服务')
+    subparsers = parser.add_subparsers(dest='command')
+
+    serve_parser = subparsers.add_parser('serve', help='启动API服务（默认）')
+    serve_parser.add_argument('--host', default='0.0.0.0')
+    serve_parser.add_argument('--port', type=int, default=5104)
+    serve_parser.add_argument('--asyncio', action='store_true',
+                              help='使用asyncio前端（需要aiohttp）：网络I/O异步处理，推理在有界线程池中执行')
+
+    worker_parser = subparsers.add_parser('worker', help='从共享任务队列(OCR_QUEUE_DIR)领取并执行识别任务')
+    worker_parser.add_argument('--concurrency', type=int, default=sum(ENGINE_POOL_SIZES.values()),
+                               help='同时处理的任务数')
+
+    bulk_parser = subparsers.add_parser('bulk', help='离线批量识别目录或压缩包中的文件，结果写入JSONL')
+    bulk_parser.add_argument('source', help='输入目录或压缩包(zip/tar/tar.gz)')
+    bulk_parser.add_argument('-o', '--output', required=True, help='结果JSONL文件，同时作为检查点')
+    bulk_parser.add_argument('--workers', type=int, default=max(1, thread_budget.total // 2), help='工作进程数')
+    bulk_parser.add_argument('--lang', default='ch', choices=SUPPORTED_LANGS + [AUTO_LANG])
+    bulk_parser.add_argument('--profile', default=DEFAULT_PROFILE, choices=list(OCR_PROFILES))
+    bulk_parser.add_argument('--pages', help='页码范围（如 1-3,5）')
+    bulk_parser.add_argument('--dpi', type=int)
+    bulk_parser.add_argument('--dpi-mode', choices=PDF_DPI_MODES)
+    bulk_parser.add_argument('--max-pixels', type=int)
+    bulk_parser.add_argument('--retry-errors', action='store_true', help='重新处理检查点中失败的文件')
+
+    manifest_parser = subparsers.add_parser('manifest', help='生成或校验模型清单')
+    manifest_parser.add_argument('--output', default=MODEL_MANIFEST_PATH, help='模型清单路径')
+    manifest_parser.add_argument('--verify', action='store_true', help='按SHA256完整校验已有清单')
+    return parser
+
+
+def run_serve_command(args):
+    """启动Flask API服务"""
+    try:
+        web_address = f'{args.host}:{args.port}'
+        host, port = args.host, args.port
+
+        if USE_JOB_QUEUE:
+            logger.info(f"任务队列模式：识别任务提交到 {job_queue.db_path}，由工作进程执行")
+        else:
+            init_engine_pool()
+        # 接手上次运行留下的未完成或未投递的回调任务
+        callback_jobs.start()
 
         # 启动前检查引擎池状态
         health_status = get_engine_pool_health()
@@ -1199,8 +5723,54 @@ if __name__ == '__main__':
         logger.info("支持的语言: 中文(ch), 英文(en), 日文(japan), 韩文(korean), 高精度中文(server)")
         logger.info(f"模型存储目录: {MODEL_DIR}")
 
+        if args.asyncio:
+            if web is None:
+                logger.error("asyncio前端需要安装aiohttp: pip install aiohttp")
+                return
+            logger.info(f"使用asyncio前端，OCR线程池大小: {ASYNC_OCR_WORKERS}")
+            web.run_app(AsyncOCRFrontend().build_app(), host=host, port=int(port))
+            return
+
         app.run(host=host, port=int(port), debug=True)
 
     except Exception as e:
         logger.error(f"[PaddleOCR App]启动错误: {str(e)}")
-        logger.error(f"错误详情: {traceback.format_exc()}")
\ No newline at end of file
+        logger.error(f"错误详情: {traceback.format_exc()}")
+
+
+def run_worker_command(args):
+    """启动工作进程：加载引擎池后以 concurrency 个线程从任务队列领取任务"""
+    if init_engine_pool() is None:
+        logger.error("引擎池初始化失败，工作进程退出")
+        return 1
+
+    stop_event = threading.Event()
+    worker_prefix = f"{socket.gethostname()}-{os.getpid()}"
+    threads = [
+        threading.Thread(target=run_queue_worker, args=(f"{worker_prefix}-{i}", stop_event),
+                         name=f'queue-worker-{i}', daemon=True)
+        for i in range(max(1, args.concurrency))
+    ]
+    for thread in threads:
+        thread.start()
+    logger.warning(f"工作进程已启动: {worker_prefix}, 并发数: {len(threads)}, 任务队列: {job_queue.db_path}")
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        # 处理中的任务由其它工作进程在可见性超时后接手
+        stop_event.set()
+    return 0
+
+
+if __name__ == '__main__':
+    cli_args = build_arg_parser().parse_args()
+    if cli_args.command == 'manifest':
+        raise SystemExit(run_manifest_command(cli_args))
+    if cli_args.command == 'worker':
+        raise SystemExit(run_worker_command(cli_args))
+    if cli_args.command == 'bulk':
+        raise SystemExit(run_bulk_command(cli_args))
+    if cli_args.command is None:
+        cli_args = build_arg_parser().parse_args(['serve'])
+    run_serve_command(cli_args)
\ No newline at end of file
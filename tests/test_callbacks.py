@@ -0,0 +1,181 @@
+"""完成回调：用本地HTTP接收端验证投递、重试、结果引用、按任务ID取回结果和进程退出后的接手"""
+import hashlib
+import hmac
+import http.server
+import io
+import json
+import os
+import queue
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault('OCR_INIT_ON_IMPORT', '0')
+os.environ.setdefault('OCR_BACKGROUND_INIT', '0')
+os.environ.setdefault('OCR_WARMUP', '0')
+
+pytest.importorskip('paddleocr')
+
+import app  # noqa: E402
+
+RESULT = [[[[1, 2], [3, 2], [3, 4], [1, 4]], 'hello', 0.99]]
+
+
+class ReceiverHandler(http.server.BaseHTTPRequestHandler):
+    """回调接收端：按 server.statuses 依次返回状态码（用完后返回200），收到的请求放入 server.received"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        self.server.received.put((status, dict(self.headers), body))
+
+
+@pytest.fixture
+def receiver():
+    servers = []
+
+    def start(statuses=()):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ReceiverHandler)
+        server.statuses = list(statuses)
+        server.received = queue.Queue()
+        server.url = f'http://127.0.0.1:{server.server_address[1]}/hook'
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def runner(tmp_path, monkeypatch):
+    """使用临时存储目录的回调任务执行器，识别过程替换为返回固定结果"""
+    calls = []
+
+    def fake_dispatch(kind, temp_file_path, params, ticket=None, deadline=None):
+        with open(temp_file_path, 'rb') as f:
+            calls.append((kind, f.read(), params))
+        return {'message': RESULT}, 200
+
+    callback_runner = app.CallbackJobRunner(workers=2, store=app.CallbackStore(str(tmp_path / 'queue')))
+    callback_runner.calls = calls
+    monkeypatch.setattr(app, 'callback_jobs', callback_runner)
+    monkeypatch.setattr(app, 'dispatch_ocr_job', fake_dispatch)
+    monkeypatch.setattr(app, 'CALLBACK_RETRY_BASE', 0.01)
+    monkeypatch.setattr(app, 'CALLBACK_MAX_ATTEMPTS', 3)
+    return callback_runner
+
+
+def submit_file(callback_url, content=b'image-bytes'):
+    client = app.app.test_client()
+    response = client.post('/ocr/file', content_type='multipart/form-data', data={
+        'file': (io.BytesIO(content), 'page.png'), 'callback_url': callback_url})
+    assert response.status_code == 202
+    return response.get_json()['job_id']
+
+
+def wait_for_delivery(store, job_id, expected, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.get(job_id)
+        if job is not None and job['delivery'] == expected:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'任务 {job_id} 未进入投递状态 {expected}: {store.get(job_id)}')
+
+
+def test_result_is_retried_signed_and_retrievable(receiver, runner, monkeypatch):
+    monkeypatch.setattr(app, 'CALLBACK_SECRET', 'secret')
+    server = receiver(statuses=[503])
+
+    job_id = submit_file(server.url)
+    wait_for_delivery(runner.store, job_id, 'delivered')
+
+    first_status, _, _ = server.received.get(timeout=5)
+    status, headers, body = server.received.get(timeout=5)
+    assert (first_status, status) == (503, 200)
+    assert headers['X-OCR-Job-Id'] == job_id
+    expected = hmac.new(b'secret', body, hashlib.sha256).hexdigest()
+    assert headers['X-OCR-Signature'] == f'sha256={expected}'
+    assert json.loads(body)['message'] == RESULT
+    assert runner.calls[0][1] == b'image-bytes'
+    # 输入文件保存在存储目录中，完成后删除
+    assert os.listdir(runner.store.input_dir) == []
+
+    response = app.app.test_client().get(f'/ocr/jobs/{job_id}')
+    assert response.status_code == 200
+    assert response.headers['X-OCR-Callback-Delivery'] == 'delivered'
+    assert response.data == body
+
+
+def test_final_failure_sends_result_reference(receiver, runner):
+    server = receiver(statuses=[500] * 3)
+
+    job_id = submit_file(server.url)
+    wait_for_delivery(runner.store, job_id, 'referenced')
+
+    for _ in range(3):
+        assert server.received.get(timeout=5)[0] == 500
+    status, headers, body = server.received.get(timeout=5)
+    reference = json.loads(body)
+    assert reference['job_id'] == job_id
+    assert reference['status'] == 200
+    assert reference['result_url'] == f'http://localhost/ocr/jobs/{job_id}'
+    assert headers['X-OCR-Result-Url'] == reference['result_url']
+
+    response = app.app.test_client().get(f'/ocr/jobs/{job_id}')
+    assert response.status_code == 200
+    assert response.headers['X-OCR-Callback-Delivery'] == 'referenced'
+    assert response.get_json()['message'] == RESULT
+
+
+def test_unknown_job_returns_404(runner):
+    response = app.app.test_client().get('/ocr/jobs/missing')
+    assert response.status_code == 404
+
+
+def test_input_is_not_kept_in_spool_dir(tmp_path, runner):
+    spooled = app.new_spool_path('.png')
+    with open(spooled, 'wb') as f:
+        f.write(b'image-bytes')
+
+    job = runner.store.submit('job1', 'file', runner.owner, {'params': {}}, spooled)
+
+    assert not os.path.exists(spooled)
+    stored = runner.store.input_path(job['payload']['input'])
+    assert os.path.abspath(os.path.dirname(stored)) != os.path.abspath(app.TMP_DIR)
+    assert open(stored, 'rb').read() == b'image-bytes'
+
+
+def test_jobs_of_exited_process_are_taken_over(tmp_path, receiver, runner, monkeypatch):
+    server = receiver()
+    monkeypatch.setattr(app, 'CALLBACK_LEASE_SECONDS', 0.3)
+    spooled = tmp_path / 'left-over.png'
+    spooled.write_bytes(b'left-over')
+    payload = {
+        'params': {'filename': 'left-over.png', 'lang': 'ch', 'profile': app.DEFAULT_PROFILE,
+                   'render_options': {'pages': None}},
+        'callback_url': server.url, 'output_options': {}, 'result_url': 'http://localhost/ocr/jobs/job2',
+        'priority': app.DEFAULT_PRIORITY, 'client_id': 'anonymous', 'expires_at': None,
+    }
+    # 由已退出的进程登记、租约随后过期的任务
+    runner.store.submit('job2', 'file', 'exited-process', payload, str(spooled))
+    time.sleep(0.4)
+
+    runner.start()
+    wait_for_delivery(runner.store, 'job2', 'delivered')
+
+    status, headers, body = server.received.get(timeout=5)
+    assert headers['X-OCR-Job-Id'] == 'job2'
+    assert json.loads(body)['message'] == RESULT
+    assert runner.calls[0][1] == b'left-over'
+    assert runner.recovered_total == 1
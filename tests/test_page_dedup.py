@@ -0,0 +1,46 @@
+"""文档内重复页判断：只有像素完全相同的页面复用前页结果，同一模板不同内容的页面照常识别"""
+import os
+
+import pytest
+
+os.environ.setdefault('OCR_INIT_ON_IMPORT', '0')
+os.environ.setdefault('OCR_BACKGROUND_INIT', '0')
+os.environ.setdefault('OCR_WARMUP', '0')
+
+pytest.importorskip('paddleocr')
+cv2 = pytest.importorskip('cv2')
+np = pytest.importorskip('numpy')
+
+import app  # noqa: E402
+
+
+def invoice_page(total):
+    """只有合计行不同的发票页面"""
+    page = np.full((1100, 850, 3), 255, dtype=np.uint8)
+    cv2.putText(page, 'INVOICE  Acme Corp', (60, 80), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    for k in range(12):
+        cv2.putText(page, f'Item {k}    qty 1    10.00', (60, 160 + 40 * k),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 1)
+    cv2.putText(page, f'TOTAL {total}', (60, 900), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 1)
+    return page
+
+
+@pytest.fixture(autouse=True)
+def dedup_enabled(monkeypatch):
+    monkeypatch.setattr(app, 'DEDUP_PAGES', True)
+
+
+def test_same_template_with_different_text_is_not_duplicate():
+    first = app.analyze_page(invoice_page('100.00'))
+    second = app.analyze_page(invoice_page('250.00'))
+
+    seen_pages = [(first['hash'], 1, ['page 1 results'])]
+    assert app.find_duplicate_page(second['hash'], seen_pages) == (None, None)
+
+
+def test_identical_pages_reuse_results():
+    first = app.analyze_page(invoice_page('100.00'))
+    again = app.analyze_page(invoice_page('100.00'))
+
+    seen_pages = [(first['hash'], 1, ['page 1 results'])]
+    assert app.find_duplicate_page(again['hash'], seen_pages) == (1, ['page 1 results'])
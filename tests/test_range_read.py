@@ -0,0 +1,157 @@
+"""远程PDF按需读取：用本地HTTP服务器（可关闭Range支持）验证稀疏文件与整文件下载的识别输入一致"""
+import functools
+import http.server
+import os
+import re
+import threading
+
+import pytest
+
+os.environ.setdefault('OCR_INIT_ON_IMPORT', '0')
+os.environ.setdefault('OCR_BACKGROUND_INIT', '0')
+os.environ.setdefault('OCR_WARMUP', '0')
+
+pytest.importorskip('paddleocr')
+fitz = pytest.importorskip('fitz')
+np = pytest.importorskip('numpy')
+
+import app  # noqa: E402
+
+PAGE_COUNT = 60
+
+
+class RangeHandler(http.server.SimpleHTTPRequestHandler):
+    """静态文件服务，server.ranges 为真时支持单段 Range 请求，记录每次请求的字节范围"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        size = os.path.getsize(path)
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if match and self.server.ranges:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            start, end = 0, size - 1
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        self.server.served_bytes += end - start + 1
+        with open(path, 'rb') as f:
+            f.seek(start)
+            self.wfile.write(f.read(end - start + 1))
+
+
+@pytest.fixture
+def serve(tmp_path):
+    servers = []
+
+    def start(ranges=True):
+        server = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', 0), functools.partial(RangeHandler, directory=str(tmp_path)))
+        server.ranges = ranges
+        server.served_bytes = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def make_pdf(path, use_objstms=False):
+    """生成每页一行文字加一张不可压缩图像的PDF（约7MB），保证超过按需读取的最小文件大小"""
+    rng = np.random.default_rng(0)
+    doc = fitz.open()
+    for i in range(PAGE_COUNT):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 72), f'Page {i + 1}', fontsize=24)
+        noise = rng.integers(0, 256, (200, 200, 3), dtype=np.uint8)
+        page.insert_image(fitz.Rect(72, 120, 472, 520), pixmap=fitz.Pixmap(fitz.csRGB, 200, 200, noise.tobytes(), 0))
+    doc.save(str(path), use_objstms=use_objstms)
+    doc.close()
+    return path
+
+
+def page_text(path, index):
+    with fitz.open(str(path)) as doc:
+        return doc[index].get_text().strip()
+
+
+def fetch(server, name, local_path, pages):
+    url = f'http://127.0.0.1:{server.server_address[1]}/{name}'
+    app.download_remote_file(url, str(local_path), pages)
+    return server.served_bytes
+
+
+@pytest.mark.parametrize('use_objstms', [False, True])
+def test_range_read_fetches_only_target_pages(tmp_path, serve, use_objstms):
+    source = make_pdf(tmp_path / 'doc.pdf', use_objstms=use_objstms)
+    server = serve()
+    local_path = tmp_path / 'local.pdf'
+
+    served = fetch(server, 'doc.pdf', local_path, '5,40')
+
+    assert served < os.path.getsize(source) * app.RANGE_MAX_FETCH_RATIO
+    for index in (4, 39):
+        assert page_text(local_path, index) == page_text(source, index)
+        with fitz.open(str(local_path)) as local, fitz.open(str(source)) as full:
+            assert local[index].get_pixmap().digest == full[index].get_pixmap().digest
+
+
+def test_range_read_follows_incremental_updates(tmp_path, serve):
+    source = make_pdf(tmp_path / 'doc.pdf')
+    with fitz.open(str(source)) as doc:
+        doc[9].insert_text((72, 700), 'Updated', fontsize=24)
+        doc.saveIncr()
+    server = serve()
+    local_path = tmp_path / 'local.pdf'
+
+    served = fetch(server, 'doc.pdf', local_path, '10')
+
+    assert served < os.path.getsize(source) * app.RANGE_MAX_FETCH_RATIO
+    assert 'Updated' in page_text(local_path, 9)
+    assert page_text(local_path, 9) == page_text(source, 9)
+
+
+def test_server_without_range_downloads_whole_file(tmp_path, serve):
+    source = make_pdf(tmp_path / 'doc.pdf')
+    server = serve(ranges=False)
+    local_path = tmp_path / 'local.pdf'
+
+    fetch(server, 'doc.pdf', local_path, '5')
+
+    assert local_path.read_bytes() == source.read_bytes()
+
+
+def test_missing_page_object_falls_back_to_whole_file(tmp_path, serve, monkeypatch):
+    source = make_pdf(tmp_path / 'doc.pdf')
+    with fitz.open(str(source)) as doc:
+        content_xrefs = doc[4].get_contents()
+    fetch_pages = app.RemotePdfPages.fetch_pages
+
+    def fetch_pages_losing_contents(self, page_indices):
+        # 模拟依赖遍历漏掉的对象：目标页面的内容流在稀疏文件中仍是空洞
+        count = fetch_pages(self, page_indices)
+        for xref in content_xrefs:
+            offset = self.offsets[xref]
+            self.remote.write_local(offset, b'\0' * (self._object_end(offset) - offset))
+        return count
+
+    monkeypatch.setattr(app.RemotePdfPages, 'fetch_pages', fetch_pages_losing_contents)
+    server = serve()
+    local_path = tmp_path / 'local.pdf'
+
+    fetch(server, 'doc.pdf', local_path, '5')
+
+    assert local_path.read_bytes() == source.read_bytes()
+    assert page_text(local_path, 4) == 'Page 5'